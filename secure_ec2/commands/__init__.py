@@ -1 +1,122 @@
 """Root file for the commands module of secure_ec2 package."""
+
+import json
+import sys
+import threading
+import time
+from typing import Callable
+
+import click
+
+from secure_ec2.src.api import run_in_regions
+from secure_ec2.src.aws import get_boto3_client, resolve_regions
+from secure_ec2.src.exceptions import SecureEC2Error
+
+_emit_lock = threading.Lock()
+
+
+def echo_error(error: SecureEC2Error):
+    """Report an error to the user, pointing to the logs for the details."""
+    click.echo(f"\r\n{error}, see the logs for more details.")
+
+
+def echo_instance_transition(instance_id: str, previous_state: str, state: str):
+    """Print an instance state transition."""
+    click.echo(f"\r\nInstance {instance_id}: {previous_state or 'launched'} -> {state}")
+
+
+def echo_region_summary(region_results: dict):
+    """Print the per region success or failure summary of a multi region run."""
+    click.echo("\r\nRegion summary:")
+    for region, region_result in region_results.items():
+        if region_result["succeeded"]:
+            click.echo(f"  {region}: succeeded")
+        else:
+            click.echo(f"  {region}: failed ({region_result['error']})")
+
+
+def emit_event(event: str, **fields):
+    """Write one NDJSON event to stdout for the machine readable output."""
+    line = json.dumps({"event": event, "timestamp": time.time(), **fields})
+    with _emit_lock:
+        click.echo(line)
+
+
+def emit_error(error: SecureEC2Error, **fields):
+    """Write an error event to stdout for the machine readable output."""
+    emit_event("error", error=type(error).__name__, message=str(error), **fields)
+
+
+def with_phase_events(pipeline: Callable, phase: str) -> Callable:
+    """Wrap a region pipeline to emit a started and a completed or failed event with its timing."""
+
+    def pipeline_with_phase_events(region: str):
+        started_at = time.monotonic()
+        emit_event("phase", phase=phase, region=region, status="started")
+        try:
+            result = pipeline(region)
+        except SecureEC2Error as error:
+            emit_error(error=error, phase=phase, region=region)
+            emit_event(
+                "phase",
+                phase=phase,
+                region=region,
+                status="failed",
+                duration=time.monotonic() - started_at,
+            )
+            raise
+        emit_event(
+            "phase",
+            phase=phase,
+            region=region,
+            status="completed",
+            duration=time.monotonic() - started_at,
+        )
+        return result
+
+    return pipeline_with_phase_events
+
+
+def run_command_pipeline(
+    pipeline: Callable,
+    region: str,
+    regions: str = None,
+    profile: str = None,
+    output: str = "text",
+    phase: str = None,
+):
+    """Run a command pipeline in a single region, or in parallel in every requested region.
+
+    Errors are reported to the user and turned into a failing exit code. When several regions are
+    requested a failed region does not stop the others, and a per region summary is printed. With
+    the json output, the phase of every region is reported as NDJSON events instead.
+    """
+    if output == "json":
+        pipeline = with_phase_events(pipeline=pipeline, phase=phase)
+    if not regions:
+        try:
+            pipeline(region)
+        except SecureEC2Error as error:
+            # The phase events already reported the failure in the json output
+            if output != "json":
+                echo_error(error=error)
+            sys.exit(1)
+        return
+
+    try:
+        target_regions = resolve_regions(
+            regions=regions,
+            ec2_client=get_boto3_client(region=region, profile=profile, service="ec2"),
+        )
+    except SecureEC2Error as error:
+        if output == "json":
+            emit_error(error=error, phase=phase)
+        else:
+            echo_error(error=error)
+        sys.exit(1)
+
+    region_results = run_in_regions(regions=target_regions, pipeline=pipeline)
+    if output != "json":
+        echo_region_summary(region_results=region_results)
+    if not all(region_result["succeeded"] for region_result in region_results.values()):
+        sys.exit(1)
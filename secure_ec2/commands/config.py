@@ -4,10 +4,11 @@ import logging
 import sys
 
 import click
-from PyInquirer import Token, prompt, style_from_dict
 
-from secure_ec2.src.api import create_launch_template
-from secure_ec2.src.aws import get_boto3_client
+from secure_ec2.commands import emit_event, run_command_pipeline
+from secure_ec2.src.client import SecureEC2
+from secure_ec2.src.constants import AMI_CACHE_TTL
+from secure_ec2.src.helpers import enable_spinners
 
 logger = logging.getLogger(__name__)
 
@@ -37,12 +38,56 @@ logger = logging.getLogger(__name__)
     is_flag=False,
     help="AWS region to use",
 )
+@click.option(
+    "-ra",
+    "--refresh_ami",
+    is_flag=True,
+    help="Resolve the latest AMI again instead of using the cached AMI",
+)
+@click.option(
+    "-at",
+    "--ami_ttl",
+    required=False,
+    default=AMI_CACHE_TTL,
+    is_flag=False,
+    type=click.INT,
+    help="Seconds to reuse a cached AMI before resolving the latest AMI again",
+)
+@click.option(
+    "-rs",
+    "--regions",
+    required=False,
+    default=None,
+    is_flag=False,
+    help="Comma separated AWS regions to configure in parallel, or all for every enabled region",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Choice(["text", "json"], case_sensitive=False),
+    required=False,
+    default="text",
+    is_flag=False,
+    help="Output format, json streams NDJSON events without prompts or spinners",
+)
 @click.command()
-def config(profile: str, region: str, os_type: str):
+def config(
+    profile: str,
+    region: str,
+    regions: str,
+    os_type: str,
+    refresh_ami: bool,
+    ami_ttl: int,
+    output: str,
+):
     """Invoke the configuration phase for the selected operating system."""
-    ec2_client = get_boto3_client(region=region, profile=profile, service="ec2")
-
-    if not os_type:
+    output = output.lower()
+    if output == "json":
+        enable_spinners(False)
+        if not os_type:
+            raise click.UsageError("The json output requires --os_type")
+    elif not os_type:
+        from PyInquirer import Token, prompt, style_from_dict
 
         style = style_from_dict(
             {
@@ -64,26 +109,31 @@ def config(profile: str, region: str, os_type: str):
         ]
         answers = prompt(questions, style=style)
 
-        if len(answers) > 0:
-            logger.info("Creating launch template with the selected configuration")
-            print("Creating launch template with the selected configuration")
-            create_launch_template(
-                os_type=answers["os_type"].lower(),
-                ec2_client=ec2_client,
-            )
-            print(
-                "Configuration completed. secure_ec2 is now ready to launch some instances!"
-            )
-            sys.exit(0)
-        sys.exit(1)
-    else:
-        logger.info("Creating launch template with the selected configuration")
+        if len(answers) == 0:
+            sys.exit(1)
+        os_type = answers["os_type"]
+
+    def configure_region(region_name: str):
+        configure_result = SecureEC2(
+            region=region_name, profile=profile, ami_ttl=ami_ttl
+        ).configure(os_type=os_type, refresh_ami=refresh_ami)
+        if output == "json":
+            emit_event("launch_template", **configure_result._asdict())
+        return configure_result
+
+    logger.info("Creating launch template with the selected configuration")
+    if output == "text":
         print("Creating launch template with the selected configuration")
-        create_launch_template(
-            os_type=os_type.lower(),
-            ec2_client=ec2_client,
-        )
+    run_command_pipeline(
+        pipeline=configure_region,
+        region=region,
+        regions=regions,
+        profile=profile,
+        output=output,
+        phase="config",
+    )
+    if output == "text":
         print(
             "Configuration completed. secure_ec2 is now ready to launch some instances!"
         )
-        sys.exit(0)
+    sys.exit(0)
@@ -3,28 +3,35 @@
 import sys
 
 import click
-from PyInquirer import Token, ValidationError, Validator, prompt, style_from_dict
 
-from secure_ec2.src.api import (
-    get_key_pairs,
-    get_latest_launch_template,
-    provision_ec2_instance,
+from secure_ec2.commands import (
+    echo_error,
+    echo_instance_transition,
+    emit_event,
+    run_command_pipeline,
 )
-from secure_ec2.src.aws import get_boto3_client, get_boto3_resource
 from secure_ec2.src.base_logger import logger
+from secure_ec2.src.client import SecureEC2
+from secure_ec2.src.constants import (
+    DEFAULT_FLEET_ALLOCATION_STRATEGY,
+    FLEET_ALLOCATION_STRATEGIES,
+)
+from secure_ec2.src.exceptions import SecureEC2Error
+from secure_ec2.src.helpers import enable_spinners
 
 
-class NumberValidator(Validator):
+def validate_number(text: str):
     """Defines the number validation in the PyInquirer interactive wizard."""
+    try:
+        int(text)
+    except ValueError:
+        return "Please enter a number"
+    return True
 
-    def validate(self, document):
-        """Method that defines the number validation."""
-        try:
-            int(document.text)
-        except ValueError:
-            raise ValidationError(
-                message="Please enter a number", cursor_position=len(document.text)
-            )
+
+def split_values(text: str) -> list:
+    """Split a comma separated option into its values."""
+    return [value.strip() for value in text.split(",") if value.strip()]
 
 
 @click.option(
@@ -74,6 +81,55 @@ class NumberValidator(Validator):
     is_flag=False,
     help="AWS region to use",
 )
+@click.option(
+    "-rs",
+    "--regions",
+    required=False,
+    default=None,
+    is_flag=False,
+    help="Comma separated AWS regions to launch in parallel, or all for every enabled region",
+)
+@click.option(
+    "-f",
+    "--fleet",
+    is_flag=True,
+    help="Launch with a single instant EC2 Fleet, --instance_type then takes comma separated types",
+)
+@click.option(
+    "-sn",
+    "--subnets",
+    required=False,
+    default=None,
+    is_flag=False,
+    help="Comma separated subnet IDs of the fleet, defaults to the subnets of the launch template VPC",
+)
+@click.option(
+    "-sp",
+    "--spot_percentage",
+    type=click.IntRange(0, 100),
+    required=False,
+    default=0,
+    is_flag=False,
+    help="Percentage of the fleet instances launched as spot instances",
+)
+@click.option(
+    "-as",
+    "--allocation_strategy",
+    type=click.Choice(FLEET_ALLOCATION_STRATEGIES, case_sensitive=False),
+    required=False,
+    default=DEFAULT_FLEET_ALLOCATION_STRATEGY,
+    is_flag=False,
+    help="Allocation strategy of the fleet spot instances",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Choice(["text", "json"], case_sensitive=False),
+    required=False,
+    default="text",
+    is_flag=False,
+    help="Output format, json streams NDJSON events without prompts, spinners or clipboard",
+)
 @click.command()
 def launch(
     os_type: str,
@@ -83,25 +139,39 @@ def launch(
     no_clip: bool,
     profile: str,
     region: str,
+    regions: str,
+    fleet: bool,
+    subnets: str,
+    spot_percentage: int,
+    allocation_strategy: str,
+    output: str,
 ):
     """Invoke the launch phase for the selected configuration and launch template properties."""
-    ec2_client = get_boto3_client(region=region, profile=profile, service="ec2")
-    iam_client = get_boto3_client(region=region, profile=profile, service="iam")
-    ec2_resource = get_boto3_resource(region=region, profile=profile, service="ec2")
-
-    style = style_from_dict(
-        {
-            Token.QuestionMark: "#E91E63 bold",
-            Token.Selected: "#673AB7 bold",
-            Token.Instruction: "",
-            Token.Answer: "#2196f3 bold",
-            Token.Question: "",
-        }
-    )
+    output = output.lower()
+    if output == "json":
+        enable_spinners(False)
+        if not (os_type and num_instances and keypair and instance_type):
+            raise click.UsageError(
+                "The json output requires --os_type, --num_instances, --keypair and --instance_type"
+            )
+    elif not (num_instances and keypair and instance_type):
+        try:
+            keypairs = SecureEC2(region=region, profile=profile).get_key_pairs()
+        except SecureEC2Error as error:
+            echo_error(error=error)
+            sys.exit(1)
 
-    keypairs = get_key_pairs(ec2_client=ec2_client)
+        from PyInquirer import Token, prompt, style_from_dict
 
-    if not (num_instances and keypair and instance_type):
+        style = style_from_dict(
+            {
+                Token.QuestionMark: "#E91E63 bold",
+                Token.Selected: "#673AB7 bold",
+                Token.Instruction: "",
+                Token.Answer: "#2196f3 bold",
+                Token.Question: "",
+            }
+        )
 
         questions = [
             {
@@ -114,7 +184,7 @@ def launch(
                 "type": "input",
                 "name": "num_instances",
                 "message": "How many instances?",
-                "validate": NumberValidator,
+                "validate": validate_number,
                 "filter": lambda val: int(val),
             },
             {
@@ -126,48 +196,87 @@ def launch(
             {"type": "input", "name": "instance_type", "message": "Instance Type"},
         ]
         answers = prompt(questions, style=style)
-        launch_template = get_latest_launch_template(
-            os_type=answers["os_type"], ec2_client=ec2_client
-        )
 
-        if len(answers) > 0:
-            logger.info(
-                "Provisioning secure EC2 instance with the selected configuration"
-            )
-            print("Provisioning secure EC2 instance with the selected configuration")
-
-            provision_ec2_instance(
-                launch_template=launch_template,
-                num_instances=answers["num_instances"],
-                keypair=answers["keypair"],
-                instance_type=answers["instance_type"],
-                ec2_client=ec2_client,
-                iam_client=iam_client,
-                ec2_resource=ec2_resource,
-                no_clip=no_clip,
+        if len(answers) == 0:
+            sys.exit(1)
+        os_type = answers["os_type"]
+        num_instances = answers["num_instances"]
+        keypair = answers["keypair"]
+        instance_type = answers["instance_type"]
+
+    fleet_options = None
+    if fleet:
+        if keypair != "None":
+            raise click.UsageError(
+                "The fleet launches with Session Manager access, use --keypair None"
             )
+        fleet_options = {
+            "instance_types": split_values(instance_type),
+            "subnet_ids": split_values(subnets) if subnets else None,
+            "spot_percentage": spot_percentage,
+            "allocation_strategy": allocation_strategy.lower(),
+        }
 
-            print("Secure instance provisioning completed successfully")
-            sys.exit(0)
-        sys.exit(1)
-    else:
+    def launch_region(region_name: str):
+        if output == "json":
 
-        logger.info("Provisioning secure EC2 instance with the selected configuration")
-        print("Provisioning secure EC2 instance with the selected configuration")
+            def on_transition(instance_id: str, previous_state: str, state: str):
+                emit_event(
+                    "transition",
+                    region=region_name,
+                    instance_id=instance_id,
+                    previous_state=previous_state,
+                    state=state,
+                )
 
-        launch_template = get_latest_launch_template(
-            os_type=os_type, ec2_client=ec2_client
-        )
-        provision_ec2_instance(
-            launch_template=launch_template,
+        else:
+            on_transition = echo_instance_transition
+        launch_result = SecureEC2(region=region_name, profile=profile).launch(
+            os_type=os_type,
             num_instances=num_instances,
             keypair=keypair,
             instance_type=instance_type,
-            ec2_client=ec2_client,
-            iam_client=iam_client,
-            ec2_resource=ec2_resource,
-            no_clip=no_clip,
+            on_transition=on_transition,
+            fleet_options=fleet_options,
         )
+        if output == "json":
+            for instance_id in launch_result.instance_ids:
+                emit_event(
+                    "instance",
+                    region=region_name,
+                    instance_id=instance_id,
+                    state=launch_result.instance_states[instance_id],
+                    connect_url=launch_result.connect_urls.get(instance_id),
+                    instance_profile=launch_result.instance_profile,
+                )
+            return launch_result
 
+        access = (
+            "Session Manager" if keypair == "None" else "SSH / RDP and your KeyPair"
+        )
+        for instance_id, connect_url in launch_result.connect_urls.items():
+            click.echo(
+                f"\r\nInstance {instance_id} provisioned successfully. Connect securely using {access}:\r\n{connect_url}"  # noqa: E501
+            )
+        # Several regions would race for the clipboard
+        if launch_result.connect_urls and not (no_clip or regions):
+            import pyperclip
+
+            pyperclip.copy(next(iter(launch_result.connect_urls.values())))
+            click.echo("\r\nThe link is on your clipboard")
+        return launch_result
+
+    logger.info("Provisioning secure EC2 instance with the selected configuration")
+    if output == "text":
+        print("Provisioning secure EC2 instance with the selected configuration")
+    run_command_pipeline(
+        pipeline=launch_region,
+        region=region,
+        regions=regions,
+        profile=profile,
+        output=output,
+        phase="launch",
+    )
+    if output == "text":
         print("Secure instance provisioning completed successfully")
-        sys.exit(0)
+    sys.exit(0)
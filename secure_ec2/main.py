@@ -1,17 +1,87 @@
 """Main module for secure_ec2 package."""
 
+import importlib
 import logging
 import sys
 
 import click
 
 from secure_ec2 import __version__
-from secure_ec2.commands.config import config
-from secure_ec2.commands.launch import launch
 from secure_ec2.src.base_logger import logger
+from secure_ec2.src.helpers import enable_spinners
+from secure_ec2.src.tracing import CallTracer
 
 sys.tracebacklimit = 0
 
+LAZY_SUBCOMMANDS = {
+    "config": (
+        "secure_ec2.commands.config",
+        "Invoke the configuration phase for the selected operating system.",
+    ),
+    "launch": (
+        "secure_ec2.commands.launch",
+        "Invoke the launch phase for the selected configuration and launch template properties.",
+    ),
+}
+
+
+class LazyGroup(click.Group):
+    """Click group that imports the module of a subcommand only when the subcommand is resolved.
+
+    The subcommand modules pull in boto3 and the interactive prompt libraries, so listing the
+    commands for `--help`, `--version` or shell completion uses the help text registered with
+    the group instead of importing them.
+    """
+
+    def __init__(self, *args, lazy_subcommands: dict = None, **kwargs):
+        """Register the lazy subcommands as a mapping of name to (module name, short help)."""
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> list:
+        """List both the eagerly added and the lazy subcommands."""
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command:
+        """Import the module of a lazy subcommand on first resolution."""
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            module_name, _ = self.lazy_subcommands[cmd_name]
+            module = importlib.import_module(module_name)
+            self.add_command(getattr(module, cmd_name), name=cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def get_short_help(self, cmd_name: str, limit: int = 45) -> str:
+        """Get the short help of a subcommand, from a placeholder with its registered help until it is imported."""
+        command = self.commands.get(cmd_name) or click.Command(
+            cmd_name, help=self.lazy_subcommands[cmd_name][1]
+        )
+        return command.get_short_help_str(limit)
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        """Write the subcommands section of the help page."""
+        commands = self.list_commands(ctx)
+        if commands:
+            limit = formatter.width - 6 - max(len(command) for command in commands)
+            with formatter.section("Commands"):
+                formatter.write_dl(
+                    [
+                        (command, self.get_short_help(command, limit))
+                        for command in commands
+                    ]
+                )
+
+    def shell_complete(self, ctx: click.Context, incomplete: str) -> list:
+        """Complete the subcommand names and the group options."""
+        from click.shell_completion import CompletionItem
+
+        results = [
+            CompletionItem(command, help=self.get_short_help(command))
+            for command in self.list_commands(ctx)
+            if command.startswith(incomplete)
+        ]
+        results.extend(super(click.MultiCommand, self).shell_complete(ctx, incomplete))
+        return results
+
 
 @click.option(
     "-d",
@@ -19,17 +89,49 @@ sys.tracebacklimit = 0
     is_flag=True,
     help="Print debug logs",
 )
-@click.group(help="CLI tool that helps you to provision EC2 instances securely")
+@click.option(
+    "-tc",
+    "--trace_calls",
+    is_flag=True,
+    help="Print a summary of the AWS API calls and their latency at exit",
+)
+@click.option(
+    "-tf",
+    "--trace_file",
+    required=False,
+    default=None,
+    is_flag=False,
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write every traced AWS API call to a JSON file, implies --trace_calls",
+)
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands=LAZY_SUBCOMMANDS,
+    help="CLI tool that helps you to provision EC2 instances securely",
+)
 @click.version_option(__version__)
-def cli(debug):
+@click.pass_context
+def cli(ctx: click.Context, debug: bool, trace_calls: bool, trace_file: str):
     """Entry point for the secure_ec2 CLI tool."""
     if debug:
         logger.setLevel(logging.DEBUG)
-    pass
+    enable_spinners()
+    if trace_calls or trace_file:
+        tracer = CallTracer()
+        tracer.start()
+        ctx.call_on_close(
+            lambda: report_call_trace(tracer=tracer, trace_file=trace_file)
+        )
+
 
+def report_call_trace(tracer: CallTracer, trace_file: str = None):
+    """Print the summary of the traced AWS API calls, on stderr to keep the output parsable."""
+    tracer.stop()
+    click.echo(f"\r\nAWS API calls:\r\n{tracer.format_summary()}", err=True)
+    if trace_file:
+        tracer.write_trace_file(trace_file)
+        click.echo(f"\r\nAWS API call trace written to {trace_file}", err=True)
 
-cli.add_command(config)
-cli.add_command(launch)
 
 if __name__ == "__main__":
     cli()
@@ -1,84 +1,171 @@
 """Methods that secure_ec2 use."""
 
+import difflib
+import hashlib
 import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from operator import itemgetter
-from sys import exit
-from typing import Any
+from typing import Any, Callable, Iterator, Optional
 
 import boto3
-import click
-import pyperclip
-from botocore.exceptions import ClientError
-from halo import Halo
+from botocore.exceptions import BotoCoreError, ClientError
 
 from secure_ec2.src.aws import (
     construct_console_connect_url,
     construct_session_manager_url,
+    get_client_account_id,
     get_region_from_boto3_client,
 )
 from secure_ec2.src.base_logger import logger
+from secure_ec2.src.cache import delete_cache_entry, get_cache_entry, set_cache_entry
 from secure_ec2.src.constants import (
     AMAZON_AMI_OWNER_ID,
+    AMI_CACHE_NAME,
+    AMI_CACHE_TTL,
+    DEFAULT_ARCHITECTURE,
+    DEFAULT_FLEET_ALLOCATION_STRATEGY,
+    DESCRIBE_IMAGES_PAGE_SIZE,
+    DESCRIBE_INSTANCES_BATCH_SIZE,
     EC2_TRUST_RELATIONSHIP,
+    FLEET_MAX_OVERRIDES,
+    IAM_CACHE_NAME,
+    IAM_CACHE_TTL,
+    IAM_PROPAGATION_DELAY,
+    IAM_PROPAGATION_ERROR_CODES,
+    IAM_PROPAGATION_MAX_ATTEMPTS,
+    INSTANCE_POLL_MAX_INTERVAL,
+    INSTANCE_POLL_MIN_INTERVAL,
+    INSTANCE_TYPE_OFFERINGS_CACHE_NAME,
+    INSTANCE_TYPE_SUGGESTIONS,
+    INSTANCE_TYPES_CACHE_NAME,
+    INSTANCE_TYPES_CACHE_TTL,
+    INSTANCE_WAIT_TIMEOUT,
+    INSUFFICIENT_CAPACITY_DELAY,
+    INSUFFICIENT_CAPACITY_ERROR_CODES,
+    INSUFFICIENT_CAPACITY_MAX_ATTEMPTS,
+    LAUNCH_CHUNK_SIZE,
+    LAUNCH_TEMPLATE_HASH_LENGTH,
+    MAX_WORKERS,
     MODULE_NAME,
+    SSM_MANAGED_POLICY_ARN,
     SSM_ROLE_NAME,
+    STALE_LAUNCH_TEMPLATE_ERROR_CODES,
+    SUBNET_INDEX_CACHE_NAME,
+    SUBNET_INDEX_CACHE_TTL,
+    UNSUPPORTED_ZONE_ERROR_CODES,
+)
+from secure_ec2.src.exceptions import (
+    AMINotFoundError,
+    AWSAccessError,
+    InstanceProfileError,
+    InstanceProvisioningError,
+    InstanceTypeError,
+    LaunchTemplateError,
+    NetworkError,
+    SecureEC2Error,
 )
 from secure_ec2.src.helpers import (
+    chunks,
     get_connection_port,
     get_ip_address,
     get_launch_template_name,
     get_os_regex,
+    get_os_ssm_parameter,
     get_username,
+    spinner,
 )
 
 
-@Halo(text="Creating IAM role for Session Manager\r\n", spinner="dots")
-def create_ssm_instance_profile(iam_client: boto3.client) -> str:
-    """Create an instance profile for connecting to the instance via AWS Session Manager."""
-    logger.debug("Creating IAM Role for Session Manager")
+def reconcile_ssm_role(iam_client: boto3.client):
+    """Make sure the Session Manager role exists and has the SSM policy attached, creating only what is missing."""
     try:
-        create_role_response = iam_client.create_role(
-            RoleName=SSM_ROLE_NAME,
-            AssumeRolePolicyDocument=json.dumps(EC2_TRUST_RELATIONSHIP),
-            Description="IAM Role for connecting to EC2 instance with Session Manager",
-        )
-        logger.debug("IAM Role for Session Manager created successfully")
+        iam_client.get_role(RoleName=SSM_ROLE_NAME)
+        logger.debug("IAM Role for Session Manager already exists")
     except ClientError as error:
-        if error.response["Error"]["Code"] != "EntityAlreadyExists":
-            logger.error(f"Unable to create IAM Role for Session Manager: {error}")
-            click.echo(
-                "\r\nUnable to create IAM Role for Session Manager, see the logs for more details."
+        if error.response["Error"]["Code"] != "NoSuchEntity":
+            logger.error(f"Unable to get IAM Role for Session Manager: {error}")
+            raise InstanceProfileError(
+                "Unable to get IAM Role for Session Manager"
+            ) from error
+        logger.debug("Creating IAM Role for Session Manager")
+        try:
+            iam_client.create_role(
+                RoleName=SSM_ROLE_NAME,
+                AssumeRolePolicyDocument=json.dumps(EC2_TRUST_RELATIONSHIP),
+                Description="IAM Role for connecting to EC2 instance with Session Manager",
             )
-            exit(1)
-        else:
-            logger.debug("IAM Role for Session Manager already exists, proceeding")
-            return SSM_ROLE_NAME
+            logger.debug("IAM Role for Session Manager created successfully")
+        except ClientError as error:
+            # Another launch may have created it in the meantime
+            if error.response["Error"]["Code"] != "EntityAlreadyExists":
+                logger.error(f"Unable to create IAM Role for Session Manager: {error}")
+                raise InstanceProfileError(
+                    "Unable to create IAM Role for Session Manager"
+                ) from error
+
+    try:
+        attached_policy_arns = [
+            policy["PolicyArn"]
+            for page in iam_client.get_paginator(
+                "list_attached_role_policies"
+            ).paginate(RoleName=SSM_ROLE_NAME)
+            for policy in page["AttachedPolicies"]
+        ]
+    except ClientError as error:
+        logger.error(f"Unable to list the policies attached to role: {error}")
+        raise InstanceProfileError(
+            "Unable to list the policies attached to role"
+        ) from error
+    if SSM_MANAGED_POLICY_ARN in attached_policy_arns:
+        logger.debug("SSM policy is already attached to role")
+        return
 
     logger.debug("Attaching SSM policy to role")
     try:
         iam_client.attach_role_policy(
-            RoleName=create_role_response["Role"]["RoleName"],
-            PolicyArn="arn:aws:iam::aws:policy/AmazonSSMManagedInstanceCore",
+            RoleName=SSM_ROLE_NAME, PolicyArn=SSM_MANAGED_POLICY_ARN
         )
         logger.debug("Attached SSM policy to role successfully")
     except ClientError as error:
         logger.error(f"Unable to attach SSM policy to role: {error}")
-        click.echo(
-            "\r\nUnable to attach SSM policy to role, see the logs for more details."
+        raise InstanceProfileError("Unable to attach SSM policy to role") from error
+
+
+def reconcile_ssm_instance_profile(iam_client: boto3.client) -> list:
+    """Make sure the Session Manager instance profile exists, returning the names of its roles."""
+    try:
+        get_instance_profile_response = iam_client.get_instance_profile(
+            InstanceProfileName=SSM_ROLE_NAME
         )
-        exit(1)
+        logger.debug("Instance profile already exists")
+        return [
+            role["RoleName"]
+            for role in get_instance_profile_response["InstanceProfile"]["Roles"]
+        ]
+    except ClientError as error:
+        if error.response["Error"]["Code"] != "NoSuchEntity":
+            logger.error(f"Unable to get instance profile: {error}")
+            raise InstanceProfileError("Unable to get instance profile") from error
 
     logger.debug("Creating instance profile")
     try:
         iam_client.create_instance_profile(InstanceProfileName=SSM_ROLE_NAME)
         logger.debug("Instance profile creation completed successfully")
     except ClientError as error:
-        logger.error(f"Unable to create instance profile: {error}")
-        click.echo(
-            "\r\nUnable to create instance profile, see the logs for more details."
-        )
-        exit(1)
+        if error.response["Error"]["Code"] != "EntityAlreadyExists":
+            logger.error(f"Unable to create instance profile: {error}")
+            raise InstanceProfileError("Unable to create instance profile") from error
+    return []
 
+
+def attach_ssm_role_to_instance_profile(
+    iam_client: boto3.client, instance_profile_roles: list
+):
+    """Add the Session Manager role to its instance profile, unless it is among the roles already."""
+    if SSM_ROLE_NAME in instance_profile_roles:
+        return
     logger.debug("Attaching instance profile to IAM role")
     try:
         iam_client.add_role_to_instance_profile(
@@ -86,15 +173,72 @@ def create_ssm_instance_profile(iam_client: boto3.client) -> str:
         )
         logger.debug("Attached instance profile to IAM role successfully")
     except ClientError as error:
-        logger.error(f"Unable to attach instance profile to IAM role: {error}")
-        click.echo(
-            "\r\nUnable to attach instance profile to IAM role, see the logs for more details."
+        if error.response["Error"]["Code"] != "LimitExceeded":
+            logger.error(f"Unable to attach instance profile to IAM role: {error}")
+            raise InstanceProfileError(
+                "Unable to attach instance profile to IAM role"
+            ) from error
+        # The single role slot was taken by a concurrent launch, make sure it is ours
+        if SSM_ROLE_NAME not in reconcile_ssm_instance_profile(iam_client):
+            logger.error(f"Unable to attach instance profile to IAM role: {error}")
+            raise InstanceProfileError(
+                "Unable to attach instance profile to IAM role"
+            ) from error
+
+
+def get_cached_ssm_instance_profile(
+    account_id: Optional[str], iam_ttl: int = IAM_CACHE_TTL
+) -> Optional[str]:
+    """Get the Session Manager instance profile verified for the account, None when it is not cached."""
+    if account_id and get_cache_entry(IAM_CACHE_NAME, account_id, iam_ttl):
+        logger.debug(f"Using cached instance profile for account {account_id}")
+        return SSM_ROLE_NAME
+    return None
+
+
+def cache_ssm_instance_profile(account_id: Optional[str]):
+    """Remember that the Session Manager instance profile of the account is verified."""
+    if account_id:
+        set_cache_entry(IAM_CACHE_NAME, account_id, {"instance_profile": SSM_ROLE_NAME})
+
+
+def clear_ssm_instance_profile(sts_client: boto3.client):
+    """Forget the Session Manager instance profile of the account, it is verified again on next use."""
+    delete_cache_entry(IAM_CACHE_NAME, get_client_account_id(boto3_client=sts_client))
+
+
+@spinner(text="Creating IAM role for Session Manager\r\n")
+def create_ssm_instance_profile(
+    iam_client: boto3.client,
+    sts_client: boto3.client = None,
+    iam_ttl: int = IAM_CACHE_TTL,
+) -> str:
+    """Create an instance profile for connecting to the instance via AWS Session Manager.
+
+    The role, its policy and the instance profile are read first and only the missing pieces are
+    created, so a half configured account is repaired. When an STS client is given, the verified
+    state is cached locally per account and repeated launches skip IAM entirely.
+    """
+    account_id = get_client_account_id(boto3_client=sts_client) if sts_client else None
+    if get_cached_ssm_instance_profile(account_id=account_id, iam_ttl=iam_ttl):
+        return SSM_ROLE_NAME
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        role_future = executor.submit(reconcile_ssm_role, iam_client=iam_client)
+        instance_profile_future = executor.submit(
+            reconcile_ssm_instance_profile, iam_client=iam_client
         )
-        exit(1)
+        role_future.result()
+        instance_profile_roles = instance_profile_future.result()
+
+    attach_ssm_role_to_instance_profile(
+        iam_client=iam_client, instance_profile_roles=instance_profile_roles
+    )
+    cache_ssm_instance_profile(account_id=account_id)
     return SSM_ROLE_NAME
 
 
-@Halo(text="Getting keypairs\r\n", spinner="dots")
+@spinner(text="Getting keypairs\r\n")
 def get_key_pairs(ec2_client: boto3.client) -> list:
     """Discover the list of EC2 keypairs in the current operating region."""
     key_pair_list = []
@@ -103,19 +247,16 @@ def get_key_pairs(ec2_client: boto3.client) -> list:
         describe_key_pairs_response = ec2_client.describe_key_pairs()
     except ClientError as error:
         logger.error(f"Error utilizing AWS credentials: {error}")
-        click.echo(
-            "\r\nError utilizing AWS credentials, see the logs for more details."
-        )
-        exit(1)
+        raise AWSAccessError("Error utilizing AWS credentials") from error
     for key_pair in describe_key_pairs_response.get("KeyPairs"):
         key_pair_list.append(key_pair.get("KeyName"))
     return key_pair_list
 
 
-@Halo(text="Getting subnet\r\n", spinner="dots")
-def get_subnet_id(vpc_id: str, ec2_client: boto3.client) -> str:
-    """Return the default subnet of the given VPC ID."""
-    logger.debug("Getting subnet")
+@spinner(text="Getting subnet\r\n")
+def get_vpc_subnets(vpc_id: str, ec2_client: boto3.client) -> list:
+    """Return the subnets of the given VPC ID."""
+    logger.debug("Getting subnets")
     try:
         describe_subnets_response = ec2_client.describe_subnets(
             Filters=[
@@ -129,13 +270,236 @@ def get_subnet_id(vpc_id: str, ec2_client: boto3.client) -> str:
         )
     except ClientError as error:
         logger.error(f"Error getting subnet: {error}")
-        click.echo("\r\nError getting subnet, see the logs for more details.")
-        exit(1)
+        raise NetworkError("Error getting subnet") from error
+
+    return describe_subnets_response["Subnets"]
+
+
+def get_subnet_index_key(vpc_id: str, ec2_client: boto3.client) -> str:
+    """Get the key of the subnets of the given VPC ID in the subnet index cache."""
+    region = get_region_from_boto3_client(boto3_client=ec2_client)
+    return f"{region}|{vpc_id}"
+
+
+def get_subnet_index(
+    vpc_id: str, ec2_client: boto3.client, ttl: int = SUBNET_INDEX_CACHE_TTL
+) -> list:
+    """Get the subnets of the given VPC ID with their availability zone and free IP addresses.
+
+    The index is cached for a short time only, since the free IP addresses change as instances
+    come and go.
+    """
+    cache_key = get_subnet_index_key(vpc_id=vpc_id, ec2_client=ec2_client)
+    cached_index = get_cache_entry(name=SUBNET_INDEX_CACHE_NAME, key=cache_key, ttl=ttl)
+    if cached_index:
+        logger.debug(f"Using cached subnets of {vpc_id}")
+        return cached_index["subnets"]
+    subnets = [
+        {
+            "subnet_id": subnet["SubnetId"],
+            "availability_zone": subnet["AvailabilityZone"],
+            "available_ip_address_count": subnet["AvailableIpAddressCount"],
+        }
+        for subnet in get_vpc_subnets(vpc_id=vpc_id, ec2_client=ec2_client)
+    ]
+    set_cache_entry(
+        name=SUBNET_INDEX_CACHE_NAME, key=cache_key, entry={"subnets": subnets}
+    )
+    return subnets
+
+
+def clear_subnet_index(vpc_id: str, ec2_client: boto3.client):
+    """Forget the subnets of the given VPC ID, they are described again on next use."""
+    delete_cache_entry(
+        SUBNET_INDEX_CACHE_NAME,
+        get_subnet_index_key(vpc_id=vpc_id, ec2_client=ec2_client),
+    )
+
+
+def get_instance_types(
+    ec2_client: boto3.client, ttl: int = INSTANCE_TYPES_CACHE_TTL
+) -> Optional[dict]:
+    """Get the instance types of the region with their supported architectures, or None when they are unknown.
+
+    The instance types rarely change, so they are cached per region on disk for ttl seconds.
+    """
+    region = get_region_from_boto3_client(boto3_client=ec2_client)
+    cached_instance_types = get_cache_entry(
+        name=INSTANCE_TYPES_CACHE_NAME, key=region, ttl=ttl
+    )
+    if cached_instance_types:
+        return cached_instance_types["instance_types"]
+    logger.debug("Getting the instance types")
+    try:
+        instance_types = {
+            instance_type["InstanceType"]: instance_type["ProcessorInfo"][
+                "SupportedArchitectures"
+            ]
+            for page in ec2_client.get_paginator("describe_instance_types").paginate()
+            for instance_type in page["InstanceTypes"]
+        }
+    except ClientError as error:
+        logger.debug(f"Unable to get the instance types: {error}")
+        return None
+    set_cache_entry(
+        name=INSTANCE_TYPES_CACHE_NAME,
+        key=region,
+        entry={"instance_types": instance_types},
+    )
+    return instance_types
+
+
+def get_instance_type_offerings(
+    ec2_client: boto3.client, ttl: int = INSTANCE_TYPES_CACHE_TTL
+) -> Optional[dict]:
+    """Get the availability zones that offer each instance type of the region, or None when they are unknown.
+
+    The offerings are cached per region on disk for ttl seconds.
+    """
+    region = get_region_from_boto3_client(boto3_client=ec2_client)
+    cached_offerings = get_cache_entry(
+        name=INSTANCE_TYPE_OFFERINGS_CACHE_NAME, key=region, ttl=ttl
+    )
+    if cached_offerings:
+        return cached_offerings["availability_zones"]
+    logger.debug("Getting the instance type offerings")
+    availability_zones = {}
+    try:
+        for page in ec2_client.get_paginator(
+            "describe_instance_type_offerings"
+        ).paginate(LocationType="availability-zone"):
+            for offering in page["InstanceTypeOfferings"]:
+                availability_zones.setdefault(offering["InstanceType"], []).append(
+                    offering["Location"]
+                )
+    except ClientError as error:
+        logger.debug(f"Unable to get the instance type offerings: {error}")
+        return None
+    set_cache_entry(
+        name=INSTANCE_TYPE_OFFERINGS_CACHE_NAME,
+        key=region,
+        entry={"availability_zones": availability_zones},
+    )
+    return availability_zones
+
+
+def get_instance_type_zones(
+    instance_type: str,
+    ec2_client: boto3.client,
+    ttl: int = INSTANCE_TYPES_CACHE_TTL,
+) -> Optional[list]:
+    """Get the availability zones that offer an instance type, or None when they are unknown."""
+    offerings = get_instance_type_offerings(ec2_client=ec2_client, ttl=ttl)
+    return None if offerings is None else offerings.get(instance_type, [])
+
+
+def validate_instance_type(
+    instance_type: str,
+    ec2_client: boto3.client,
+    architecture: str = DEFAULT_ARCHITECTURE,
+    ttl: int = INSTANCE_TYPES_CACHE_TTL,
+):
+    """Check that an instance type exists, runs the AMI architecture and is offered in the region.
+
+    The check runs on the cached instance types and offerings, so a wrong instance type fails before
+    any write call. Misspelled instance types get the closest existing ones as suggestions. The
+    check is skipped when the instance types cannot be read.
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        offerings_future = executor.submit(
+            get_instance_type_offerings, ec2_client=ec2_client, ttl=ttl
+        )
+        instance_types = get_instance_types(ec2_client=ec2_client, ttl=ttl)
+        offerings = offerings_future.result()
+    check_instance_type(
+        instance_type=instance_type,
+        instance_types=instance_types,
+        offerings=offerings,
+        region=get_region_from_boto3_client(boto3_client=ec2_client),
+        architecture=architecture,
+    )
+
+
+def check_instance_type(
+    instance_type: str,
+    instance_types: Optional[dict],
+    offerings: Optional[dict],
+    region: str,
+    architecture: str = DEFAULT_ARCHITECTURE,
+):
+    """Check an instance type against the instance types and offerings of the region, see validate_instance_type."""
+    if instance_types is None:
+        logger.debug(f"Instance type {instance_type} cannot be validated")
+        return
+    if instance_type not in instance_types:
+        error_message = f"Instance type {instance_type} does not exist in {region}"
+        suggestions = difflib.get_close_matches(
+            instance_type, list(instance_types), n=INSTANCE_TYPE_SUGGESTIONS
+        )
+        if suggestions:
+            error_message += f" (did you mean {', '.join(suggestions)})"
+        logger.error(error_message)
+        raise InstanceTypeError(error_message)
+    if architecture not in instance_types[instance_type]:
+        logger.error(
+            f"Instance type {instance_type} supports {instance_types[instance_type]}, not {architecture}"
+        )
+        raise InstanceTypeError(
+            f"Instance type {instance_type} does not support the {architecture} AMI of the launch template"
+        )
+    if offerings is not None and not offerings.get(instance_type):
+        logger.error(f"Instance type {instance_type} is not offered in {region}")
+        raise InstanceTypeError(
+            f"Instance type {instance_type} is not offered in any availability zone of {region}"
+        )
+
+
+def rank_subnets(subnet_index: list, availability_zones: list = None) -> list:
+    """Rank the subnets that can take instances, the most free IP addresses first.
+
+    Subnets without free IP addresses, or outside the availability zones when they are given, are
+    left out. Returns the ranked subnet IDs.
+    """
+    return [
+        subnet["subnet_id"]
+        for subnet in sorted(
+            subnet_index,
+            key=itemgetter("available_ip_address_count"),
+            reverse=True,
+        )
+        if subnet["available_ip_address_count"] > 0
+        and (
+            availability_zones is None
+            or subnet["availability_zone"] in availability_zones
+        )
+    ]
+
+
+def get_ranked_subnet_ids(
+    vpc_id: str, ec2_client: boto3.client, instance_type: str = None
+) -> list:
+    """Get the subnets of the given VPC ID that can take instances of the type, the best first."""
+    return rank_subnets(
+        subnet_index=get_subnet_index(vpc_id=vpc_id, ec2_client=ec2_client),
+        availability_zones=instance_type
+        and get_instance_type_zones(instance_type=instance_type, ec2_client=ec2_client),
+    )
 
-    return describe_subnets_response["Subnets"][-1]["SubnetId"]
+
+def get_subnet_id(
+    vpc_id: str, ec2_client: boto3.client, instance_type: str = None
+) -> str:
+    """Return the subnet of the given VPC ID with the most free IP addresses."""
+    subnet_ids = get_ranked_subnet_ids(
+        vpc_id=vpc_id, ec2_client=ec2_client, instance_type=instance_type
+    )
+    if not subnet_ids:
+        logger.error(f"No subnet of {vpc_id} has free IP addresses")
+        raise NetworkError("No subnet with free IP addresses")
+    return subnet_ids[0]
 
 
-@Halo(text="Getting the default VPC\r\n", spinner="dots")
+@spinner(text="Getting the default VPC\r\n")
 def get_default_vpc_id(ec2_client: boto3.client) -> str:
     """Return the default VPC ID of the current operating region."""
     logger.debug("Looking for default VPC")
@@ -147,14 +511,28 @@ def get_default_vpc_id(ec2_client: boto3.client) -> str:
         )
     except ClientError as error:
         logger.error(f"Error looking for default VPC: {error}")
-        click.echo("\r\nError looking for default VPC, see the logs for more details.")
-        exit(1)
+        raise NetworkError("Error looking for default VPC") from error
+    if not vpcs_response["Vpcs"]:
+        logger.error("No default VPC in the region")
+        raise NetworkError(
+            "No default VPC in the region, create one to launch instances"
+        )
     return vpcs_response["Vpcs"][0]["VpcId"]
 
 
-@Halo(text="Creating security group\r\n", spinner="dots")
-def create_security_group(vpc_id: str, os_type: str, ec2_client: boto3.client) -> Any:
-    """Create a security group that allow access to the needed OS type from the public IP of the computer."""
+@spinner(text="Creating security group\r\n")
+def create_security_group(
+    vpc_id: str,
+    os_type: str,
+    ec2_client: boto3.client,
+    ip_address: str = None,
+    resolve_ip_address: Callable[[], str] = None,
+) -> Any:
+    """Create a security group that allow access to the needed OS type from the public IP of the computer.
+
+    The public IP is only needed to authorize the ingress rule, so it can be resolved by
+    resolve_ip_address while the security group is looked up.
+    """
     security_group_name = f"{get_username()}-sg"
 
     logger.debug("Creating security group")
@@ -182,19 +560,14 @@ def create_security_group(vpc_id: str, os_type: str, ec2_client: boto3.client) -
                 return create_security_group_response
             except ClientError as error:
                 logger.error(f"Error creating security group: {error}")
-                click.echo(
-                    "\r\nError creating security group, see the logs for more details."
-                )
-                exit(1)
+                raise NetworkError("Error creating security group") from error
         else:
             logger.error(f"Error describing current security groups: {error}")
-            click.echo(
-                "\r\nError describing current security groups, see the logs for more details."
-            )
-            exit(1)
+            raise NetworkError("Error describing current security groups") from error
 
     security_group = describe_security_groups_response["SecurityGroups"][0]
     security_group_id = security_group["GroupId"]
+    ip_address = ip_address or (resolve_ip_address or get_ip_address)()
     logger.debug("Authorizing ingress rule")
     try:
         ec2_client.authorize_security_group_ingress(
@@ -205,7 +578,7 @@ def create_security_group(vpc_id: str, os_type: str, ec2_client: boto3.client) -
                     "IpProtocol": "TCP",
                     "IpRanges": [
                         {
-                            "CidrIp": f"{get_ip_address()}/32",
+                            "CidrIp": f"{ip_address}/32",
                             "Description": f"Access from {get_username()} computer",
                         },
                     ],
@@ -220,10 +593,7 @@ def create_security_group(vpc_id: str, os_type: str, ec2_client: boto3.client) -
             return security_group
         else:
             logger.error(f"Error authorizing security group ingress: {error}")
-            click.echo(
-                "\r\nError authorizing security group ingress, see the logs for more details."
-            )
-            exit(1)
+            raise NetworkError("Error authorizing security group ingress") from error
 
 
 def get_latest_launch_template(os_type: str, ec2_client: boto3.client) -> Any:
@@ -236,295 +606,1254 @@ def get_latest_launch_template(os_type: str, ec2_client: boto3.client) -> Any:
         )
     except ClientError as error:
         logger.error(
-            f"Error fetching launch template {get_launch_template_name(os_type=os_type)}, \
-                please make sure that the launch template exist or run `secure_ec2 config` to generate it",
-            error,
+            f"Error fetching launch template {get_launch_template_name(os_type=os_type)}, "
+            f"please make sure that the launch template exist or run `secure_ec2 config` to generate it: {error}"  # noqa: E501
         )
-        click.echo("\r\nError fetching launch template, see the logs for more details.")
-        exit(1)
+        raise LaunchTemplateError("Error fetching launch template") from error
 
     return ec2_response["LaunchTemplates"][0]
 
 
-@Halo(text="Getting latest AMI\r\n", spinner="dots")
-def get_latest_ami_id(os_type: str, ec2_client: any) -> str:
-    """Return the latest AMI ID, considered by the chosen operating system."""
+def iter_images(filters: list, ec2_client: boto3.client) -> Iterator[dict]:
+    """Stream the images matching the given filters page by page."""
+    paginator = ec2_client.get_paginator("describe_images")
+    for page in paginator.paginate(
+        Filters=filters,
+        PaginationConfig={"PageSize": DESCRIBE_IMAGES_PAGE_SIZE},
+    ):
+        yield from page["Images"]
+
+
+@spinner(text="Getting latest AMI\r\n")
+def get_latest_ami_id(
+    os_type: str,
+    ec2_client: any,
+    architecture: str = DEFAULT_ARCHITECTURE,
+    ami_ttl: int = AMI_CACHE_TTL,
+    refresh_ami: bool = False,
+) -> str:
+    """Return the latest AMI ID, considered by the chosen operating system.
+
+    Resolved AMI IDs are cached per region, OS type, regex and architecture for ami_ttl seconds,
+    unless refresh_ami is set.
+    """
     os_regex = get_os_regex(os_type=os_type)
+    region = get_region_from_boto3_client(boto3_client=ec2_client)
+    cache_key = f"{region}|{os_type.lower()}|{os_regex}|{architecture}"
+    if not refresh_ami:
+        cached_ami = get_cache_entry(name=AMI_CACHE_NAME, key=cache_key, ttl=ami_ttl)
+        if cached_ami:
+            logger.debug(
+                f"Using cached {os_type} AMI {cached_ami['image_id']} resolved at {cached_ami['resolved_at']}"
+            )
+            return cached_ami["image_id"]
 
     logger.debug(f"Getting latest {os_type} AMI")
     try:
-        response = ec2_client.describe_images(
-            Filters=[
-                {
-                    "Name": "name",
-                    "Values": [
-                        os_regex,
-                    ],
-                },
-                {
-                    "Name": "owner-id",
-                    "Values": [
-                        AMAZON_AMI_OWNER_ID,
-                    ],
-                },
-            ],
+        # Keep a running max on Creation date instead of sorting every image
+        latest_image = max(
+            iter_images(
+                filters=[
+                    {"Name": "name", "Values": [os_regex]},
+                    {"Name": "owner-id", "Values": [AMAZON_AMI_OWNER_ID]},
+                    {"Name": "architecture", "Values": [architecture]},
+                    {"Name": "state", "Values": ["available"]},
+                    {"Name": "virtualization-type", "Values": ["hvm"]},
+                ],
+                ec2_client=ec2_client,
+            ),
+            key=itemgetter("CreationDate"),
+            default=None,
         )
     except ClientError as error:
         logger.error(f"Error getting AMI: {error}")
-        click.echo("\r\nError getting AMI, see the logs for more details.")
-        exit(1)
+        raise AMINotFoundError("Error getting AMI") from error
+
+    if latest_image is None:
+        logger.error(f"No {architecture} AMI found matching {os_regex}")
+        raise AMINotFoundError("Error getting AMI")
 
-    # Sort on Creation date Desc
-    logger.debug("Sorting AMI results")
-    image_details = sorted(
-        response["Images"], key=itemgetter("CreationDate"), reverse=True
+    set_cache_entry(
+        name=AMI_CACHE_NAME, key=cache_key, entry={"image_id": latest_image["ImageId"]}
     )
+    return latest_image["ImageId"]
+
+
+@spinner(text="Resolving latest AMIs\r\n")
+def resolve_latest_ami_ids(
+    os_types: list,
+    ec2_client: boto3.client,
+    ssm_client: boto3.client = None,
+    architecture: str = DEFAULT_ARCHITECTURE,
+    ami_ttl: int = AMI_CACHE_TTL,
+    refresh_ami: bool = False,
+) -> dict:
+    """Return the latest AMI ID of every OS type, read from the AWS published SSM public parameters.
+
+    All the parameters are read in a single GetParameters call. OS types without a parameter, or
+    every OS type when no SSM client is given, fall back to scanning the images with get_latest_ami_id.
+    """
+    region = get_region_from_boto3_client(boto3_client=ec2_client)
+    ami_ids = {}
+    parameter_os_types = {}
+    for os_type in os_types:
+        parameter_name = ssm_client and get_os_ssm_parameter(
+            os_type=os_type, architecture=architecture
+        )
+        if not parameter_name:
+            continue
+        cache_key = f"{region}|{os_type.lower()}|{parameter_name}|{architecture}"
+        cached_ami = (
+            None
+            if refresh_ami
+            else get_cache_entry(name=AMI_CACHE_NAME, key=cache_key, ttl=ami_ttl)
+        )
+        if cached_ami:
+            logger.debug(
+                f"Using cached {os_type} AMI {cached_ami['image_id']} resolved at {cached_ami['resolved_at']}"
+            )
+            ami_ids[os_type] = cached_ami["image_id"]
+        else:
+            parameter_os_types[parameter_name] = os_type
+
+    if parameter_os_types:
+        logger.debug("Getting latest AMIs from the SSM public parameters")
+        try:
+            ssm_response = ssm_client.get_parameters(Names=list(parameter_os_types))
+        except ClientError as error:
+            logger.debug(f"Unable to read the SSM public parameters: {error}")
+            ssm_response = {"Parameters": []}
+        for parameter in ssm_response["Parameters"]:
+            os_type = parameter_os_types[parameter["Name"]]
+            ami_ids[os_type] = parameter["Value"]
+            set_cache_entry(
+                name=AMI_CACHE_NAME,
+                key=f"{region}|{os_type.lower()}|{parameter['Name']}|{architecture}",
+                entry={"image_id": parameter["Value"]},
+            )
 
-    ami_id = image_details[0]["ImageId"]
-    return ami_id
+    for os_type in os_types:
+        if os_type not in ami_ids:
+            logger.debug(f"No SSM public parameter for {os_type} AMI, scanning images")
+            ami_ids[os_type] = get_latest_ami_id(
+                os_type=os_type,
+                ec2_client=ec2_client,
+                architecture=architecture,
+                ami_ttl=ami_ttl,
+                refresh_ami=refresh_ami,
+            )
+    return ami_ids
 
 
-@Halo(text="Creating Launch Template\r\n", spinner="dots")
+@spinner(text="Creating Launch Template\r\n")
 def create_launch_template(
     os_type: str,
     ec2_client: boto3.client,
-) -> Any:
-    """Create a secure launch template that could be later used by the instance launch phase."""
-    image_id = get_latest_ami_id(os_type=os_type, ec2_client=ec2_client)
-    vpc_id = get_default_vpc_id(ec2_client=ec2_client)
-    subnet_id = get_subnet_id(vpc_id=vpc_id, ec2_client=ec2_client)
-    security_group = create_security_group(
-        vpc_id=vpc_id, os_type=os_type, ec2_client=ec2_client
-    )
+    ssm_client: boto3.client = None,
+    ami_ttl: int = AMI_CACHE_TTL,
+    refresh_ami: bool = False,
+    vpc_id: str = None,
+) -> dict:
+    """Create a secure launch template that could be later used by the instance launch phase.
+
+    When an SSM client is given the AMI is resolved from the SSM public parameters, otherwise
+    by scanning the images. A known VPC skips its discovery, the subnet with the most free IP
+    addresses is always picked from its subnet index. Returns the launch template ID and version
+    and the resources it uses.
+    """
+    logger.debug("Discovering launch template resources concurrently")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        image_ids_future = executor.submit(
+            resolve_latest_ami_ids,
+            os_types=[os_type],
+            ec2_client=ec2_client,
+            ssm_client=ssm_client,
+            ami_ttl=ami_ttl,
+            refresh_ami=refresh_ami,
+        )
+        ip_address_future = executor.submit(get_ip_address)
+        if not vpc_id:
+            vpc_id = executor.submit(get_default_vpc_id, ec2_client=ec2_client).result()
+        subnet_id_future = executor.submit(
+            get_subnet_id, vpc_id=vpc_id, ec2_client=ec2_client
+        )
+        security_group_future = executor.submit(
+            create_security_group,
+            vpc_id=vpc_id,
+            os_type=os_type,
+            ec2_client=ec2_client,
+            resolve_ip_address=ip_address_future.result,
+        )
+        image_id = image_ids_future.result()[os_type]
+        subnet_id = subnet_id_future.result()
+        security_group = security_group_future.result()
     logger.debug("Information gathering completed successfully")
+    return deploy_launch_template(
+        os_type=os_type,
+        image_id=image_id,
+        vpc_id=vpc_id,
+        subnet_id=subnet_id,
+        security_group_id=security_group["GroupId"],
+        ec2_client=ec2_client,
+    )
+
+
+def deploy_launch_template(
+    os_type: str,
+    image_id: str,
+    vpc_id: str,
+    subnet_id: str,
+    security_group_id: str,
+    ec2_client: boto3.client,
+) -> dict:
+    """Put the secure launch template built from the discovered resources.
+
+    Returns the launch template ID and version and the resources it uses.
+    """
+    launch_template = put_launch_template(
+        os_type=os_type,
+        launch_template_data=build_launch_template_data(
+            image_id=image_id,
+            subnet_id=subnet_id,
+            security_group_id=security_group_id,
+        ),
+        ec2_client=ec2_client,
+    )
+    return {
+        "launch_template_name": get_launch_template_name(os_type=os_type),
+        **launch_template,
+        "image_id": image_id,
+        "vpc_id": vpc_id,
+        "subnet_id": subnet_id,
+        "security_group_id": security_group_id,
+    }
+
+
+def build_launch_template_data(
+    image_id: str, subnet_id: str, security_group_id: str
+) -> dict:
+    """Build the data of the secure launch template from the discovered resources."""
     username = get_username()
+    return {
+        "BlockDeviceMappings": [
+            {
+                "DeviceName": "/dev/xvda",
+                "Ebs": {
+                    "Encrypted": True,
+                    "DeleteOnTermination": True,
+                    "VolumeSize": 30,
+                    "VolumeType": "gp2",
+                },
+            },
+        ],
+        "NetworkInterfaces": [
+            {
+                "SubnetId": subnet_id,
+                "DeviceIndex": 0,
+                "AssociatePublicIpAddress": True,
+                "Groups": [security_group_id],
+            }
+        ],
+        "ImageId": image_id,
+        "Monitoring": {"Enabled": False},
+        "TagSpecifications": [
+            {
+                "ResourceType": "instance",
+                "Tags": [
+                    {"Key": "Name", "Value": f"{username}-instance"},
+                    {"Key": "Owner", "Value": username},
+                ],
+            },
+        ],
+    }
+
+
+def hash_launch_template_data(launch_template_data: dict) -> str:
+    """Get a stable digest of the launch template data, independent of the keys order."""
+    serialized_launch_template_data = json.dumps(
+        launch_template_data, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(serialized_launch_template_data.encode()).hexdigest()[
+        :LAUNCH_TEMPLATE_HASH_LENGTH
+    ]
 
-    logger.debug("Creating Launch Template")
+
+def get_default_launch_template_version(
+    launch_template_name: str, ec2_client: boto3.client
+) -> Optional[dict]:
+    """Get the default version of a launch template, or None when the launch template does not exist."""
     try:
-        ec2_response = ec2_client.create_launch_template(
-            LaunchTemplateName=get_launch_template_name(os_type=os_type),
-            VersionDescription=f"Secure launch template for {username}, generated by {MODULE_NAME}",
-            LaunchTemplateData={
-                "BlockDeviceMappings": [
-                    {
-                        "DeviceName": "/dev/xvda",
-                        "Ebs": {
-                            "Encrypted": True,
-                            "DeleteOnTermination": True,
-                            "VolumeSize": 30,
-                            "VolumeType": "gp2",
-                        },
-                    },
-                ],
-                "NetworkInterfaces": [
-                    {
-                        "SubnetId": subnet_id,
-                        "DeviceIndex": 0,
-                        "AssociatePublicIpAddress": True,
-                        "Groups": [security_group["GroupId"]],
-                    }
-                ],
-                "ImageId": image_id,
-                "Monitoring": {"Enabled": False},
-                "TagSpecifications": [
+        describe_versions_response = ec2_client.describe_launch_template_versions(
+            LaunchTemplateName=launch_template_name, Versions=["$Default"]
+        )
+    except ClientError as error:
+        if (
+            error.response["Error"]["Code"]
+            == "InvalidLaunchTemplateName.NotFoundException"
+        ):
+            return None
+        logger.error(f"Error fetching launch template: {error}")
+        raise LaunchTemplateError("Error fetching launch template") from error
+    return describe_versions_response["LaunchTemplateVersions"][0]
+
+
+def put_launch_template(
+    os_type: str, launch_template_data: dict, ec2_client: boto3.client
+) -> dict:
+    """Create the launch template, or a new default version of it when its data changed.
+
+    The digest of the data is recorded in the version description, so a configuration that did
+    not change is detected with a single read and makes no write calls. Returns the ID and the
+    default version of the launch template.
+    """
+    username = get_username()
+    launch_template_name = get_launch_template_name(os_type=os_type)
+    launch_template_hash = hash_launch_template_data(launch_template_data)
+    default_version = get_default_launch_template_version(
+        launch_template_name=launch_template_name, ec2_client=ec2_client
+    )
+    if default_version and default_version.get("VersionDescription", "").endswith(
+        f"({launch_template_hash})"
+    ):
+        logger.debug("Launch template is up to date, skipping the new version")
+        return {
+            "launch_template_id": default_version["LaunchTemplateId"],
+            "launch_template_version": default_version["VersionNumber"],
+        }
+
+    if not default_version:
+        logger.debug("Creating Launch Template")
+        try:
+            ec2_response = ec2_client.create_launch_template(
+                LaunchTemplateName=launch_template_name,
+                VersionDescription=f"Secure launch template for {username}, generated by {MODULE_NAME} ({launch_template_hash})",  # noqa: E501
+                LaunchTemplateData=launch_template_data,
+                TagSpecifications=[
                     {
-                        "ResourceType": "instance",
+                        "ResourceType": "launch-template",
                         "Tags": [
-                            {"Key": "Name", "Value": f"{username}-instance"},
+                            {"Key": "Name", "Value": launch_template_name},
                             {"Key": "Owner", "Value": username},
                         ],
                     },
                 ],
-            },
-            TagSpecifications=[
-                {
-                    "ResourceType": "launch-template",
-                    "Tags": [
-                        {
-                            "Key": "Name",
-                            "Value": get_launch_template_name(os_type=os_type),
-                        },
-                        {"Key": "Owner", "Value": username},
-                    ],
-                },
-            ],
+            )
+            logger.debug("Launch template created successfully")
+            return {
+                "launch_template_id": ec2_response["LaunchTemplate"][
+                    "LaunchTemplateId"
+                ],
+                "launch_template_version": ec2_response["LaunchTemplate"][
+                    "DefaultVersionNumber"
+                ],
+            }
+        except ClientError as error:
+            # Another configuration may have created it in the meantime
+            if (
+                error.response["Error"]["Code"]
+                != "InvalidLaunchTemplateName.AlreadyExistsException"
+            ):
+                logger.error(f"Error creating launch template: {error}")
+                raise LaunchTemplateError("Error creating launch template") from error
+
+    logger.debug("Launch template changed, deploying new version")
+    try:
+        ec2_response = ec2_client.create_launch_template_version(
+            LaunchTemplateName=launch_template_name,
+            VersionDescription=f"Secure launch template for {username} ({launch_template_hash})",
+            LaunchTemplateData=launch_template_data,
         )
-        logger.debug("Launch template created successfully")
     except ClientError as error:
-        if (
-            error.response["Error"]["Code"]
-            == "InvalidLaunchTemplateName.AlreadyExistsException"
-        ):
-            logger.debug("Launch template already exist, deploying new version")
-            try:
-                ec2_response = ec2_client.create_launch_template_version(
-                    LaunchTemplateName=get_launch_template_name(os_type=os_type),
-                    VersionDescription=f"Secure launch template for {username}",
-                    LaunchTemplateData={
-                        "BlockDeviceMappings": [
-                            {
-                                "DeviceName": "/dev/xvda",
-                                "Ebs": {
-                                    "Encrypted": True,
-                                    "DeleteOnTermination": True,
-                                    "VolumeSize": 30,
-                                    "VolumeType": "gp2",
-                                },
-                            },
-                        ],
-                        "NetworkInterfaces": [
-                            {
-                                "SubnetId": subnet_id,
-                                "DeviceIndex": 0,
-                                "AssociatePublicIpAddress": True,
-                                "Groups": [security_group["GroupId"]],
-                            }
-                        ],
-                        "ImageId": image_id,
-                        "Monitoring": {"Enabled": False},
-                        "TagSpecifications": [
-                            {
-                                "ResourceType": "instance",
-                                "Tags": [
-                                    {
-                                        "Key": "Name",
-                                        "Value": f"{username}-instance",
-                                    },
-                                    {"Key": "Owner", "Value": username},
-                                ],
-                            },
-                        ],
-                    },
-                )
-            except ClientError as error:
-                logger.error(f"Error creating launch template version: {error}")
-                click.echo(
-                    "\r\nError creating launch template version, see the logs for more details."
-                )
-                exit(1)
-            logger.debug("Launch template version created successfully")
-            launch_template_version = ec2_response["LaunchTemplateVersion"][
-                "VersionNumber"
-            ]
+        logger.error(f"Error creating launch template version: {error}")
+        raise LaunchTemplateError("Error creating launch template version") from error
+    logger.debug("Launch template version created successfully")
+    launch_template_version = ec2_response["LaunchTemplateVersion"]["VersionNumber"]
+    logger.debug("Updating launch template default version to the latest version")
+    try:
+        ec2_client.modify_launch_template(
+            LaunchTemplateName=launch_template_name,
+            DefaultVersion=str(launch_template_version),
+        )
+    except ClientError as error:
+        logger.error(f"Error modifying launch template default version: {error}")
+        raise LaunchTemplateError(
+            "Error modifying launch template default version"
+        ) from error
+    logger.debug("Launch template default version updated successfully")
+    return {
+        "launch_template_id": ec2_response["LaunchTemplateVersion"]["LaunchTemplateId"],
+        "launch_template_version": launch_template_version,
+    }
+
+
+def get_launch_template_specification(launch_template: dict) -> dict:
+    """Reference a launch template by ID and version when they are known, otherwise by name."""
+    if launch_template.get("LaunchTemplateId") and launch_template.get(
+        "DefaultVersionNumber"
+    ):
+        return {
+            "LaunchTemplateId": launch_template["LaunchTemplateId"],
+            "Version": str(launch_template["DefaultVersionNumber"]),
+        }
+    return {"LaunchTemplateName": launch_template["LaunchTemplateName"]}
+
+
+def try_launch_instances(
+    launch_template: dict,
+    num_instances: int,
+    instance_type: str,
+    ec2_client: boto3.client,
+    keypair: str = "None",
+    min_count: int = None,
+    network_interface: dict = None,
+) -> Optional[list]:
+    """Run instances from the launch template, returning their IDs.
+
+    At least min_count instances are launched, all of them by default. The network interface of
+    the launch template can be replaced to launch in another subnet. Returns None when EC2 is out
+    of capacity for the instance type in the subnet, or its zone does not offer the type.
+    """
+    access = "SSM" if keypair == "None" else "Keypair"
+    logger.debug(f"Provisioning instance with {access} access")
+    run_instances_kwargs = {
+        "LaunchTemplate": get_launch_template_specification(launch_template),
+        "InstanceType": instance_type,
+        "MaxCount": num_instances,
+        "MinCount": min_count or num_instances,
+    }
+    if keypair != "None":
+        run_instances_kwargs["KeyName"] = keypair
+    if network_interface:
+        run_instances_kwargs["NetworkInterfaces"] = [network_interface]
+    try:
+        ec2_response = ec2_client.run_instances(**run_instances_kwargs)
+    except ClientError as error:
+        error_code = error.response["Error"]["Code"]
+        if error_code in INSUFFICIENT_CAPACITY_ERROR_CODES:
             logger.debug(
-                "Updating launch template default version to the latest version"
+                f"Insufficient capacity for {instance_type} instances: {error}"
             )
-            try:
-                ec2_response = ec2_client.modify_launch_template(
-                    LaunchTemplateName=get_launch_template_name(os_type=os_type),
-                    DefaultVersion=str(launch_template_version),
-                )
-            except ClientError as error:
-                logger.error(
-                    f"Error modifying launch template default version: {error}"
-                )
-                click.echo(
-                    "\r\nError modifying launch template default version, see the logs for more details."
-                )
-                exit(1)
-            logger.debug("Launch template default version updated successfully")
+            return None
+        if error_code in UNSUPPORTED_ZONE_ERROR_CODES:
+            logger.debug(f"{instance_type} is not offered in the subnet zone: {error}")
+            return None
+        if error_code in STALE_LAUNCH_TEMPLATE_ERROR_CODES:
+            logger.error(f"Launch template or its resources are not available: {error}")
+            raise LaunchTemplateError(
+                "Error launching from the launch template, run `secure_ec2 config` to refresh it"
+            ) from error
+        logger.error(f"Error provisioning instance with {access} access: {error}")
+        raise InstanceProvisioningError(
+            f"Error provisioning instance with {access} access"
+        ) from error
+    return [instance["InstanceId"] for instance in ec2_response["Instances"]]
+
+
+def get_launch_subnets(
+    launch_template: dict, ec2_client: boto3.client, instance_type: str = None
+) -> tuple:
+    """Get the network interface of the launch template and the ranked subnet IDs of its VPC.
+
+    A launch template without a network interface launches in the default subnet of the region,
+    so it has no other subnets to spread over. Also returns the free IP addresses of the subnets,
+    from the subnet index.
+    """
+    launch_template_specification = get_launch_template_specification(launch_template)
+    try:
+        describe_versions_response = ec2_client.describe_launch_template_versions(
+            Versions=[launch_template_specification.pop("Version", "$Default")],
+            **launch_template_specification,
+        )
+        network_interfaces = describe_versions_response["LaunchTemplateVersions"][0][
+            "LaunchTemplateData"
+        ].get("NetworkInterfaces")
+        if not network_interfaces:
+            return {}, [], {}
+        describe_subnets_response = ec2_client.describe_subnets(
+            SubnetIds=[network_interfaces[0]["SubnetId"]]
+        )
+    except ClientError as error:
+        if error.response["Error"]["Code"] in STALE_LAUNCH_TEMPLATE_ERROR_CODES:
+            logger.error(f"Launch template or its resources are not available: {error}")
+            raise LaunchTemplateError(
+                "Error launching from the launch template, run `secure_ec2 config` to refresh it"
+            ) from error
+        logger.error(f"Error getting the subnets of the launch template: {error}")
+        raise NetworkError(
+            "Error getting the subnets of the launch template"
+        ) from error
+    subnet_index = get_subnet_index(
+        vpc_id=describe_subnets_response["Subnets"][0]["VpcId"], ec2_client=ec2_client
+    )
+    subnet_ids = rank_subnets(
+        subnet_index=subnet_index,
+        availability_zones=instance_type
+        and get_instance_type_zones(instance_type=instance_type, ec2_client=ec2_client),
+    )
+    free_ip_counts = {
+        subnet["subnet_id"]: subnet["available_ip_address_count"]
+        for subnet in subnet_index
+    }
+    return network_interfaces[0], subnet_ids, free_ip_counts
+
+
+def plan_launch_chunks(
+    num_instances: int,
+    subnet_ids: list,
+    chunk_size: int = LAUNCH_CHUNK_SIZE,
+    free_ip_counts: dict = None,
+) -> list:
+    """Spread the instances evenly over the subnets, in chunks of at most chunk_size instances.
+
+    With the free IP addresses of the subnets, no subnet gets more instances than it has free
+    addresses, and the rest go to the subnets with the most free addresses left. Instances beyond
+    every free address still go to the first subnet, the addresses may have been freed since.
+    Returns a list of (subnet ID, number of instances) pairs, one per RunInstances call.
+    """
+    share, remainder = divmod(num_instances, len(subnet_ids))
+    subnet_shares = {
+        subnet_id: share + (1 if index < remainder else 0)
+        for index, subnet_id in enumerate(subnet_ids)
+    }
+    if free_ip_counts:
+        free_ips_left = {}
+        for subnet_id in subnet_ids:
+            free_ips = free_ip_counts.get(subnet_id, 0)
+            subnet_shares[subnet_id] = min(subnet_shares[subnet_id], free_ips)
+            free_ips_left[subnet_id] = free_ips - subnet_shares[subnet_id]
+        unplanned_instances = num_instances - sum(subnet_shares.values())
+        for subnet_id in sorted(subnet_ids, key=free_ips_left.get, reverse=True):
+            extra_instances = min(unplanned_instances, free_ips_left[subnet_id])
+            subnet_shares[subnet_id] += extra_instances
+            unplanned_instances -= extra_instances
+        subnet_shares[subnet_ids[0]] += unplanned_instances
+
+    launch_chunks = []
+    for subnet_id in subnet_ids:
+        subnet_instances = subnet_shares[subnet_id]
+        while subnet_instances > 0:
+            launch_chunks.append((subnet_id, min(subnet_instances, chunk_size)))
+            subnet_instances -= chunk_size
+    return launch_chunks
+
+
+def get_chunk_network_interface(network_interface: dict, subnet_id: str) -> dict:
+    """Get the network interface that launches a chunk in its subnet, None for the launch template's."""
+    return dict(network_interface, SubnetId=subnet_id) if subnet_id else None
+
+
+def collect_chunk_results(launch_chunks: list, chunk_outcomes: list) -> tuple:
+    """Pair the instance IDs launched by every chunk with its subnet, keeping the first chunk error.
+
+    chunk_outcomes holds the instance IDs of each chunk, None when it had no capacity, or the error
+    it raised. Returns (subnet ID, instance IDs) pairs and the first error, or None.
+    """
+    chunk_results = []
+    launch_error = None
+    for (subnet_id, _), chunk_outcome in zip(launch_chunks, chunk_outcomes):
+        if isinstance(chunk_outcome, BaseException):
+            if not isinstance(chunk_outcome, (SecureEC2Error, BotoCoreError)):
+                raise chunk_outcome
+            chunk_results.append((subnet_id, []))
+            launch_error = launch_error or chunk_outcome
         else:
-            logger.error(f"Error creating launch template: {error}")
-            click.echo(
-                "\r\nError creating launch template, see the logs for more details."
-            )
-            exit(1)
+            chunk_results.append((subnet_id, chunk_outcome or []))
+    return chunk_results, launch_error
 
 
-@Halo(text="Provisioning instance with the selected configuration\r\n", spinner="dots")
-def provision_ec2_instance(
-    launch_template: any,
+def get_chunk_instance_ids(chunk_results: list) -> list:
+    """Get the instance IDs launched by all the chunks."""
+    return [
+        instance_id
+        for _, chunk_instance_ids in chunk_results
+        for instance_id in chunk_instance_ids
+    ]
+
+
+def launch_instance_chunks(
+    launch_template: dict,
+    launch_chunks: list,
+    network_interface: dict,
+    instance_type: str,
+    ec2_client: boto3.client,
+    keypair: str = "None",
+    partial: bool = False,
+) -> tuple:
+    """Run the chunks of a launch concurrently, each in its own subnet.
+
+    Every chunk launches all of its instances or none of them, unless partial is set, in which
+    case it launches as many as EC2 has capacity for. A failing chunk does not discard the
+    instances of the others. A single chunk runs in the calling thread. Returns (subnet ID,
+    instance IDs) pairs and the first error raised by a chunk, or None.
+    """
+
+    def launch_chunk(subnet_id: Optional[str], chunk_instances: int) -> Optional[list]:
+        return try_launch_instances(
+            launch_template=launch_template,
+            num_instances=chunk_instances,
+            instance_type=instance_type,
+            ec2_client=ec2_client,
+            keypair=keypair,
+            min_count=1 if partial else None,
+            network_interface=get_chunk_network_interface(
+                network_interface=network_interface, subnet_id=subnet_id
+            ),
+        )
+
+    if len(launch_chunks) == 1:
+        try:
+            chunk_outcomes = [launch_chunk(*launch_chunks[0])]
+        except (SecureEC2Error, BotoCoreError) as error:
+            chunk_outcomes = [error]
+    else:
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_WORKERS, len(launch_chunks))
+        ) as executor:
+            chunk_futures = [
+                executor.submit(launch_chunk, subnet_id, chunk_instances)
+                for subnet_id, chunk_instances in launch_chunks
+            ]
+            chunk_outcomes = [
+                chunk_future.exception() or chunk_future.result()
+                for chunk_future in chunk_futures
+            ]
+    return collect_chunk_results(
+        launch_chunks=launch_chunks, chunk_outcomes=chunk_outcomes
+    )
+
+
+def get_launch_shortfall(
+    num_instances: int, instance_ids: list, launch_error: Optional[Exception]
+) -> int:
+    """Get the number of instances a launch pass left to launch, none when an error stopped it."""
+    return 0 if launch_error else num_instances - len(instance_ids)
+
+
+def get_shortfall_subnet_ids(
+    subnet_ids: list, chunk_results: list, network_interface: dict
+) -> list:
+    """Get the subnets to launch the shortfall of a pass of all-or-nothing chunks in, with MinCount=1.
+
+    A subnet whose chunk could not be launched may still have capacity for part of it, so every
+    subnet is kept. The subnets whose chunks were launched come first and get the remainder of the
+    shortfall. A chunk without a subnet launched in the subnet of the launch template.
+    """
+    short_subnet_ids = {
+        subnet_id or network_interface.get("SubnetId")
+        for subnet_id, chunk_instance_ids in chunk_results
+        if not chunk_instance_ids
+    }
+    return sorted(subnet_ids, key=lambda subnet_id: subnet_id in short_subnet_ids)
+
+
+def try_launch_instances_across_subnets(
+    launch_template: dict,
     num_instances: int,
-    keypair: str,
     instance_type: str,
     ec2_client: boto3.client,
-    iam_client: boto3.client,
-    ec2_resource: boto3.resource,
-    no_clip: bool = False,
-) -> str:
-    """Provision an EC2 instance according to launch template configurations."""
-    if keypair == "None":
-        logger.debug("Provisioning instance with SSM access")
-        ec2_response = ec2_client.run_instances(
-            LaunchTemplate={
-                "LaunchTemplateName": launch_template["LaunchTemplateName"],
-            },
-            InstanceType=instance_type,
-            MaxCount=num_instances,
-            MinCount=num_instances,
+    keypair: str = "None",
+    chunk_size: int = LAUNCH_CHUNK_SIZE,
+) -> tuple:
+    """Run as many of the instances as EC2 has capacity for.
+
+    A launch that fits in one chunk goes to the subnet of the launch template, larger launches are
+    spread over every subnet of the VPC with the chunks submitted concurrently. Every chunk is
+    all-or-nothing, so whatever EC2 had no capacity for is then launched with MinCount=1 across
+    every subnet, the subnets whose chunks fell short included. Returns the launched instance IDs
+    and the error that stopped the launch of the others, or None.
+    """
+    network_interface, subnet_ids, free_ip_counts = {}, [], {}
+    if num_instances > chunk_size:
+        network_interface, subnet_ids, free_ip_counts = get_launch_subnets(
+            launch_template=launch_template,
+            ec2_client=ec2_client,
+            instance_type=instance_type,
+        )
+    chunk_results, launch_error = launch_instance_chunks(
+        launch_template=launch_template,
+        launch_chunks=plan_launch_chunks(
+            num_instances=num_instances,
+            subnet_ids=subnet_ids or [None],
+            chunk_size=chunk_size,
+            free_ip_counts=free_ip_counts,
+        ),
+        network_interface=network_interface,
+        instance_type=instance_type,
+        ec2_client=ec2_client,
+        keypair=keypair,
+    )
+    instance_ids = get_chunk_instance_ids(chunk_results)
+    shortfall = get_launch_shortfall(
+        num_instances=num_instances,
+        instance_ids=instance_ids,
+        launch_error=launch_error,
+    )
+    if not shortfall:
+        return instance_ids, launch_error
+    if num_instances <= chunk_size:
+        network_interface, subnet_ids, _ = get_launch_subnets(
+            launch_template=launch_template,
+            ec2_client=ec2_client,
+            instance_type=instance_type,
         )
-        instance_id = ec2_response["Instances"][0]["InstanceId"]
+    subnet_ids = get_shortfall_subnet_ids(
+        subnet_ids=subnet_ids,
+        chunk_results=chunk_results,
+        network_interface=network_interface,
+    )
+    logger.debug(
+        f"Launched {len(instance_ids)} of {num_instances} instances, "
+        "launching the rest with MinCount=1"
+    )
+    chunk_results, launch_error = launch_instance_chunks(
+        launch_template=launch_template,
+        launch_chunks=plan_launch_chunks(
+            num_instances=shortfall,
+            subnet_ids=subnet_ids or [None],
+            chunk_size=chunk_size,
+        ),
+        network_interface=network_interface,
+        instance_type=instance_type,
+        ec2_client=ec2_client,
+        keypair=keypair,
+        partial=True,
+    )
+    return instance_ids + get_chunk_instance_ids(chunk_results), launch_error
+
+
+def get_capacity_backoff_delay(delay: float) -> float:
+    """Get a jittered delay before retrying a launch, so concurrent launches do not retry together."""
+    return random.uniform(delay / 2, delay)
+
+
+def check_launched_instances(instance_ids: list, num_instances: int) -> list:
+    """Accept a partial launch, failing only when EC2 had no capacity for any instance."""
+    if not instance_ids:
+        logger.error(f"Insufficient capacity to launch {num_instances} instances")
+        raise InstanceProvisioningError(
+            "Insufficient capacity to launch the instances, try another instance type"
+        )
+    if len(instance_ids) < num_instances:
+        logger.warning(
+            f"Launched {len(instance_ids)} of {num_instances} instances, "
+            "EC2 is out of capacity for the rest"
+        )
+    return instance_ids
+
+
+def check_launch_error(launch_error: Exception, instance_ids: list, num_instances: int):
+    """Raise the error that stopped a launch, unless instances were already launched and must be kept."""
+    if not instance_ids:
+        raise launch_error
+    logger.error(
+        f"Stopped the launch after {len(instance_ids)} of {num_instances} instances: "
+        f"{launch_error}"
+    )
 
-        logger.debug("Waiting for instance to be in running state")
-        ec2_resource.Instance(instance_id).wait_until_running()
 
-        logger.debug("Creating SSM instance profile and associating with the instance")
-        logger.debug("Creating SSM instance profile")
+def is_last_launch_attempt(
+    instance_ids: list,
+    launch_error: Optional[Exception],
+    num_instances: int,
+    attempt: int,
+    max_attempts: int,
+) -> bool:
+    """Check whether a launch is over after an attempt, raising its error when nothing was launched."""
+    if launch_error:
+        check_launch_error(
+            launch_error=launch_error,
+            instance_ids=instance_ids,
+            num_instances=num_instances,
+        )
+        return True
+    return len(instance_ids) == num_instances or attempt == max_attempts
+
+
+def launch_instances(
+    launch_template: dict,
+    num_instances: int,
+    instance_type: str,
+    ec2_client: boto3.client,
+    keypair: str = "None",
+    max_attempts: int = INSUFFICIENT_CAPACITY_MAX_ATTEMPTS,
+    delay: float = INSUFFICIENT_CAPACITY_DELAY,
+    chunk_size: int = LAUNCH_CHUNK_SIZE,
+) -> list:
+    """Run instances from the launch template across the subnets of its VPC, returning their IDs.
+
+    Insufficient capacity is not a throttling error, so botocore does not retry it. EC2 frees
+    capacity over minutes rather than milliseconds, so the shortfall is retried with a longer,
+    jittered exponential backoff for a bounded number of attempts. The instances that could be
+    launched are returned even when some are still missing, or when a launch error stopped the
+    others. The error is raised only when no instance was launched.
+    """
+    instance_ids = []
+    for attempt in range(1, max_attempts + 1):
         try:
-            instance_profile = create_ssm_instance_profile(iam_client=iam_client)
-        except ClientError as error:
-            logger.error(f"Error creating SSM instance profile: {error}")
-            click.echo(
-                "\r\nError creating SSM instance profile, see the logs for more details."
+            attempt_instance_ids, launch_error = try_launch_instances_across_subnets(
+                launch_template=launch_template,
+                num_instances=num_instances - len(instance_ids),
+                instance_type=instance_type,
+                ec2_client=ec2_client,
+                keypair=keypair,
+                chunk_size=chunk_size,
+            )
+        except (SecureEC2Error, BotoCoreError) as error:
+            attempt_instance_ids, launch_error = [], error
+        instance_ids.extend(attempt_instance_ids)
+        if is_last_launch_attempt(
+            instance_ids=instance_ids,
+            launch_error=launch_error,
+            num_instances=num_instances,
+            attempt=attempt,
+            max_attempts=max_attempts,
+        ):
+            break
+        backoff_delay = get_capacity_backoff_delay(delay)
+        logger.debug(f"Retrying the launch in {backoff_delay:.1f} seconds")
+        time.sleep(backoff_delay)
+        delay *= 2
+    return check_launched_instances(
+        instance_ids=instance_ids, num_instances=num_instances
+    )
+
+
+def build_fleet_request(
+    launch_template: dict,
+    num_instances: int,
+    instance_types: list,
+    subnet_ids: list = None,
+    spot_percentage: int = 0,
+    allocation_strategy: str = DEFAULT_FLEET_ALLOCATION_STRATEGY,
+) -> dict:
+    """Build the request of an instant EC2 Fleet over every pair of instance type and subnet.
+
+    spot_percentage of the instances are spot instances placed with the allocation strategy, the
+    others are on-demand instances of the cheapest override with capacity.
+    """
+    launch_template_specification = get_launch_template_specification(launch_template)
+    launch_template_specification.setdefault("Version", "$Default")
+    max_subnets = max(1, FLEET_MAX_OVERRIDES // len(instance_types))
+    subnet_ids = (subnet_ids or [None])[:max_subnets]
+    spot_instances = round(num_instances * spot_percentage / 100)
+    return {
+        "Type": "instant",
+        "LaunchTemplateConfigs": [
+            {
+                "LaunchTemplateSpecification": launch_template_specification,
+                "Overrides": [
+                    dict(
+                        {"InstanceType": instance_type},
+                        **({"SubnetId": subnet_id} if subnet_id else {}),
+                    )
+                    for instance_type in instance_types
+                    for subnet_id in subnet_ids
+                ],
+            }
+        ],
+        "TargetCapacitySpecification": {
+            "TotalTargetCapacity": num_instances,
+            "OnDemandTargetCapacity": num_instances - spot_instances,
+            "SpotTargetCapacity": spot_instances,
+            "DefaultTargetCapacityType": "spot" if spot_instances else "on-demand",
+        },
+        "SpotOptions": {"AllocationStrategy": allocation_strategy},
+        "OnDemandOptions": {"AllocationStrategy": "lowest-price"},
+    }
+
+
+def launch_fleet(
+    launch_template: dict,
+    num_instances: int,
+    instance_types: list,
+    ec2_client: boto3.client,
+    subnet_ids: list = None,
+    spot_percentage: int = 0,
+    allocation_strategy: str = DEFAULT_FLEET_ALLOCATION_STRATEGY,
+) -> list:
+    """Launch the instances with a single instant EC2 Fleet, returning their IDs.
+
+    The fleet falls back across the instance types and subnets by itself. Without subnets, it uses
+    the ranked subnets of the launch template VPC. The instances the fleet could launch are
+    returned even when some are missing.
+    """
+    if not subnet_ids:
+        _, subnet_ids, _ = get_launch_subnets(
+            launch_template=launch_template, ec2_client=ec2_client
+        )
+    logger.debug(f"Launching a fleet of {num_instances} instances of {instance_types}")
+    try:
+        fleet_response = ec2_client.create_fleet(
+            **build_fleet_request(
+                launch_template=launch_template,
+                num_instances=num_instances,
+                instance_types=instance_types,
+                subnet_ids=subnet_ids,
+                spot_percentage=spot_percentage,
+                allocation_strategy=allocation_strategy,
             )
-            exit(1)
-        logger.debug("Associating instance profile with the instance")
+        )
+    except ClientError as error:
+        if error.response["Error"]["Code"] in STALE_LAUNCH_TEMPLATE_ERROR_CODES:
+            logger.error(f"Launch template or its resources are not available: {error}")
+            raise LaunchTemplateError(
+                "Error launching from the launch template, run `secure_ec2 config` to refresh it"
+            ) from error
+        logger.error(f"Error launching the fleet: {error}")
+        raise InstanceProvisioningError("Error launching the fleet") from error
+    for fleet_error in fleet_response.get("Errors", []):
+        logger.debug(
+            f"Fleet could not launch {fleet_error.get('LaunchTemplateAndOverrides')}: "
+            f"{fleet_error.get('ErrorCode')} {fleet_error.get('ErrorMessage')}"
+        )
+    instance_ids = [
+        instance_id
+        for fleet_instances in fleet_response.get("Instances", [])
+        for instance_id in fleet_instances["InstanceIds"]
+    ]
+    return check_launched_instances(
+        instance_ids=instance_ids, num_instances=num_instances
+    )
+
+
+def poll_instance_states(
+    instance_ids: list,
+    instance_states: dict,
+    ec2_client: boto3.client,
+    on_transition: Callable = None,
+    batch_size: int = DESCRIBE_INSTANCES_BATCH_SIZE,
+) -> bool:
+    """Record the current state of the instances with batched DescribeInstances calls.
+
+    Returns whether any instance changed state since the previous poll.
+    """
+    transitioned = False
+    for instance_ids_batch in chunks(instance_ids, batch_size):
         try:
-            ec2_client.associate_iam_instance_profile(
-                IamInstanceProfile={"Name": instance_profile},
-                InstanceId=instance_id,
+            describe_instances_response = ec2_client.describe_instances(
+                InstanceIds=instance_ids_batch
             )
         except ClientError as error:
-            logger.error(
-                f"Error associating instance profile with the instance: {error}"
-            )
-            click.echo(
-                "\r\nError associating instance profile with the instance, see the logs for more details."
+            # Freshly launched instances may not be visible to DescribeInstances yet
+            if error.response["Error"]["Code"] == "InvalidInstanceID.NotFound":
+                continue
+            logger.error(f"Error waiting for the instances to run: {error}")
+            raise InstanceProvisioningError(
+                "Error waiting for the instances to run"
+            ) from error
+        for reservation in describe_instances_response["Reservations"]:
+            for instance in reservation["Instances"]:
+                instance_id = instance["InstanceId"]
+                state = instance["State"]["Name"]
+                previous_state = instance_states.get(instance_id)
+                if state != previous_state:
+                    transitioned = True
+                    instance_states[instance_id] = state
+                    logger.debug(f"Instance {instance_id}: {previous_state} -> {state}")
+                    if on_transition:
+                        on_transition(instance_id, previous_state, state)
+    return transitioned
+
+
+def get_pending_instance_ids(instance_ids: list, instance_states: dict) -> list:
+    """Get the instances that did not leave the pending state yet."""
+    return [
+        instance_id
+        for instance_id in instance_ids
+        if instance_states.get(instance_id, "pending") == "pending"
+    ]
+
+
+def check_wait_deadline(
+    pending_instance_ids: list, poll_interval: float, deadline: float
+):
+    """Fail the wait when the next poll would come after its deadline."""
+    if time.monotonic() + poll_interval > deadline:
+        logger.error(f"Timed out waiting for instances {pending_instance_ids}")
+        raise InstanceProvisioningError("Timed out waiting for the instances to run")
+
+
+def get_next_poll_interval(poll_interval: float, transitioned: bool) -> float:
+    """Reset the poll interval on transitions, back off while nothing changes."""
+    if transitioned:
+        return INSTANCE_POLL_MIN_INTERVAL
+    return min(poll_interval * 2, INSTANCE_POLL_MAX_INTERVAL)
+
+
+def wait_for_instances(
+    instance_ids: list,
+    ec2_client: boto3.client,
+    on_transition: Callable = None,
+    batch_size: int = DESCRIBE_INSTANCES_BATCH_SIZE,
+    timeout: float = INSTANCE_WAIT_TIMEOUT,
+) -> dict:
+    """Wait for every instance to leave the pending state, polling DescribeInstances in batches.
+
+    The poll interval starts short, backs off while no instance changes state and resets on every
+    transition. on_transition is called with the instance ID, previous and new state as they happen.
+    Returns the final state of every instance.
+    """
+    instance_states = {}
+    pending_instance_ids = list(instance_ids)
+    poll_interval = INSTANCE_POLL_MIN_INTERVAL
+    deadline = time.monotonic() + timeout
+    while True:
+        transitioned = poll_instance_states(
+            instance_ids=pending_instance_ids,
+            instance_states=instance_states,
+            ec2_client=ec2_client,
+            on_transition=on_transition,
+            batch_size=batch_size,
+        )
+        pending_instance_ids = get_pending_instance_ids(
+            pending_instance_ids, instance_states
+        )
+        if not pending_instance_ids:
+            return instance_states
+        check_wait_deadline(
+            pending_instance_ids=pending_instance_ids,
+            poll_interval=poll_interval,
+            deadline=deadline,
+        )
+        poll_interval = get_next_poll_interval(poll_interval, transitioned)
+        time.sleep(poll_interval)
+
+
+def try_associate_instance_profile(
+    instance_id: str,
+    instance_profile: str,
+    ec2_client: boto3.client,
+    retryable: bool = True,
+) -> Optional[str]:
+    """Associate an instance profile with an instance, returning the association ID.
+
+    Returns None when the instance profile is not visible to EC2 yet and the attempt is retryable.
+    """
+    try:
+        associate_response = ec2_client.associate_iam_instance_profile(
+            IamInstanceProfile={"Name": instance_profile},
+            InstanceId=instance_id,
+        )
+    except ClientError as error:
+        if error.response["Error"]["Code"] in IAM_PROPAGATION_ERROR_CODES and retryable:
+            logger.debug(
+                f"Instance profile {instance_profile} is not visible to EC2 yet"
             )
-            exit(1)
-        click.echo(
-            f"\r\nInstance {instance_id} provisioned successfully. Connect securely using Session Manager:\r\n{construct_session_manager_url(instance_id=instance_id, region=get_region_from_boto3_client(boto3_client=ec2_client))}"  # noqa: E501
+            return None
+        logger.error(f"Error associating instance profile with the instance: {error}")
+        raise InstanceProfileError(
+            "Error associating instance profile with the instance"
+        ) from error
+    return associate_response["IamInstanceProfileAssociation"]["AssociationId"]
+
+
+def associate_instance_profile(
+    instance_id: str,
+    instance_profile: str,
+    ec2_client: boto3.client,
+    max_attempts: int = IAM_PROPAGATION_MAX_ATTEMPTS,
+    delay: float = IAM_PROPAGATION_DELAY,
+) -> str:
+    """Associate an instance profile with an instance, returning the association ID.
+
+    A freshly created instance profile takes a few seconds to propagate from IAM to EC2, so the
+    errors EC2 returns in the meantime are retried with a backoff for a bounded number of attempts.
+    """
+    for attempt in range(1, max_attempts + 1):
+        association_id = try_associate_instance_profile(
+            instance_id=instance_id,
+            instance_profile=instance_profile,
+            ec2_client=ec2_client,
+            retryable=attempt < max_attempts,
         )
-        if not no_clip:
-            pyperclip.copy(
-                construct_session_manager_url(
-                    instance_id=instance_id,
-                    region=get_region_from_boto3_client(boto3_client=ec2_client),
-                )
+        if association_id:
+            return association_id
+        logger.debug(f"Retrying the association in {delay} seconds")
+        time.sleep(delay)
+        delay *= 2
+
+
+def get_launch_instance_types(
+    instance_type: str, keypair: str, fleet_options: dict = None
+) -> list:
+    """Get the instance types of a launch, checking that a fleet launch has no keypair."""
+    if fleet_options and keypair != "None":
+        logger.error(f"Fleet launches cannot use the keypair {keypair}")
+        raise InstanceProvisioningError(
+            "Fleet launches use Session Manager access, launch them without a keypair"
+        )
+    return fleet_options["instance_types"] if fleet_options else [instance_type]
+
+
+def validate_launch(
+    instance_type: str,
+    keypair: str,
+    ec2_client: boto3.client,
+    fleet_options: dict = None,
+):
+    """Check the instance types of a launch, and that a fleet launch has no keypair, before launching."""
+    for launch_instance_type in get_launch_instance_types(
+        instance_type=instance_type, keypair=keypair, fleet_options=fleet_options
+    ):
+        validate_instance_type(
+            instance_type=launch_instance_type, ec2_client=ec2_client
+        )
+
+
+def get_connect_url(instance_id: str, keypair: str, region: str) -> str:
+    """Get the console URL to connect to an instance, Session Manager unless it has a keypair."""
+    if keypair == "None":
+        return construct_session_manager_url(instance_id=instance_id, region=region)
+    return construct_console_connect_url(instance_id=instance_id, region=region)
+
+
+def get_running_instance_ids(instance_ids: list, instance_states: dict) -> list:
+    """Get the instances that reached the running state."""
+    return [
+        instance_id
+        for instance_id in instance_ids
+        if instance_states[instance_id] == "running"
+    ]
+
+
+def build_provisioning_result(
+    instance_ids: list,
+    instance_states: dict,
+    instance_profile: Optional[str],
+    keypair: str,
+    region: str,
+) -> dict:
+    """Build the outcome of a launch, with the connect URL of every running instance."""
+    return {
+        "instance_ids": instance_ids,
+        "instance_states": instance_states,
+        "instance_profile": instance_profile,
+        "connect_urls": {
+            instance_id: get_connect_url(
+                instance_id=instance_id, keypair=keypair, region=region
             )
-            click.echo("\r\nThe link is on your clipboard")
-    else:
-        logger.debug("Provisioning instance with Keypair access")
-        try:
-            ec2_response = ec2_client.run_instances(
-                LaunchTemplate={
-                    "LaunchTemplateName": launch_template["LaunchTemplateName"],
-                },
-                InstanceType=instance_type,
-                MaxCount=num_instances,
-                MinCount=num_instances,
-                KeyName=keypair,
+            for instance_id in get_running_instance_ids(
+                instance_ids=instance_ids, instance_states=instance_states
             )
-        except ClientError as error:
-            logger.error(f"Error provisioning instance with Keypair access: {error}")
-            click.echo(
-                "\r\nError provisioning instance with Keypair access, see the logs for more details."
+        },
+    }
+
+
+@spinner(text="Provisioning instance with the selected configuration\r\n")
+def provision_ec2_instance(
+    launch_template: any,
+    num_instances: int,
+    keypair: str,
+    instance_type: str,
+    ec2_client: boto3.client,
+    iam_client: boto3.client,
+    sts_client: boto3.client = None,
+    on_transition: Callable = None,
+    fleet_options: dict = None,
+) -> dict:
+    """Provision EC2 instances according to launch template configurations.
+
+    Instances launched without a keypair get the Session Manager instance profile, which is prepared
+    while they boot. With fleet_options, the keyword arguments of launch_fleet other than the launch
+    template, the instances are launched with a single instant EC2 Fleet instead. Returns the
+    launched instance IDs, their final states, the instance profile and the connect URL of every
+    running instance. Launch errors are raised only when no instance was launched.
+    """
+    validate_launch(
+        instance_type=instance_type,
+        keypair=keypair,
+        ec2_client=ec2_client,
+        fleet_options=fleet_options,
+    )
+    instance_profile = None
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        if keypair == "None":
+            # The instance profile is prepared while the instances launch and boot
+            logger.debug("Creating SSM instance profile")
+            instance_profile_future = executor.submit(
+                create_ssm_instance_profile,
+                iam_client=iam_client,
+                sts_client=sts_client,
+            )
+        if fleet_options:
+            instance_ids = launch_fleet(
+                launch_template=launch_template,
+                num_instances=num_instances,
+                ec2_client=ec2_client,
+                **fleet_options,
+            )
+        else:
+            instance_ids = launch_instances(
+                launch_template=launch_template,
+                num_instances=num_instances,
+                instance_type=instance_type,
+                ec2_client=ec2_client,
+                keypair=keypair,
             )
-            exit(1)
-        instance_id = ec2_response["Instances"][0]["InstanceId"]
 
-        logger.debug("Waiting for instance to be in running state")
-        ec2_resource.Instance(instance_id).wait_until_running()
-        click.echo(
-            f"\r\nInstance {instance_id} provisioned successfully. Connect securely using SSH / RDP and your KeyPair:\r\n{construct_console_connect_url(instance_id=instance_id, region=get_region_from_boto3_client(boto3_client=ec2_client))}"  # noqa: E501
+        logger.debug("Waiting for instances to be in running state")
+        instance_states = wait_for_instances(
+            instance_ids=instance_ids,
+            ec2_client=ec2_client,
+            on_transition=on_transition,
         )
-        if not no_clip:
-            pyperclip.copy(
-                construct_session_manager_url(
+        running_instance_ids = get_running_instance_ids(
+            instance_ids=instance_ids, instance_states=instance_states
+        )
+
+        if keypair == "None":
+            instance_profile = instance_profile_future.result()
+            logger.debug("Associating instance profile with the instances")
+            association_futures = [
+                executor.submit(
+                    associate_instance_profile,
                     instance_id=instance_id,
-                    region=get_region_from_boto3_client(boto3_client=ec2_client),
+                    instance_profile=instance_profile,
+                    ec2_client=ec2_client,
                 )
-            )
-            click.echo("\r\nThe link is on your clipboard")
+                for instance_id in running_instance_ids
+            ]
+            try:
+                for association_future in association_futures:
+                    association_future.result()
+            except InstanceProfileError:
+                if sts_client:
+                    # The cached instance profile may have been removed out of band
+                    clear_ssm_instance_profile(sts_client=sts_client)
+                raise
+
+    return build_provisioning_result(
+        instance_ids=instance_ids,
+        instance_states=instance_states,
+        instance_profile=instance_profile,
+        keypair=keypair,
+        region=get_region_from_boto3_client(boto3_client=ec2_client),
+    )
+
+
+def run_in_regions(
+    regions: list, pipeline: Callable, max_workers: int = MAX_WORKERS
+) -> dict:
+    """Run a pipeline for every region in parallel on a bounded worker pool.
+
+    The pipeline is called with the region name. A failing region does not stop the others, every
+    region maps to a summary with either the pipeline result or the error, unexpected errors
+    included.
+    """
+
+    def run_pipeline(region: str) -> dict:
+        try:
+            return {"succeeded": True, "result": pipeline(region), "error": None}
+        except (SecureEC2Error, ClientError, BotoCoreError) as error:
+            logger.error(f"Pipeline failed in region {region}: {error}")
+            return {"succeeded": False, "result": None, "error": str(error)}
+        except Exception as error:
+            logger.exception(f"Unexpected error in region {region}: {error!r}")
+            return {
+                "succeeded": False,
+                "result": None,
+                "error": f"Unexpected error: {error!r}",
+            }
 
-    return instance_id
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(regions))) as executor:
+        return dict(zip(regions, executor.map(run_pipeline, regions)))
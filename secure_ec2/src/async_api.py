@@ -0,0 +1,542 @@
+"""Asyncio variants of the provisioning pipeline that secure_ec2 use.
+
+The blocking boto3 calls run on one bounded executor shared by every flow of the process, while the
+waits between polls and retries are asyncio sleeps, so many flows can be driven from a single event
+loop without holding a thread each. Concurrent steps are composed with asyncio.gather instead of the
+per call thread pools of the synchronous helpers, and the EC2 calls of the launch hot path wait for
+their rate limiter tokens on the event loop. For best throughput, build the clients with
+max_pool_connections=ASYNC_MAX_WORKERS.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import boto3
+from botocore.exceptions import BotoCoreError
+
+from secure_ec2.src.api import (
+    attach_ssm_role_to_instance_profile,
+    build_provisioning_result,
+    cache_ssm_instance_profile,
+    check_instance_type,
+    check_launched_instances,
+    check_wait_deadline,
+    clear_ssm_instance_profile,
+    collect_chunk_results,
+    create_security_group,
+    deploy_launch_template,
+    get_cached_ssm_instance_profile,
+    get_capacity_backoff_delay,
+    get_chunk_instance_ids,
+    get_chunk_network_interface,
+    get_default_vpc_id,
+    get_instance_type_offerings,
+    get_instance_types,
+    get_latest_launch_template,
+    get_launch_instance_types,
+    get_launch_shortfall,
+    get_launch_subnets,
+    get_next_poll_interval,
+    get_pending_instance_ids,
+    get_running_instance_ids,
+    get_shortfall_subnet_ids,
+    get_subnet_id,
+    is_last_launch_attempt,
+    launch_fleet,
+    plan_launch_chunks,
+    poll_instance_states,
+    reconcile_ssm_instance_profile,
+    reconcile_ssm_role,
+    resolve_latest_ami_ids,
+    try_associate_instance_profile,
+    try_launch_instances,
+)
+from secure_ec2.src.aws import (
+    get_client_account_id,
+    get_client_profile,
+    get_region_from_boto3_client,
+)
+from secure_ec2.src.base_logger import logger
+from secure_ec2.src.constants import (
+    AMI_CACHE_TTL,
+    ASYNC_MAX_WORKERS,
+    DESCRIBE_INSTANCES_BATCH_SIZE,
+    IAM_CACHE_TTL,
+    IAM_PROPAGATION_DELAY,
+    IAM_PROPAGATION_MAX_ATTEMPTS,
+    INSTANCE_POLL_MIN_INTERVAL,
+    INSTANCE_WAIT_TIMEOUT,
+    INSUFFICIENT_CAPACITY_DELAY,
+    INSUFFICIENT_CAPACITY_MAX_ATTEMPTS,
+    LAUNCH_CHUNK_SIZE,
+    SSM_ROLE_NAME,
+)
+from secure_ec2.src.exceptions import InstanceProfileError, SecureEC2Error
+from secure_ec2.src.helpers import chunks, get_ip_address
+from secure_ec2.src.throttling import (
+    get_request_token_costs,
+    prepaid_request_tokens,
+    reserve_request_tokens,
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the executor that runs the blocking AWS calls of every asynchronous flow."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=ASYNC_MAX_WORKERS, thread_name_prefix="secure_ec2"
+            )
+        return _executor
+
+
+async def run_blocking(function: Callable, *args, **kwargs):
+    """Run a blocking function on the shared executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(function, *args, **kwargs)
+    )
+
+
+def run_with_prepaid_tokens(token_costs: list, function: Callable, **kwargs):
+    """Run a function whose EC2 API call had its request tokens reserved beforehand."""
+    with prepaid_request_tokens(token_costs):
+        return function(**kwargs)
+
+
+async def run_rate_limited(
+    operation: str, request_body: dict, function: Callable, **kwargs
+):
+    """Run a step that sends a single EC2 API call, waiting for its request tokens on the event loop.
+
+    The request body holds the serialized parameters that the tokens depend on. The step runs on
+    the shared executor with the tokens prepaid, so the thread that sends the call never sleeps.
+    """
+    ec2_client = kwargs["ec2_client"]
+    token_costs = get_request_token_costs(operation, {"body": request_body})
+    wait = reserve_request_tokens(
+        token_costs,
+        profile=get_client_profile(boto3_client=ec2_client),
+        region=ec2_client.meta.region_name,
+    )
+    if wait:
+        logger.debug(f"Throttled {operation} for {wait:.2f}s")
+        await asyncio.sleep(wait)
+    return await run_blocking(run_with_prepaid_tokens, token_costs, function, **kwargs)
+
+
+async def create_launch_template(
+    os_type: str,
+    ec2_client: boto3.client,
+    ssm_client: boto3.client = None,
+    ami_ttl: int = AMI_CACHE_TTL,
+    refresh_ami: bool = False,
+) -> dict:
+    """Create a secure launch template, see api.create_launch_template."""
+    # The public IP is only needed by the ingress rule of the security group, which waits for it
+    ip_address_future = get_executor().submit(get_ip_address)
+    image_ids, vpc_id = await asyncio.gather(
+        run_blocking(
+            resolve_latest_ami_ids,
+            os_types=[os_type],
+            ec2_client=ec2_client,
+            ssm_client=ssm_client,
+            ami_ttl=ami_ttl,
+            refresh_ami=refresh_ami,
+        ),
+        run_blocking(get_default_vpc_id, ec2_client=ec2_client),
+    )
+    subnet_id, security_group = await asyncio.gather(
+        run_blocking(get_subnet_id, vpc_id=vpc_id, ec2_client=ec2_client),
+        run_blocking(
+            create_security_group,
+            vpc_id=vpc_id,
+            os_type=os_type,
+            ec2_client=ec2_client,
+            resolve_ip_address=ip_address_future.result,
+        ),
+    )
+    return await run_blocking(
+        deploy_launch_template,
+        os_type=os_type,
+        image_id=image_ids[os_type],
+        vpc_id=vpc_id,
+        subnet_id=subnet_id,
+        security_group_id=security_group["GroupId"],
+        ec2_client=ec2_client,
+    )
+
+
+async def wait_for_instances(
+    instance_ids: list,
+    ec2_client: boto3.client,
+    on_transition: Callable = None,
+    batch_size: int = DESCRIBE_INSTANCES_BATCH_SIZE,
+    timeout: float = INSTANCE_WAIT_TIMEOUT,
+) -> dict:
+    """Wait for every instance to leave the pending state, see api.wait_for_instances.
+
+    The DescribeInstances batches of every poll are sent concurrently.
+    """
+    instance_states = {}
+    pending_instance_ids = list(instance_ids)
+    poll_interval = INSTANCE_POLL_MIN_INTERVAL
+    deadline = time.monotonic() + timeout
+    while True:
+        batch_transitions = await asyncio.gather(
+            *(
+                run_rate_limited(
+                    "DescribeInstances",
+                    {"InstanceId.1": instance_ids_batch[0]},
+                    poll_instance_states,
+                    instance_ids=instance_ids_batch,
+                    instance_states=instance_states,
+                    ec2_client=ec2_client,
+                    on_transition=on_transition,
+                    batch_size=batch_size,
+                )
+                for instance_ids_batch in chunks(pending_instance_ids, batch_size)
+            )
+        )
+        transitioned = any(batch_transitions)
+        pending_instance_ids = get_pending_instance_ids(
+            pending_instance_ids, instance_states
+        )
+        if not pending_instance_ids:
+            return instance_states
+        check_wait_deadline(
+            pending_instance_ids=pending_instance_ids,
+            poll_interval=poll_interval,
+            deadline=deadline,
+        )
+        poll_interval = get_next_poll_interval(poll_interval, transitioned)
+        await asyncio.sleep(poll_interval)
+
+
+async def launch_instance_chunks(
+    launch_template: dict,
+    launch_chunks: list,
+    network_interface: dict,
+    instance_type: str,
+    ec2_client: boto3.client,
+    keypair: str = "None",
+    partial: bool = False,
+) -> tuple:
+    """Run the chunks of a launch concurrently, each in its own subnet, see api.launch_instance_chunks."""
+    chunk_outcomes = await asyncio.gather(
+        *(
+            run_rate_limited(
+                "RunInstances",
+                {"MaxCount": chunk_instances},
+                try_launch_instances,
+                launch_template=launch_template,
+                num_instances=chunk_instances,
+                instance_type=instance_type,
+                ec2_client=ec2_client,
+                keypair=keypair,
+                min_count=1 if partial else None,
+                network_interface=get_chunk_network_interface(
+                    network_interface=network_interface, subnet_id=subnet_id
+                ),
+            )
+            for subnet_id, chunk_instances in launch_chunks
+        ),
+        return_exceptions=True,
+    )
+    return collect_chunk_results(
+        launch_chunks=launch_chunks, chunk_outcomes=chunk_outcomes
+    )
+
+
+async def try_launch_instances_across_subnets(
+    launch_template: dict,
+    num_instances: int,
+    instance_type: str,
+    ec2_client: boto3.client,
+    keypair: str = "None",
+    chunk_size: int = LAUNCH_CHUNK_SIZE,
+) -> tuple:
+    """Run as many of the instances as EC2 has capacity for, see api.try_launch_instances_across_subnets."""
+    network_interface, subnet_ids, free_ip_counts = {}, [], {}
+    if num_instances > chunk_size:
+        network_interface, subnet_ids, free_ip_counts = await run_blocking(
+            get_launch_subnets,
+            launch_template=launch_template,
+            ec2_client=ec2_client,
+            instance_type=instance_type,
+        )
+    chunk_results, launch_error = await launch_instance_chunks(
+        launch_template=launch_template,
+        launch_chunks=plan_launch_chunks(
+            num_instances=num_instances,
+            subnet_ids=subnet_ids or [None],
+            chunk_size=chunk_size,
+            free_ip_counts=free_ip_counts,
+        ),
+        network_interface=network_interface,
+        instance_type=instance_type,
+        ec2_client=ec2_client,
+        keypair=keypair,
+    )
+    instance_ids = get_chunk_instance_ids(chunk_results)
+    shortfall = get_launch_shortfall(
+        num_instances=num_instances,
+        instance_ids=instance_ids,
+        launch_error=launch_error,
+    )
+    if not shortfall:
+        return instance_ids, launch_error
+    if num_instances <= chunk_size:
+        network_interface, subnet_ids, _ = await run_blocking(
+            get_launch_subnets,
+            launch_template=launch_template,
+            ec2_client=ec2_client,
+            instance_type=instance_type,
+        )
+    subnet_ids = get_shortfall_subnet_ids(
+        subnet_ids=subnet_ids,
+        chunk_results=chunk_results,
+        network_interface=network_interface,
+    )
+    logger.debug(
+        f"Launched {len(instance_ids)} of {num_instances} instances, "
+        "launching the rest with MinCount=1"
+    )
+    chunk_results, launch_error = await launch_instance_chunks(
+        launch_template=launch_template,
+        launch_chunks=plan_launch_chunks(
+            num_instances=shortfall,
+            subnet_ids=subnet_ids or [None],
+            chunk_size=chunk_size,
+        ),
+        network_interface=network_interface,
+        instance_type=instance_type,
+        ec2_client=ec2_client,
+        keypair=keypair,
+        partial=True,
+    )
+    return instance_ids + get_chunk_instance_ids(chunk_results), launch_error
+
+
+async def launch_instances(
+    launch_template: dict,
+    num_instances: int,
+    instance_type: str,
+    ec2_client: boto3.client,
+    keypair: str = "None",
+    max_attempts: int = INSUFFICIENT_CAPACITY_MAX_ATTEMPTS,
+    delay: float = INSUFFICIENT_CAPACITY_DELAY,
+    chunk_size: int = LAUNCH_CHUNK_SIZE,
+) -> list:
+    """Run instances from the launch template across the subnets of its VPC, retrying the shortfall."""
+    instance_ids = []
+    for attempt in range(1, max_attempts + 1):
+        try:
+            (
+                attempt_instance_ids,
+                launch_error,
+            ) = await try_launch_instances_across_subnets(
+                launch_template=launch_template,
+                num_instances=num_instances - len(instance_ids),
+                instance_type=instance_type,
+                ec2_client=ec2_client,
+                keypair=keypair,
+                chunk_size=chunk_size,
+            )
+        except (SecureEC2Error, BotoCoreError) as error:
+            attempt_instance_ids, launch_error = [], error
+        instance_ids.extend(attempt_instance_ids)
+        if is_last_launch_attempt(
+            instance_ids=instance_ids,
+            launch_error=launch_error,
+            num_instances=num_instances,
+            attempt=attempt,
+            max_attempts=max_attempts,
+        ):
+            break
+        backoff_delay = get_capacity_backoff_delay(delay)
+        logger.debug(f"Retrying the launch in {backoff_delay:.1f} seconds")
+        await asyncio.sleep(backoff_delay)
+        delay *= 2
+    return check_launched_instances(
+        instance_ids=instance_ids, num_instances=num_instances
+    )
+
+
+async def associate_instance_profile(
+    instance_id: str,
+    instance_profile: str,
+    ec2_client: boto3.client,
+    max_attempts: int = IAM_PROPAGATION_MAX_ATTEMPTS,
+    delay: float = IAM_PROPAGATION_DELAY,
+) -> str:
+    """Associate an instance profile with an instance, retrying while the profile propagates."""
+    for attempt in range(1, max_attempts + 1):
+        association_id = await run_rate_limited(
+            "AssociateIamInstanceProfile",
+            {},
+            try_associate_instance_profile,
+            instance_id=instance_id,
+            instance_profile=instance_profile,
+            ec2_client=ec2_client,
+            retryable=attempt < max_attempts,
+        )
+        if association_id:
+            return association_id
+        logger.debug(f"Retrying the association in {delay} seconds")
+        await asyncio.sleep(delay)
+        delay *= 2
+
+
+async def create_ssm_instance_profile(
+    iam_client: boto3.client,
+    sts_client: boto3.client = None,
+    iam_ttl: int = IAM_CACHE_TTL,
+) -> str:
+    """Create the Session Manager instance profile, see api.create_ssm_instance_profile.
+
+    The role and the instance profile are reconciled concurrently.
+    """
+    account_id = None
+    if sts_client:
+        account_id = await run_blocking(get_client_account_id, boto3_client=sts_client)
+    if await run_blocking(
+        get_cached_ssm_instance_profile, account_id=account_id, iam_ttl=iam_ttl
+    ):
+        return SSM_ROLE_NAME
+    _, instance_profile_roles = await asyncio.gather(
+        run_blocking(reconcile_ssm_role, iam_client=iam_client),
+        run_blocking(reconcile_ssm_instance_profile, iam_client=iam_client),
+    )
+    await run_blocking(
+        attach_ssm_role_to_instance_profile,
+        iam_client=iam_client,
+        instance_profile_roles=instance_profile_roles,
+    )
+    await run_blocking(cache_ssm_instance_profile, account_id=account_id)
+    return SSM_ROLE_NAME
+
+
+async def validate_launch(
+    instance_type: str,
+    keypair: str,
+    ec2_client: boto3.client,
+    fleet_options: dict = None,
+):
+    """Check the instance types of a launch before launching, see api.validate_launch."""
+    launch_instance_types = get_launch_instance_types(
+        instance_type=instance_type, keypair=keypair, fleet_options=fleet_options
+    )
+    instance_types, offerings = await asyncio.gather(
+        run_blocking(get_instance_types, ec2_client=ec2_client),
+        run_blocking(get_instance_type_offerings, ec2_client=ec2_client),
+    )
+    region = get_region_from_boto3_client(boto3_client=ec2_client)
+    for launch_instance_type in launch_instance_types:
+        check_instance_type(
+            instance_type=launch_instance_type,
+            instance_types=instance_types,
+            offerings=offerings,
+            region=region,
+        )
+
+
+async def provision_instances(
+    os_type: str,
+    num_instances: int,
+    keypair: str,
+    instance_type: str,
+    ec2_client: boto3.client,
+    iam_client: boto3.client,
+    sts_client: boto3.client = None,
+    on_transition: Callable = None,
+    fleet_options: dict = None,
+) -> dict:
+    """Launch instances from the launch template of the operating system and wait for them to run.
+
+    Instances launched without a keypair get the Session Manager instance profile, which is prepared
+    while they boot. With fleet_options, the instances are launched with a single instant EC2 Fleet.
+    Returns the launched instance IDs, their final states, the instance profile and the connect URL
+    of every running instance.
+    """
+    launch_template, _ = await asyncio.gather(
+        run_blocking(
+            get_latest_launch_template, os_type=os_type, ec2_client=ec2_client
+        ),
+        validate_launch(
+            instance_type=instance_type,
+            keypair=keypair,
+            ec2_client=ec2_client,
+            fleet_options=fleet_options,
+        ),
+    )
+    instance_profile_task = None
+    if keypair == "None":
+        instance_profile_task = asyncio.ensure_future(
+            create_ssm_instance_profile(iam_client=iam_client, sts_client=sts_client)
+        )
+    try:
+        if fleet_options:
+            instance_ids = await run_rate_limited(
+                "CreateFleet",
+                {},
+                launch_fleet,
+                launch_template=launch_template,
+                num_instances=num_instances,
+                ec2_client=ec2_client,
+                **fleet_options,
+            )
+        else:
+            instance_ids = await launch_instances(
+                launch_template=launch_template,
+                num_instances=num_instances,
+                instance_type=instance_type,
+                ec2_client=ec2_client,
+                keypair=keypair,
+            )
+        instance_states = await wait_for_instances(
+            instance_ids=instance_ids,
+            ec2_client=ec2_client,
+            on_transition=on_transition,
+        )
+    except BaseException:
+        if instance_profile_task:
+            instance_profile_task.cancel()
+        raise
+
+    instance_profile = None
+    if instance_profile_task:
+        instance_profile = await instance_profile_task
+        try:
+            await asyncio.gather(
+                *(
+                    associate_instance_profile(
+                        instance_id=instance_id,
+                        instance_profile=instance_profile,
+                        ec2_client=ec2_client,
+                    )
+                    for instance_id in get_running_instance_ids(
+                        instance_ids=instance_ids, instance_states=instance_states
+                    )
+                )
+            )
+        except InstanceProfileError:
+            if sts_client:
+                # The cached instance profile may have been removed out of band
+                await run_blocking(clear_ssm_instance_profile, sts_client=sts_client)
+            raise
+    return build_provisioning_result(
+        instance_ids=instance_ids,
+        instance_states=instance_states,
+        instance_profile=instance_profile,
+        keypair=keypair,
+        region=get_region_from_boto3_client(boto3_client=ec2_client),
+    )
@@ -1,28 +1,97 @@
 """AWS constructor methods that secure_ec2 use."""
 
+import hashlib
 import logging
-import sys
+import threading
+from typing import Any, Dict, Optional, Tuple
 
 import boto3
+import botocore
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from secure_ec2.src.cache import (
+    get_cache_entry,
+    load_cache,
+    save_cache,
+    set_cache_entry,
+)
+from secure_ec2.src.constants import (
+    ACCOUNTS_CACHE_NAME,
+    ACCOUNTS_CACHE_TTL,
+    BOTO3_MAX_ATTEMPTS,
+    BOTO3_RETRY_MODE,
+    MAX_WORKERS,
+    REGIONS_CACHE_NAME,
+)
+from secure_ec2.src.exceptions import AWSAccessError
+from secure_ec2.src.throttling import register_rate_limiting
+from secure_ec2.src.tracing import register_call_tracing
 
 logger = logging.getLogger(__name__)
 
+_pool_lock = threading.RLock()
+_sessions: Dict[Optional[str], boto3.Session] = {}
+_clients: Dict[Tuple[Optional[str], str, str], Any] = {}
+_resources: Dict[Tuple[Optional[str], str, str], Any] = {}
+_service_regions: Dict[str, Any] = {}
+
+
+def get_boto3_session(profile: str = None) -> boto3.Session:
+    """Get the process-wide boto3 session of a given profile, creating it on first use.
+
+    Sharing one session per profile means the endpoint and service model files are parsed,
+    and the credentials resolved, only once per process instead of once per client.
+    """
+    with _pool_lock:
+        session = _sessions.get(profile)
+        if session is None:
+            logging.getLogger("botocore").setLevel(logging.CRITICAL)
+            session_data = {}
+            if profile:
+                session_data["profile_name"] = profile
+            session = boto3.Session(**session_data)
+            _sessions[profile] = session
+            logger.debug(f"boto3 session created for profile {profile}")
+        return session
+
 
 def get_boto3_client(
-    service: str, profile: str = None, region: str = "us-east-1"
+    service: str,
+    profile: str = None,
+    region: str = "us-east-1",
+    max_pool_connections: int = MAX_WORKERS,
 ) -> boto3.Session.client:
-    """Get a boto3 client for a given service."""
-    logging.getLogger("botocore").setLevel(logging.CRITICAL)
-    session_data = {"region_name": region}
-    if profile:
-        session_data["profile_name"] = profile
-    session = boto3.Session(**session_data)
-    if is_regional_service(service) and region not in get_available_regions(service):
-        logger.debug(f"The service {service} is not available in this region!")
-        sys.exit()
-    config = Config(read_timeout=5, connect_timeout=5, retries={"max_attempts": 10})
-    client = session.client(service, config=config)
+    """Get a pooled boto3 client for a given service.
+
+    Clients are cached per (profile, region, service). A cached client is rebuilt only when
+    it was created with a connection pool smaller than the requested concurrency. Throttled calls
+    are retried in adaptive mode, and EC2 calls go through the shared client-side rate limiter.
+    """
+    key = (profile, region, service)
+    with _pool_lock:
+        client = _clients.get(key)
+        if (
+            client is not None
+            and client.meta.config.max_pool_connections >= max_pool_connections
+        ):
+            return client
+        session = get_boto3_session(profile=profile)
+        if is_regional_service(service, profile=profile) and region not in (
+            get_available_regions(service, profile=profile)
+        ):
+            logger.debug(f"The service {service} is not available in this region!")
+            raise AWSAccessError(f"The service {service} is not available in {region}")
+        config = Config(
+            read_timeout=5,
+            connect_timeout=5,
+            retries={"max_attempts": BOTO3_MAX_ATTEMPTS, "mode": BOTO3_RETRY_MODE},
+            max_pool_connections=max_pool_connections,
+        )
+        client = session.client(service, region_name=region, config=config)
+        register_call_tracing(client)
+        register_rate_limiting(client, profile=profile)
+        _clients[key] = client
     logger.debug(
         f"{client.meta.endpoint_url} in {client.meta.region_name}: boto3 client login successful"
     )
@@ -32,27 +101,76 @@ def get_boto3_client(
 def get_boto3_resource(
     service: str, profile: str = None, region: str = "us-east-1"
 ) -> boto3.Session.resource:
-    """Get a boto3 resource for a given service."""
-    logging.getLogger("botocore").setLevel(logging.CRITICAL)
-    session_data = {"region_name": region}
-    if profile:
-        session_data["profile_name"] = profile
-    session = boto3.Session(**session_data)
+    """Get a pooled boto3 resource for a given service."""
+    key = (profile, region, service)
+    with _pool_lock:
+        resource = _resources.get(key)
+        if resource is None:
+            session = get_boto3_session(profile=profile)
+            resource = session.resource(
+                service,
+                region_name=region,
+                config=Config(
+                    retries={
+                        "max_attempts": BOTO3_MAX_ATTEMPTS,
+                        "mode": BOTO3_RETRY_MODE,
+                    },
+                    max_pool_connections=MAX_WORKERS,
+                ),
+            )
+            register_call_tracing(resource.meta.client)
+            register_rate_limiting(resource.meta.client, profile=profile)
+            _resources[key] = resource
+        return resource
 
-    resource = session.resource(service)
-    return resource
 
+def clear_boto3_pool():
+    """Drop every pooled session, client, resource and region metadata, forcing them to be rebuilt on next use."""
+    with _pool_lock:
+        _resources.clear()
+        _clients.clear()
+        _sessions.clear()
+        _service_regions.clear()
 
-def is_regional_service(service: str):
+
+def get_service_regions(service: str, profile: str = None) -> dict:
+    """Get the region availability metadata of a service.
+
+    The metadata is persisted on disk keyed by the botocore version, so botocore's endpoints
+    file is only parsed when a service is seen for the first time or botocore is upgraded.
+    """
+    with _pool_lock:
+        if _service_regions.get("botocore_version") != botocore.__version__:
+            _service_regions.clear()
+            cached_regions = load_cache(REGIONS_CACHE_NAME)
+            if cached_regions.get("botocore_version") == botocore.__version__:
+                _service_regions.update(cached_regions)
+            else:
+                logger.debug("Region metadata cache is stale, rebuilding it")
+                _service_regions.update(
+                    {"botocore_version": botocore.__version__, "services": {}}
+                )
+        service_regions = _service_regions["services"].get(service)
+        if service_regions is None:
+            session = get_boto3_session(profile=profile)
+            service_regions = {
+                "regions": session.get_available_regions(service),
+                "regional": "aws-global"
+                not in session.get_available_regions(service, allow_non_regional=True),
+            }
+            _service_regions["services"][service] = service_regions
+            save_cache(REGIONS_CACHE_NAME, _service_regions)
+        return service_regions
+
+
+def is_regional_service(service: str, profile: str = None):
     """Check if a service is in the availble service list via the API and see if it global."""
-    return "aws-global" not in boto3.session.Session().get_available_regions(
-        service, allow_non_regional=True
-    )
+    return get_service_regions(service, profile=profile)["regional"]
 
 
-def get_available_regions(service: str):
+def get_available_regions(service: str, profile: str = None):
     """AWS exposes their list of regions as an API. Gather the list."""
-    regions = boto3.session.Session().get_available_regions(service)
+    regions = list(get_service_regions(service, profile=profile)["regions"])
     logger.debug(
         "The service %s does not have available regions. Returning us-east-1 as default"
     )
@@ -61,11 +179,85 @@ def get_available_regions(service: str):
     return regions
 
 
+def get_enabled_regions(ec2_client: boto3.client) -> list:
+    """Invoke API call to list the regions that are enabled for the current account."""
+    try:
+        describe_regions_response = ec2_client.describe_regions()
+    except ClientError as error:
+        logger.error(f"Error listing the enabled regions: {error}")
+        raise AWSAccessError("Error listing the enabled regions") from error
+    return sorted(
+        region["RegionName"] for region in describe_regions_response["Regions"]
+    )
+
+
+def resolve_regions(regions: str, ec2_client: boto3.client) -> list:
+    """Resolve a comma separated list of regions, or all for every enabled region."""
+    if regions.strip().lower() == "all":
+        return get_enabled_regions(ec2_client=ec2_client)
+    resolved_regions = list(
+        dict.fromkeys(region.strip() for region in regions.split(",") if region.strip())
+    )
+    if not resolved_regions:
+        raise AWSAccessError("No region was given")
+    return resolved_regions
+
+
 def get_current_account_id(sts_client: boto3.client) -> str:
     """Invoke API call to get the account id from the current boto3 session."""
     return sts_client.get_caller_identity().get("Account")
 
 
+def get_account_id(profile: str = None, region: str = "us-east-1") -> str:
+    """Get the account ID of the credentials of a profile.
+
+    The account of an access key never changes, so it is cached locally keyed by a digest of the
+    access key and STS is only called for credentials that were not seen before.
+    """
+    credentials = get_boto3_session(profile=profile).get_credentials()
+    cache_key = (
+        hashlib.sha256(credentials.access_key.encode()).hexdigest()
+        if credentials
+        else None
+    )
+    if cache_key:
+        cached_account = get_cache_entry(
+            ACCOUNTS_CACHE_NAME, cache_key, ACCOUNTS_CACHE_TTL
+        )
+        if cached_account:
+            return cached_account["account_id"]
+    try:
+        account_id = get_current_account_id(
+            sts_client=get_boto3_client(service="sts", profile=profile, region=region)
+        )
+    except ClientError as error:
+        logger.error(f"Error getting the account ID: {error}")
+        raise AWSAccessError("Error utilizing AWS credentials") from error
+    if cache_key:
+        set_cache_entry(ACCOUNTS_CACHE_NAME, cache_key, {"account_id": account_id})
+    return account_id
+
+
+def get_client_profile(boto3_client: boto3.client) -> Optional[str]:
+    """Get the profile that a pooled boto3 client was created for, None for the default profile.
+
+    Clients that are not pooled fall back to the default profile.
+    """
+    with _pool_lock:
+        return next(
+            (key[0] for key, client in _clients.items() if client is boto3_client),
+            None,
+        )
+
+
+def get_client_account_id(boto3_client: boto3.client) -> str:
+    """Get the cached account ID of the profile that a pooled boto3 client was created for."""
+    return get_account_id(
+        profile=get_client_profile(boto3_client=boto3_client),
+        region=boto3_client.meta.region_name,
+    )
+
+
 def construct_session_manager_url(instance_id: str, region: str = "us-east-1") -> str:
     """Assemble the AWS console session manager url with the current instance id and region."""
     session_manager_url = f"https://{region}.console.aws.amazon.com/systems-manager/session-manager/{instance_id}?region={region}"  # noqa: E501
@@ -0,0 +1,81 @@
+"""Local on-disk cache that secure_ec2 use to persist metadata between invocations."""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from secure_ec2.src.constants import CACHE_DIR_ENV_VAR, CACHE_DIR_NAME
+
+logger = logging.getLogger(__name__)
+
+_cache_lock = threading.Lock()
+
+
+def get_cache_dir() -> Path:
+    """Get the directory that holds the cache files, overridable with an environment variable."""
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        return Path(cache_dir)
+    return Path.home() / CACHE_DIR_NAME
+
+
+def get_cache_path(name: str) -> Path:
+    """Get the path of a named cache file."""
+    return get_cache_dir() / f"{name}.json"
+
+
+def load_cache(name: str) -> dict:
+    """Load a named cache file, returning an empty cache when it is missing or corrupted."""
+    try:
+        with open(get_cache_path(name)) as cache_file:
+            data = json.load(cache_file)
+    except (OSError, ValueError) as error:
+        logger.debug(f"Cache {name} is not available: {error}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_cache(name: str, data: dict):
+    """Atomically persist a named cache file. Failing to write the cache is not fatal."""
+    cache_path = get_cache_path(name)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=str(cache_path.parent), prefix=f".{name}.", suffix=".tmp"
+        )
+        with os.fdopen(file_descriptor, "w") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(temp_path, str(cache_path))
+    except OSError as error:
+        logger.debug(f"Unable to write cache {name}: {error}")
+
+
+def get_cache_entry(name: str, key: str, ttl: float) -> Optional[dict]:
+    """Get an entry of a named cache, unless it was resolved more than ttl seconds ago."""
+    entry = load_cache(name).get(key)
+    if not isinstance(entry, dict) or time.time() - entry.get("resolved_at", 0) > ttl:
+        return None
+    return entry
+
+
+def set_cache_entry(name: str, key: str, entry: dict) -> dict:
+    """Store an entry in a named cache, recording when it was resolved."""
+    entry = dict(entry, resolved_at=time.time())
+    with _cache_lock:
+        cache = load_cache(name)
+        cache[key] = entry
+        save_cache(name, cache)
+    return entry
+
+
+def delete_cache_entry(name: str, key: str):
+    """Remove an entry from a named cache, if present."""
+    with _cache_lock:
+        cache = load_cache(name)
+        if cache.pop(key, None) is not None:
+            save_cache(name, cache)
@@ -0,0 +1,192 @@
+"""Embeddable client that runs the secure_ec2 configuration and launch phases in-process."""
+
+from typing import Callable, NamedTuple, Optional
+
+import boto3
+
+from secure_ec2.src.api import (
+    clear_subnet_index,
+    create_launch_template,
+    get_key_pairs,
+    get_latest_launch_template,
+    provision_ec2_instance,
+)
+from secure_ec2.src.aws import get_account_id, get_boto3_client
+from secure_ec2.src.base_logger import logger
+from secure_ec2.src.cache import delete_cache_entry, get_cache_entry, set_cache_entry
+from secure_ec2.src.constants import (
+    AMI_CACHE_TTL,
+    RESOURCE_STATE_CACHE_NAME,
+    RESOURCE_STATE_TTL,
+)
+from secure_ec2.src.exceptions import LaunchTemplateError, NetworkError
+
+
+class ConfigureResult(NamedTuple):
+    """Outcome of the configuration phase in a region."""
+
+    region: str
+    launch_template_name: str
+    launch_template_id: str
+    launch_template_version: int
+    image_id: str
+    vpc_id: str
+    subnet_id: str
+    security_group_id: str
+
+
+class LaunchResult(NamedTuple):
+    """Outcome of the launch phase in a region."""
+
+    region: str
+    launch_template_name: str
+    instance_ids: list
+    instance_states: dict
+    instance_profile: str
+    connect_urls: dict
+
+
+class SecureEC2:
+    """Client for provisioning EC2 instances securely from a long running process.
+
+    Unlike the command line, it never exits the process, prints, animates spinners or touches the
+    clipboard. Failures raise subclasses of SecureEC2Error and every phase returns a structured
+    result. The AWS clients come from the process wide pool, so creating several SecureEC2 objects
+    for the same region and profile is cheap.
+    """
+
+    def __init__(
+        self,
+        region: str = "us-east-1",
+        profile: str = None,
+        ami_ttl: int = AMI_CACHE_TTL,
+    ):
+        """Bind the client to an AWS region and profile."""
+        self.region = region
+        self.profile = profile
+        self.ami_ttl = ami_ttl
+
+    def get_client(self, service: str) -> boto3.client:
+        """Get the pooled boto3 client of a service in the region of this client."""
+        return get_boto3_client(
+            service=service, profile=self.profile, region=self.region
+        )
+
+    def get_key_pairs(self) -> list:
+        """List the EC2 keypairs that instances can be launched with."""
+        return get_key_pairs(ec2_client=self.get_client("ec2"))
+
+    def get_resource_state_key(self, os_type: str) -> str:
+        """Get the key of the resolved resources of an operating system in the local state."""
+        account_id = get_account_id(profile=self.profile, region=self.region)
+        return f"{account_id}|{self.region}|{os_type.lower()}"
+
+    def get_resource_state(self, os_type: str) -> Optional[dict]:
+        """Get the resources resolved by the last configuration of an operating system."""
+        return get_cache_entry(
+            RESOURCE_STATE_CACHE_NAME,
+            self.get_resource_state_key(os_type),
+            RESOURCE_STATE_TTL,
+        )
+
+    def clear_resource_state(self, os_type: str):
+        """Forget the resolved resources of an operating system, they are resolved again on next use."""
+        delete_cache_entry(
+            RESOURCE_STATE_CACHE_NAME, self.get_resource_state_key(os_type)
+        )
+
+    def configure(self, os_type: str, refresh_ami: bool = False) -> ConfigureResult:
+        """Create or update the secure launch template of the operating system.
+
+        The VPC resolved by the previous configuration is reused, and discovered again if it turns
+        out to be gone. Its subnets are always described again, so the subnet with the most free IP
+        addresses is picked and a deleted subnet is replaced. The resolved resources are kept in
+        the local state for launch.
+        """
+        resource_state = self.get_resource_state(os_type) or {}
+        ec2_client = self.get_client("ec2")
+        create_launch_template_kwargs = {
+            "os_type": os_type.lower(),
+            "ec2_client": ec2_client,
+            "ssm_client": self.get_client("ssm"),
+            "ami_ttl": self.ami_ttl,
+            "refresh_ami": refresh_ami,
+        }
+        vpc_id = resource_state.get("vpc_id")
+        if vpc_id:
+            clear_subnet_index(vpc_id=vpc_id, ec2_client=ec2_client)
+        try:
+            launch_template = create_launch_template(
+                vpc_id=vpc_id, **create_launch_template_kwargs
+            )
+        except NetworkError:
+            if not vpc_id:
+                raise
+            logger.debug("Resolved network resources are stale, discovering them again")
+            self.clear_resource_state(os_type)
+            launch_template = create_launch_template(**create_launch_template_kwargs)
+        set_cache_entry(
+            RESOURCE_STATE_CACHE_NAME,
+            self.get_resource_state_key(os_type),
+            launch_template,
+        )
+        return ConfigureResult(region=self.region, **launch_template)
+
+    def launch(
+        self,
+        os_type: str,
+        num_instances: int = 1,
+        keypair: str = "None",
+        instance_type: str = "t2.micro",
+        on_transition: Callable = None,
+        fleet_options: dict = None,
+    ) -> LaunchResult:
+        """Launch instances from the launch template of the operating system.
+
+        Instances launched without a keypair are reachable with Session Manager. on_transition is
+        called with the instance ID, previous and new state as the instances boot. fleet_options
+        launches the instances with a single instant EC2 Fleet instead, see launch_fleet.
+        """
+        ec2_client = self.get_client("ec2")
+        provision_kwargs = {
+            "num_instances": num_instances,
+            "keypair": keypair,
+            "instance_type": instance_type,
+            "ec2_client": ec2_client,
+            "iam_client": self.get_client("iam"),
+            "sts_client": self.get_client("sts"),
+            "on_transition": on_transition,
+            "fleet_options": fleet_options,
+        }
+        resource_state = self.get_resource_state(os_type)
+        if resource_state:
+            # Warm path, straight to RunInstances with the launch template ID and version
+            launch_template = {
+                "LaunchTemplateId": resource_state["launch_template_id"],
+                "LaunchTemplateName": resource_state["launch_template_name"],
+                "DefaultVersionNumber": resource_state["launch_template_version"],
+            }
+            try:
+                provisioning = provision_ec2_instance(
+                    launch_template=launch_template, **provision_kwargs
+                )
+            except LaunchTemplateError:
+                # Raised only when no instance was launched, so launching again cannot duplicate them
+                logger.debug("Resolved launch template is stale, fetching it again")
+                clear_subnet_index(
+                    vpc_id=resource_state["vpc_id"], ec2_client=ec2_client
+                )
+                self.clear_resource_state(os_type)
+                resource_state = None
+        if not resource_state:
+            launch_template = get_latest_launch_template(
+                os_type=os_type.lower(), ec2_client=ec2_client
+            )
+            provisioning = provision_ec2_instance(
+                launch_template=launch_template, **provision_kwargs
+            )
+        return LaunchResult(
+            region=self.region,
+            launch_template_name=launch_template["LaunchTemplateName"],
+            **provisioning,
+        )
@@ -15,3 +15,76 @@ EC2_TRUST_RELATIONSHIP = {
     ],
 }
 LOGGING_FILE_NAME = ".secure_ec2.log"
+MAX_WORKERS = 10
+CACHE_DIR_NAME = ".secure_ec2"
+CACHE_DIR_ENV_VAR = "SECURE_EC2_CACHE_DIR"
+REGIONS_CACHE_NAME = "regions"
+DEFAULT_ARCHITECTURE = "x86_64"
+DESCRIBE_IMAGES_PAGE_SIZE = 1000
+AMI_CACHE_NAME = "amis"
+AMI_CACHE_TTL = 24 * 60 * 60
+LINUX_AMI_SSM_PARAMETER_PREFIX = "/aws/service/ami-amazon-linux-latest"
+WINDOWS_AMI_SSM_PARAMETER_PREFIX = "/aws/service/ami-windows-latest"
+IP_ADDRESS_PROVIDERS = (
+    "https://checkip.amazonaws.com",
+    "https://api.ipify.org",
+    "https://icanhazip.com",
+)
+IP_ADDRESS_PROVIDERS_ENV_VAR = "SECURE_EC2_IP_PROVIDERS"
+IP_ADDRESS_TIMEOUT = 2
+IP_ADDRESS_CACHE_NAME = "ip_address"
+IP_ADDRESS_CACHE_TTL = 5 * 60
+DESCRIBE_INSTANCES_BATCH_SIZE = 200
+INSTANCE_POLL_MIN_INTERVAL = 2
+INSTANCE_POLL_MAX_INTERVAL = 15
+INSTANCE_WAIT_TIMEOUT = 10 * 60
+IAM_PROPAGATION_ERROR_CODES = ("InvalidParameterValue", "InvalidInstanceProfile")
+IAM_PROPAGATION_MAX_ATTEMPTS = 6
+IAM_PROPAGATION_DELAY = 2
+SSM_MANAGED_POLICY_ARN = "arn:aws:iam::aws:policy/AmazonSSMManagedInstanceCore"
+IAM_CACHE_NAME = "iam"
+IAM_CACHE_TTL = 24 * 60 * 60
+ASYNC_MAX_WORKERS = 32
+LAUNCH_TEMPLATE_HASH_LENGTH = 16
+ACCOUNTS_CACHE_NAME = "accounts"
+ACCOUNTS_CACHE_TTL = 30 * 24 * 60 * 60
+RESOURCE_STATE_CACHE_NAME = "resources"
+RESOURCE_STATE_TTL = 7 * 24 * 60 * 60
+STALE_LAUNCH_TEMPLATE_ERROR_CODES = (
+    "InvalidLaunchTemplateId.NotFound",
+    "InvalidLaunchTemplateId.VersionNotFound",
+    "InvalidLaunchTemplateName.NotFoundException",
+    "InvalidSubnetID.NotFound",
+    "InvalidGroup.NotFound",
+)
+# (capacity, refill per second) of the EC2 request token buckets, run_instances counts instances
+EC2_REQUEST_TOKEN_BUCKETS = {
+    "non_mutating": (100, 20),
+    "unfiltered_non_mutating": (50, 10),
+    "mutating": (200, 5),
+    "run_instances": (1000, 2),
+}
+BOTO3_RETRY_MODE = "adaptive"
+BOTO3_MAX_ATTEMPTS = 10
+INSUFFICIENT_CAPACITY_ERROR_CODES = (
+    "InsufficientInstanceCapacity",
+    "InsufficientFreeAddressesInSubnet",
+)
+INSUFFICIENT_CAPACITY_MAX_ATTEMPTS = 4
+INSUFFICIENT_CAPACITY_DELAY = 5
+LAUNCH_CHUNK_SIZE = 100
+UNSUPPORTED_ZONE_ERROR_CODES = ("Unsupported",)
+SUBNET_INDEX_CACHE_NAME = "subnets"
+SUBNET_INDEX_CACHE_TTL = 5 * 60
+INSTANCE_TYPES_CACHE_NAME = "instance_types"
+INSTANCE_TYPE_OFFERINGS_CACHE_NAME = "instance_type_offerings"
+INSTANCE_TYPES_CACHE_TTL = 24 * 60 * 60
+INSTANCE_TYPE_SUGGESTIONS = 3
+FLEET_ALLOCATION_STRATEGIES = (
+    "price-capacity-optimized",
+    "capacity-optimized",
+    "lowest-price",
+    "diversified",
+)
+DEFAULT_FLEET_ALLOCATION_STRATEGY = "price-capacity-optimized"
+FLEET_MAX_OVERRIDES = 300
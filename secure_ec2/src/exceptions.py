@@ -0,0 +1,33 @@
+"""Exceptions that secure_ec2 raise."""
+
+
+class SecureEC2Error(Exception):
+    """Error raised by secure_ec2 methods, its message is safe to display to the user."""
+
+
+class AWSAccessError(SecureEC2Error):
+    """Error raised when the AWS credentials, regions or services cannot be used."""
+
+
+class NetworkError(SecureEC2Error):
+    """Error raised when the VPC, subnet, security group or public IP address cannot be resolved."""
+
+
+class AMINotFoundError(SecureEC2Error):
+    """Error raised when no AMI matches the operating system."""
+
+
+class LaunchTemplateError(SecureEC2Error):
+    """Error raised when the launch template cannot be read or written."""
+
+
+class InstanceTypeError(SecureEC2Error):
+    """Error raised when the instance type does not exist, fit the AMI or is not offered in the region."""
+
+
+class InstanceProvisioningError(SecureEC2Error):
+    """Error raised when the instances fail to launch or to reach the running state."""
+
+
+class InstanceProfileError(SecureEC2Error):
+    """Error raised when the Session Manager instance profile cannot be prepared or associated."""
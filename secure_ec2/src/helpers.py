@@ -1,12 +1,70 @@
 """Helper methods that secure_ec2 use, mostly used to do offline and non-cloud calculations."""
 
+import functools
 import getpass
+import ipaddress
+import logging
+import os
+import queue
 import re
+import threading
+import time
+from typing import Callable, Iterator, Optional
 
-import requests
-from halo import Halo
+from secure_ec2.src.cache import get_cache_entry, set_cache_entry
+from secure_ec2.src.constants import (
+    DEFAULT_ARCHITECTURE,
+    IP_ADDRESS_CACHE_NAME,
+    IP_ADDRESS_CACHE_TTL,
+    IP_ADDRESS_PROVIDERS,
+    IP_ADDRESS_PROVIDERS_ENV_VAR,
+    IP_ADDRESS_TIMEOUT,
+    LAUNCH_TEMPLATE_SUFFIX,
+    LINUX_AMI_SSM_PARAMETER_PREFIX,
+    MODULE_NAME,
+    WINDOWS_AMI_SSM_PARAMETER_PREFIX,
+)
+from secure_ec2.src.exceptions import NetworkError
 
-from secure_ec2.src.constants import LAUNCH_TEMPLATE_SUFFIX, MODULE_NAME
+logger = logging.getLogger(__name__)
+
+_spinner_state = {"active": False, "enabled": False}
+
+
+def enable_spinners(enabled: bool = True):
+    """Turn the terminal spinners on, they are off unless the command line enables them."""
+    _spinner_state["enabled"] = enabled
+
+
+def spinner(text: str) -> Callable:
+    """Decorate a method to display a terminal spinner while it runs, importing halo on first call.
+
+    Only the outermost call on the main thread animates, so nested calls and calls running on
+    worker threads do not fight over the terminal. Nothing animates when the package is used as a
+    library.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if (
+                not _spinner_state["enabled"]
+                or _spinner_state["active"]
+                or threading.current_thread() is not threading.main_thread()
+            ):
+                return func(*args, **kwargs)
+            from halo import Halo
+
+            _spinner_state["active"] = True
+            try:
+                with Halo(text=text, spinner="dots"):
+                    return func(*args, **kwargs)
+            finally:
+                _spinner_state["active"] = False
+
+        return wrapper
+
+    return decorator
 
 
 def get_connection_port(os_type: str) -> int:
@@ -23,11 +81,73 @@ def get_username() -> str:
     return formatted_user_name
 
 
-@Halo(text="Discovering endpoint public IP address\r\n", spinner="dots")
+def fetch_ip_address(url: str, timeout: float = IP_ADDRESS_TIMEOUT) -> str:
+    """Fetch the public IP address of the computer from a single provider, validating the answer."""
+    from urllib.request import urlopen
+
+    with urlopen(url, timeout=timeout) as response:  # nosec B310
+        ip_address = response.read(64).decode().strip()
+    return str(ipaddress.IPv4Address(ip_address))
+
+
+def discover_ip_address(
+    providers: list = None,
+    timeout: float = IP_ADDRESS_TIMEOUT,
+    ttl: float = IP_ADDRESS_CACHE_TTL,
+) -> str:
+    """Discover the public IP address of the computer, racing the providers for the first valid answer.
+
+    The providers default to the comma separated URLs of an environment variable, or to the
+    built-in provider list. The discovered address is cached for ttl seconds.
+    """
+    cached_ip_address = get_cache_entry(
+        name=IP_ADDRESS_CACHE_NAME, key="ip_address", ttl=ttl
+    )
+    if cached_ip_address:
+        return cached_ip_address["ip_address"]
+
+    if providers is None:
+        providers_override = os.environ.get(IP_ADDRESS_PROVIDERS_ENV_VAR)
+        providers = (
+            providers_override.split(",")
+            if providers_override
+            else IP_ADDRESS_PROVIDERS
+        )
+    answers = queue.Queue()
+
+    def fetch(url: str):
+        try:
+            answers.put((url, fetch_ip_address(url=url, timeout=timeout)))
+        except (OSError, ValueError) as error:
+            logger.debug(
+                f"Unable to discover the public IP address from {url}: {error}"
+            )
+            answers.put((url, None))
+
+    for url in providers:
+        threading.Thread(target=fetch, args=(url.strip(),), daemon=True).start()
+
+    deadline = time.monotonic() + timeout
+    for _ in providers:
+        try:
+            url, ip_address = answers.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            break
+        if ip_address:
+            logger.debug(f"Discovered public IP address {ip_address} from {url}")
+            set_cache_entry(
+                name=IP_ADDRESS_CACHE_NAME,
+                key="ip_address",
+                entry={"ip_address": ip_address, "provider": url},
+            )
+            return ip_address
+    raise NetworkError("Unable to discover the public IP address")
+
+
+@spinner(text="Discovering endpoint public IP address\r\n")
 def get_ip_address() -> str:
     """Get the public IP address of the computer."""
-    ip_address = requests.get("http://checkip.amazonaws.com").text.rstrip()
-    return ip_address
+    return discover_ip_address()
 
 
 def get_os_regex(os_type: str) -> str:
@@ -41,6 +161,26 @@ def get_os_regex(os_type: str) -> str:
     return os_regex
 
 
+def get_os_ssm_parameter(
+    os_type: str, architecture: str = DEFAULT_ARCHITECTURE
+) -> Optional[str]:
+    """Get the AWS published SSM public parameter holding the latest AMI of the operating system."""
+    if os_type.lower() == "windows" and architecture == DEFAULT_ARCHITECTURE:
+        return (
+            f"{WINDOWS_AMI_SSM_PARAMETER_PREFIX}/Windows_Server-2019-English-Full-Base"
+        )
+    elif os_type.lower() == "linux":
+        return f"{LINUX_AMI_SSM_PARAMETER_PREFIX}/amzn2-ami-hvm-{architecture}-gp2"
+    return None
+
+
+def chunks(items: list, size: int) -> Iterator[list]:
+    """Split a list into consecutive chunks of at most size items."""
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
 def get_launch_template_name(os_type: str) -> str:
     """Build the launch template name by concatenating the username and suffix."""
     local_username = get_username()
@@ -0,0 +1,151 @@
+"""Client-side rate limiting that secure_ec2 use to stay within the EC2 API request rate limits.
+
+EC2 throttles each account and region with token buckets, one per category of API actions, and
+RunInstances additionally with a bucket of instances. The limiter mirrors those buckets in-process
+and makes each call wait for its tokens, so the threads of a command share the allowance and keep
+the aggregate throughput at the limit instead of stampeding into RequestLimitExceeded errors.
+"""
+
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from secure_ec2.src.constants import EC2_REQUEST_TOKEN_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+NON_MUTATING_ACTION_PREFIXES = ("Describe", "Get", "List", "Search")
+FILTER_PARAMETER_PREFIXES = ("Filter", "MaxResults", "NextToken")
+
+_buckets_lock = threading.Lock()
+_buckets: dict = {}
+_prepaid = threading.local()
+
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously up to its capacity."""
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_rate: float,
+        clock: Callable = time.monotonic,
+        sleep: Callable = time.sleep,
+    ):
+        """Create a full bucket that refills refill_rate tokens per second."""
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._refilled_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens from the bucket without waiting, returning how long to wait until they are refilled.
+
+        Concurrent callers queue up behind each other instead of all waking up for the same refill.
+        """
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self._refilled_at) * self.refill_rate,
+            )
+            self._refilled_at = now
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.refill_rate)
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take tokens from the bucket, waiting until they are refilled, and return the time waited."""
+        wait = self.reserve(tokens)
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+def get_token_bucket(profile: str, region: str, category: str) -> TokenBucket:
+    """Get the process-wide token bucket of an API category, per profile and region."""
+    key = (profile, region, category)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            capacity, refill_rate = EC2_REQUEST_TOKEN_BUCKETS[category]
+            bucket = TokenBucket(capacity=capacity, refill_rate=refill_rate)
+            _buckets[key] = bucket
+        return bucket
+
+
+def clear_token_buckets():
+    """Drop every token bucket, they start full again on next use."""
+    with _buckets_lock:
+        _buckets.clear()
+
+
+def get_request_token_costs(operation: str, params: dict) -> list:
+    """Get the tokens that an EC2 API call takes from each bucket, as (category, tokens) pairs."""
+    body = params.get("body") or {}
+    if not isinstance(body, dict):
+        body = {}
+    if operation.startswith(NON_MUTATING_ACTION_PREFIXES):
+        filtered = any(
+            key.startswith(FILTER_PARAMETER_PREFIXES) or "Id." in key for key in body
+        )
+        return [("non_mutating" if filtered else "unfiltered_non_mutating", 1)]
+    token_costs = [("mutating", 1)]
+    if operation == "RunInstances":
+        token_costs.append(("run_instances", int(body.get("MaxCount", 1))))
+    return token_costs
+
+
+def reserve_request_tokens(token_costs: list, profile: str, region: str) -> float:
+    """Take the request tokens of an EC2 API call without waiting, returning how long to wait before sending it."""
+    return max(
+        (
+            get_token_bucket(profile, region, category).reserve(tokens)
+            for category, tokens in token_costs
+        ),
+        default=0.0,
+    )
+
+
+@contextmanager
+def prepaid_request_tokens(token_costs: list) -> Iterator:
+    """Let the EC2 API calls of the current thread spend tokens that were reserved beforehand.
+
+    The asynchronous flows wait for the tokens of a call on the event loop, so the executor thread
+    that sends it does not sleep. Calls beyond the prepaid tokens still wait for their own.
+    """
+    _prepaid.tokens = dict(token_costs)
+    try:
+        yield
+    finally:
+        _prepaid.tokens = None
+
+
+def limit_request_rate(model: Any, params: dict, profile: str, region: str, **kwargs):
+    """Wait for the request tokens of an EC2 API call before it is sent."""
+    prepaid_tokens = getattr(_prepaid, "tokens", None) or {}
+    for category, tokens in get_request_token_costs(model.name, params):
+        if prepaid_tokens.get(category, 0) >= tokens:
+            prepaid_tokens[category] -= tokens
+            continue
+        waited = get_token_bucket(profile, region, category).acquire(tokens)
+        if waited:
+            logger.debug(
+                f"Throttled {model.name} for {waited:.2f}s on {category} tokens"
+            )
+
+
+def register_rate_limiting(client: Any, profile: str = None):
+    """Register the client-side rate limiter on a boto3 client, only EC2 calls are limited."""
+    client.meta.events.register(
+        "before-call.ec2",
+        functools.partial(
+            limit_request_rate, profile=profile, region=client.meta.region_name
+        ),
+    )
@@ -0,0 +1,195 @@
+"""AWS API call tracing that secure_ec2 use to profile where commands spend their time."""
+
+import json
+import threading
+import time
+from typing import Any
+from urllib.parse import urlencode
+
+TRACE_CONTEXT_KEY = "secure_ec2_trace"
+
+_tracers_lock = threading.Lock()
+_active_tracers: list = []
+
+
+class CallTracer:
+    """Record every AWS API call made by the pooled clients while the tracer is started."""
+
+    def __init__(self):
+        """Create a tracer with no recorded calls."""
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "CallTracer":
+        """Start tracing for the duration of a with block."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop tracing at the end of a with block."""
+        self.stop()
+
+    def start(self):
+        """Start recording the AWS API calls."""
+        with _tracers_lock:
+            if self not in _active_tracers:
+                _active_tracers.append(self)
+
+    def stop(self):
+        """Stop recording the AWS API calls."""
+        with _tracers_lock:
+            if self in _active_tracers:
+                _active_tracers.remove(self)
+
+    def record(self, call: dict):
+        """Record a completed AWS API call."""
+        with self._lock:
+            self.calls.append(call)
+
+    def count_calls(self) -> dict:
+        """Count the recorded calls per service.Operation."""
+        call_counts = {}
+        with self._lock:
+            for call in self.calls:
+                operation = f"{call['service']}.{call['operation']}"
+                call_counts[operation] = call_counts.get(operation, 0) + 1
+        return call_counts
+
+    def summarize(self) -> list:
+        """Aggregate the recorded calls per operation, the slowest operations first."""
+        operations = {}
+        with self._lock:
+            calls = list(self.calls)
+        for call in calls:
+            operation = operations.setdefault(
+                (call["service"], call["operation"]),
+                {
+                    "service": call["service"],
+                    "operation": call["operation"],
+                    "calls": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "total_latency": 0.0,
+                    "max_latency": 0.0,
+                    "request_size": 0,
+                    "response_size": 0,
+                },
+            )
+            operation["calls"] += 1
+            operation["errors"] += 1 if call["error"] else 0
+            operation["retries"] += call["retries"]
+            operation["total_latency"] += call["latency"]
+            operation["max_latency"] = max(operation["max_latency"], call["latency"])
+            operation["request_size"] += call["request_size"]
+            operation["response_size"] += call["response_size"]
+        return sorted(
+            operations.values(),
+            key=lambda operation: operation["total_latency"],
+            reverse=True,
+        )
+
+    def format_summary(self) -> str:
+        """Format the per operation summary as a table."""
+        lines = [
+            f"{'Service':<12} {'Operation':<40} {'Calls':>6} {'Errors':>6} {'Retries':>7} "
+            f"{'Total ms':>9} {'Avg ms':>8} {'Max ms':>8} {'Bytes':>10}"
+        ]
+        for operation in self.summarize():
+            lines.append(
+                f"{operation['service']:<12} {operation['operation']:<40} "
+                f"{operation['calls']:>6} {operation['errors']:>6} {operation['retries']:>7} "
+                f"{operation['total_latency'] * 1000:>9.1f} "
+                f"{operation['total_latency'] * 1000 / operation['calls']:>8.1f} "
+                f"{operation['max_latency'] * 1000:>8.1f} "
+                f"{operation['request_size'] + operation['response_size']:>10}"
+            )
+        return "\n".join(lines)
+
+    def write_trace_file(self, path: str):
+        """Write the recorded calls and their summary to a JSON file for offline analysis."""
+        with self._lock:
+            calls = list(self.calls)
+        with open(path, "w") as trace_file:
+            json.dump(
+                {"calls": calls, "summary": self.summarize()}, trace_file, indent=2
+            )
+
+
+def get_request_size(params: dict) -> int:
+    """Get the size of the serialized request body of an API call."""
+    body = params.get("body") or b""
+    if isinstance(body, dict):
+        body = urlencode(body)
+    if isinstance(body, str):
+        body = body.encode()
+    return len(body) if isinstance(body, (bytes, bytearray)) else 0
+
+
+def on_before_call(model: Any, params: dict, context: dict, **kwargs):
+    """Mark the start of an API call, when a tracer is active."""
+    if _active_tracers:
+        context[TRACE_CONTEXT_KEY] = {
+            "started_at": time.time(),
+            "started": time.perf_counter(),
+            "request_size": get_request_size(params),
+        }
+
+
+def record_call(service: str, operation: str, context: dict, **call):
+    """Record an API call in every active tracer."""
+    trace = context.pop(TRACE_CONTEXT_KEY, None)
+    if trace is None:
+        return
+    call = {
+        "service": service,
+        "operation": operation,
+        "started_at": trace["started_at"],
+        "latency": time.perf_counter() - trace["started"],
+        "request_size": trace["request_size"],
+        **call,
+    }
+    with _tracers_lock:
+        tracers = list(_active_tracers)
+    for tracer in tracers:
+        tracer.record(call)
+
+
+def on_after_call(
+    http_response: Any, parsed: dict, model: Any, context: dict, **kwargs
+):
+    """Record an API call that got a response."""
+    response_metadata = parsed.get("ResponseMetadata", {})
+    record_call(
+        service=model.service_model.service_name,
+        operation=model.name,
+        context=context,
+        status_code=getattr(http_response, "status_code", None),
+        retries=response_metadata.get("RetryAttempts", 0),
+        response_size=len(getattr(http_response, "content", b"") or b""),
+        error=parsed.get("Error", {}).get("Code"),
+    )
+
+
+def on_after_call_error(exception: Exception, context: dict, event_name: str, **kwargs):
+    """Record an API call that failed without a response.
+
+    botocore does not pass the operation model with this event, the service and operation are
+    taken from the event name instead.
+    """
+    _, service, operation = event_name.split(".", 2)
+    record_call(
+        service=service,
+        operation=operation,
+        context=context,
+        status_code=None,
+        retries=0,
+        response_size=0,
+        error=type(exception).__name__,
+    )
+
+
+def register_call_tracing(client: Any):
+    """Register the tracing handlers on a boto3 client, they do nothing until a tracer is started."""
+    client.meta.events.register("before-call", on_before_call)
+    client.meta.events.register("after-call", on_after_call)
+    client.meta.events.register("after-call-error", on_after_call_error)
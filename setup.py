@@ -16,7 +16,6 @@ requirements = [
     "Click==8.0.1",
     "boto3==1.17.109",
     "PyInquirer==1.0.3",
-    "requests==2.25.1",
     "halo==0.0.31",
     "pyperclip==1.8.2",
 ]
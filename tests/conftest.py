@@ -1,9 +1,14 @@
 """Define common methods and fixtures that should be shared across testing modules."""
 
+from contextlib import contextmanager
+
 import pytest
-from moto import mock_ec2, mock_iam, mock_sts
+from moto import mock_ec2, mock_iam, mock_ssm, mock_sts
 
 from secure_ec2.src import constants, helpers
+from secure_ec2.src.constants import CACHE_DIR_ENV_VAR
+from secure_ec2.src.throttling import clear_token_buckets
+from secure_ec2.src.tracing import CallTracer
 
 
 def mock_get_ip_address():
@@ -23,6 +28,21 @@ pytest.MonkeyPatch().setattr(
 from secure_ec2.src.aws import get_boto3_client, get_boto3_resource  # noqa: E402
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep the on-disk caches of every test in its own temporary directory."""
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path / "cache"))
+    yield tmp_path / "cache"
+
+
+@pytest.fixture(autouse=True)
+def token_buckets():
+    """Start every test with full token buckets, the moto calls of other tests do not count."""
+    clear_token_buckets()
+    yield
+    clear_token_buckets()
+
+
 @pytest.fixture(autouse=True)
 def ec2_client_stub():
     """Use moto EC2 client stub in tests instead of a real boto3 client."""
@@ -61,3 +81,36 @@ def sts_client_stub():
             service="sts",
         )
         yield sts_client
+
+
+@pytest.fixture(autouse=True)
+def ssm_client_stub():
+    """Use moto SSM client stub in tests instead of a real boto3 client."""
+    with mock_ssm():
+        ssm_client = get_boto3_client(
+            service="ssm",
+        )
+        yield ssm_client
+
+
+@pytest.fixture
+def call_budget():
+    """Assert that the AWS API calls made in a with block stay within a budget.
+
+    The budget is a maximum of total calls, optionally with a maximum per service.Operation.
+    """
+
+    @contextmanager
+    def assert_call_budget(max_calls: int, operation_budgets: dict = None):
+        with CallTracer() as tracer:
+            yield tracer
+        call_counts = tracer.count_calls()
+        assert (
+            sum(call_counts.values()) <= max_calls
+        ), f"Made more than {max_calls} AWS API calls: {call_counts}"
+        for operation, max_operation_calls in (operation_budgets or {}).items():
+            assert (
+                call_counts.get(operation, 0) <= max_operation_calls
+            ), f"Made more than {max_operation_calls} {operation} calls: {call_counts}"
+
+    return assert_call_budget
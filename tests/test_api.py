@@ -1,17 +1,60 @@
 """Tests definition for the API methods that secure_ec2 use."""
 
+import json
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from secure_ec2.src import api
 from secure_ec2.src.api import (
+    associate_instance_profile,
+    build_fleet_request,
+    create_launch_template,
     create_security_group,
     create_ssm_instance_profile,
     get_default_vpc_id,
+    get_instance_type_zones,
     get_key_pairs,
     get_latest_ami_id,
     get_latest_launch_template,
+    get_ranked_subnet_ids,
     get_subnet_id,
+    get_subnet_index,
+    get_vpc_subnets,
+    hash_launch_template_data,
+    launch_fleet,
+    launch_instances,
+    plan_launch_chunks,
     provision_ec2_instance,
+    put_launch_template,
+    rank_subnets,
+    resolve_latest_ami_ids,
+    run_in_regions,
+    validate_instance_type,
+    wait_for_instances,
+)
+from secure_ec2.src.aws import get_boto3_client
+from secure_ec2.src.cache import get_cache_entry, set_cache_entry
+from secure_ec2.src.constants import (
+    AMI_CACHE_NAME,
+    AMI_CACHE_TTL,
+    EC2_TRUST_RELATIONSHIP,
+    MODULE_NAME,
+    SSM_ROLE_NAME,
+)
+from secure_ec2.src.exceptions import (
+    InstanceProvisioningError,
+    InstanceTypeError,
+    NetworkError,
+    SecureEC2Error,
+)
+from secure_ec2.src.helpers import (
+    get_launch_template_name,
+    get_os_ssm_parameter,
+    get_username,
 )
-from secure_ec2.src.constants import MODULE_NAME, SSM_ROLE_NAME
-from secure_ec2.src.helpers import get_launch_template_name, get_username
 
 
 def test_get_key_pairs(ec2_client_stub):
@@ -27,6 +70,62 @@ def test_get_subnet_id(ec2_client_stub):
     assert isinstance(subnet_id, str)
 
 
+def test_get_subnet_index(ec2_client_stub, call_budget):
+    """Testing the get_subnet_index method and the ranking of its subnets."""
+    vpc_id = get_default_vpc_id(ec2_client=ec2_client_stub)
+    with call_budget(1):
+        subnet_index = get_subnet_index(vpc_id=vpc_id, ec2_client=ec2_client_stub)
+    with call_budget(0):
+        assert (
+            get_subnet_index(vpc_id=vpc_id, ec2_client=ec2_client_stub) == subnet_index
+        )
+    assert {subnet["subnet_id"] for subnet in subnet_index} == set(
+        get_ranked_subnet_ids(vpc_id=vpc_id, ec2_client=ec2_client_stub)
+    )
+    assert get_instance_type_zones(instance_type="t2.micro", ec2_client=ec2_client_stub)
+
+    subnet_index = [
+        {
+            "subnet_id": "subnet-full",
+            "availability_zone": "us-east-1a",
+            "available_ip_address_count": 0,
+        },
+        {
+            "subnet_id": "subnet-small",
+            "availability_zone": "us-east-1a",
+            "available_ip_address_count": 10,
+        },
+        {
+            "subnet_id": "subnet-large",
+            "availability_zone": "us-east-1b",
+            "available_ip_address_count": 1000,
+        },
+    ]
+    assert rank_subnets(subnet_index) == ["subnet-large", "subnet-small"]
+    assert rank_subnets(subnet_index, availability_zones=["us-east-1a"]) == [
+        "subnet-small"
+    ]
+
+
+def test_validate_instance_type(ec2_client_stub, call_budget):
+    """Testing the validate_instance_type method on the cached instance types."""
+    with call_budget(2):
+        validate_instance_type(instance_type="t2.micro", ec2_client=ec2_client_stub)
+    with call_budget(0):
+        with pytest.raises(InstanceTypeError) as error:
+            validate_instance_type(instance_type="t2.mcro", ec2_client=ec2_client_stub)
+        assert "did you mean t2.micro" in str(error.value)
+        with pytest.raises(InstanceTypeError):
+            validate_instance_type(
+                instance_type="t4g.micro", ec2_client=ec2_client_stub
+            )
+        validate_instance_type(
+            instance_type="t4g.micro",
+            ec2_client=ec2_client_stub,
+            architecture="arm64",
+        )
+
+
 def test_get_default_vpc(ec2_client_stub):
     """Testing the get_default_vpc method."""
     vpc_id = get_default_vpc_id(ec2_client=ec2_client_stub)
@@ -44,6 +143,88 @@ def test_get_latest_ami_id(ec2_client_stub):
     assert isinstance(image_id, str)
 
 
+def test_get_latest_ami_id_cached(ec2_client_stub, monkeypatch):
+    """Testing that get_latest_ami_id reuses the cached AMI until it is refreshed."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    image_id = get_latest_ami_id(os_type="Linux", ec2_client=ec2_client_stub)
+    cached_ami = get_cache_entry(
+        name=AMI_CACHE_NAME,
+        key="us-east-1|linux|amzn2-ami-hvm-2.0*|x86_64",
+        ttl=AMI_CACHE_TTL,
+    )
+    assert cached_ami["image_id"] == image_id
+    assert cached_ami["resolved_at"] <= time.time()
+
+    scans = []
+
+    def scan_images(**kwargs):
+        scans.append(kwargs)
+        return iter([{"ImageId": "ami-refreshed", "CreationDate": "2030-01-01"}])
+
+    monkeypatch.setattr(api, "iter_images", scan_images)
+    assert get_latest_ami_id(os_type="Linux", ec2_client=ec2_client_stub) == image_id
+    assert not scans
+
+    refreshed_image_id = get_latest_ami_id(
+        os_type="Linux", ec2_client=ec2_client_stub, refresh_ami=True
+    )
+    assert refreshed_image_id == "ami-refreshed"
+    assert len(scans) == 1
+    assert get_latest_ami_id(os_type="Linux", ec2_client=ec2_client_stub) == (
+        "ami-refreshed"
+    )
+
+
+def test_get_latest_ami_id_expired(ec2_client_stub):
+    """Testing that get_latest_ami_id resolves the AMI again once the cached AMI expired."""
+    set_cache_entry(
+        name=AMI_CACHE_NAME,
+        key="us-east-1|linux|amzn2-ami-hvm-2.0*|x86_64",
+        entry={"image_id": "ami-stale"},
+    )
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    assert get_latest_ami_id(os_type="Linux", ec2_client=ec2_client_stub) == "ami-stale"
+    assert (
+        get_latest_ami_id(os_type="Linux", ec2_client=ec2_client_stub, ami_ttl=-1)
+        != "ami-stale"
+    )
+
+
+def test_resolve_latest_ami_ids(ec2_client_stub, ssm_client_stub):
+    """Testing the resolve_latest_ami_ids method, falling back to the image scan for Windows."""
+    windows_image = ec2_client_stub.copy_image(
+        Name="Windows_Server-2019-English-Full-Base-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    linux_parameter = ssm_client_stub.get_parameter(
+        Name=get_os_ssm_parameter(os_type="Linux")
+    )["Parameter"]
+    ami_ids = resolve_latest_ami_ids(
+        os_types=["Linux", "Windows"],
+        ec2_client=ec2_client_stub,
+        ssm_client=ssm_client_stub,
+    )
+    assert ami_ids == {
+        "Linux": linux_parameter["Value"],
+        "Windows": windows_image["ImageId"],
+    }
+    cached_ami = get_cache_entry(
+        name=AMI_CACHE_NAME,
+        key=f"us-east-1|linux|{linux_parameter['Name']}|x86_64",
+        ttl=AMI_CACHE_TTL,
+    )
+    assert cached_ami["image_id"] == linux_parameter["Value"]
+
+
 def test_create_security_group(ec2_client_stub):
     """Testing the create_security_group method."""
     default_vpc_id = get_default_vpc_id(ec2_client=ec2_client_stub)
@@ -103,7 +284,39 @@ def test_get_latest_launch_template(ec2_client_stub):
     )
 
 
-def test_provision_ec2_instance(ec2_client_stub, iam_client_stub, ec2_resource_stub):
+def test_put_launch_template_unchanged(ec2_client_stub):
+    """Testing that put_launch_template makes no write calls when the data did not change."""
+    launch_template_data = {"ImageId": "ami-000c540e28953ace2", "Monitoring": {}}
+    assert hash_launch_template_data(launch_template_data) == hash_launch_template_data(
+        dict(reversed(list(launch_template_data.items())))
+    )
+    launch_template = put_launch_template(
+        os_type="Linux",
+        launch_template_data=launch_template_data,
+        ec2_client=ec2_client_stub,
+    )
+    assert launch_template["launch_template_version"] == 1
+    ec2_calls = []
+
+    def on_before_call(model, **kwargs):
+        ec2_calls.append(model.name)
+
+    ec2_client_stub.meta.events.register("before-call.ec2", on_before_call)
+    try:
+        assert (
+            put_launch_template(
+                os_type="Linux",
+                launch_template_data=launch_template_data,
+                ec2_client=ec2_client_stub,
+            )
+            == launch_template
+        )
+    finally:
+        ec2_client_stub.meta.events.unregister("before-call.ec2", on_before_call)
+    assert ec2_calls == ["DescribeLaunchTemplateVersions"]
+
+
+def test_provision_ec2_instance(ec2_client_stub, iam_client_stub):
     """Testing the provision_ec2_instance method."""
     default_vpc_id = get_default_vpc_id(ec2_client=ec2_client_stub)
     security_group = create_security_group(
@@ -150,17 +363,374 @@ def test_provision_ec2_instance(ec2_client_stub, iam_client_stub, ec2_resource_s
     launch_template = get_latest_launch_template(
         os_type="Linux", ec2_client=ec2_client_stub
     )
-    instance_id = provision_ec2_instance(
+    provisioning = provision_ec2_instance(
         launch_template=launch_template,
         keypair=key_pair,
         instance_type="t2.micro",
         num_instances=1,
-        no_clip=True,
         ec2_client=ec2_client_stub,
         iam_client=iam_client_stub,
-        ec2_resource=ec2_resource_stub,
     )
-    assert isinstance(instance_id, str)
+    assert len(provisioning["instance_ids"]) == 1
+    assert list(provisioning["connect_urls"]) == provisioning["instance_ids"]
+
+
+def test_provision_ec2_instance_ssm(ec2_client_stub, iam_client_stub):
+    """Testing the provision_ec2_instance method with Session Manager access."""
+    image_id = ec2_client_stub.describe_images(Owners=["amazon"])["Images"][0][
+        "ImageId"
+    ]
+    ec2_client_stub.create_launch_template(
+        LaunchTemplateName=get_launch_template_name(os_type="Linux"),
+        LaunchTemplateData={"ImageId": image_id},
+    )
+    launch_template = get_latest_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    provision_ec2_instance(
+        launch_template=launch_template,
+        keypair="None",
+        instance_type="t2.micro",
+        num_instances=2,
+        ec2_client=ec2_client_stub,
+        iam_client=iam_client_stub,
+    )
+    associations = ec2_client_stub.describe_iam_instance_profile_associations()[
+        "IamInstanceProfileAssociations"
+    ]
+    assert len(associations) == 2
+
+
+def test_associate_instance_profile_propagation(ec2_client_stub, monkeypatch):
+    """Testing that associate_instance_profile retries until the profile propagates."""
+    attempts = []
+
+    def associate_iam_instance_profile(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) < 3:
+            raise ClientError(
+                {"Error": {"Code": "InvalidParameterValue"}},
+                "AssociateIamInstanceProfile",
+            )
+        return {"IamInstanceProfileAssociation": {"AssociationId": "iip-assoc-1"}}
+
+    monkeypatch.setattr(
+        ec2_client_stub,
+        "associate_iam_instance_profile",
+        associate_iam_instance_profile,
+    )
+    association_id = associate_instance_profile(
+        instance_id="i-1",
+        instance_profile=SSM_ROLE_NAME,
+        ec2_client=ec2_client_stub,
+        delay=0,
+    )
+    assert association_id == "iip-assoc-1"
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(SecureEC2Error):
+        associate_instance_profile(
+            instance_id="i-1",
+            instance_profile=SSM_ROLE_NAME,
+            ec2_client=ec2_client_stub,
+            max_attempts=2,
+            delay=0,
+        )
+    assert len(attempts) == 2
+
+
+@pytest.mark.parametrize("error_code", ["InsufficientInstanceCapacity", "Unsupported"])
+def test_launch_instances_insufficient_capacity(
+    error_code, ec2_client_stub, monkeypatch
+):
+    """Testing that launch_instances moves to other subnets when a subnet cannot take the instances."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    launch_template = create_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    launch_template = {
+        "LaunchTemplateId": launch_template["launch_template_id"],
+        "LaunchTemplateName": launch_template["launch_template_name"],
+        "DefaultVersionNumber": launch_template["launch_template_version"],
+    }
+    run_instances = ec2_client_stub.run_instances
+    attempts = []
+
+    def subnet_out_of_capacity_run_instances(**kwargs):
+        attempts.append(kwargs)
+        if "NetworkInterfaces" not in kwargs:
+            raise ClientError({"Error": {"Code": error_code}}, "RunInstances")
+        return run_instances(**kwargs)
+
+    monkeypatch.setattr(
+        ec2_client_stub, "run_instances", subnet_out_of_capacity_run_instances
+    )
+    instance_ids = launch_instances(
+        launch_template=launch_template,
+        num_instances=3,
+        instance_type="t2.micro",
+        ec2_client=ec2_client_stub,
+        delay=0,
+    )
+    assert len(instance_ids) == 3
+    assert all(attempt["MinCount"] == 1 for attempt in attempts[1:])
+
+    def out_of_capacity_run_instances(**kwargs):
+        attempts.append(kwargs)
+        raise ClientError(
+            {"Error": {"Code": "InsufficientInstanceCapacity"}}, "RunInstances"
+        )
+
+    monkeypatch.setattr(ec2_client_stub, "run_instances", out_of_capacity_run_instances)
+    with pytest.raises(InstanceProvisioningError):
+        launch_instances(
+            launch_template=launch_template,
+            num_instances=2,
+            instance_type="t2.micro",
+            ec2_client=ec2_client_stub,
+            max_attempts=2,
+            delay=0,
+        )
+
+
+def test_launch_instances_chunk_failure(ec2_client_stub, monkeypatch):
+    """Testing that launch_instances keeps the launched instances when a later launch fails."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    launch_template = create_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    launch_template = {"LaunchTemplateName": launch_template["launch_template_name"]}
+    run_instances = ec2_client_stub.run_instances
+    attempts = []
+    attempts_lock = threading.Lock()
+
+    def third_chunk_failing_run_instances(**kwargs):
+        with attempts_lock:
+            attempts.append(kwargs)
+            attempt = len(attempts)
+        if attempt == 3:
+            raise ClientError({"Error": {"Code": "InvalidParameter"}}, "RunInstances")
+        return run_instances(**kwargs)
+
+    monkeypatch.setattr(
+        ec2_client_stub, "run_instances", third_chunk_failing_run_instances
+    )
+    instance_ids = launch_instances(
+        launch_template=launch_template,
+        num_instances=6,
+        instance_type="t2.micro",
+        ec2_client=ec2_client_stub,
+        chunk_size=2,
+        delay=0,
+    )
+    assert len(instance_ids) == 6 - attempts[2]["MaxCount"]
+    reservations = ec2_client_stub.describe_instances()["Reservations"]
+    assert sorted(instance_ids) == sorted(
+        instance["InstanceId"]
+        for reservation in reservations
+        for instance in reservation["Instances"]
+    )
+
+    attempts.clear()
+
+    def failing_retry_run_instances(**kwargs):
+        attempts.append(kwargs)
+        if "NetworkInterfaces" in kwargs and len(attempts) == 2:
+            return run_instances(**dict(kwargs, MaxCount=1, MinCount=1))
+        if "NetworkInterfaces" in kwargs or kwargs["MaxCount"] == 3:
+            raise ClientError(
+                {"Error": {"Code": "InsufficientInstanceCapacity"}}, "RunInstances"
+            )
+        raise ClientError({"Error": {"Code": "InvalidParameter"}}, "RunInstances")
+
+    monkeypatch.setattr(ec2_client_stub, "run_instances", failing_retry_run_instances)
+    instance_ids = launch_instances(
+        launch_template=launch_template,
+        num_instances=3,
+        instance_type="t2.micro",
+        ec2_client=ec2_client_stub,
+        delay=0,
+    )
+    assert len(instance_ids) == 1
+    assert attempts[-1]["MaxCount"] == 2
+
+
+def test_launch_instances_chunks(ec2_client_stub):
+    """Testing that launch_instances spreads large launches over the subnets in chunks."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    assert plan_launch_chunks(num_instances=7, subnet_ids=["a", "b"], chunk_size=3) == [
+        ("a", 3),
+        ("a", 1),
+        ("b", 3),
+    ]
+    assert plan_launch_chunks(
+        num_instances=7,
+        subnet_ids=["a", "b", "c"],
+        chunk_size=3,
+        free_ip_counts={"a": 10, "b": 5, "c": 1},
+    ) == [("a", 3), ("a", 1), ("b", 2), ("c", 1)]
+    assert plan_launch_chunks(
+        num_instances=4, subnet_ids=["a", "b"], free_ip_counts={"a": 2, "b": 1}
+    ) == [("a", 3), ("b", 1)]
+    launch_template = create_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    instance_ids = launch_instances(
+        launch_template={"LaunchTemplateName": launch_template["launch_template_name"]},
+        num_instances=9,
+        instance_type="t2.micro",
+        ec2_client=ec2_client_stub,
+        chunk_size=2,
+    )
+    assert len(instance_ids) == 9
+    reservations = ec2_client_stub.describe_instances(InstanceIds=instance_ids)[
+        "Reservations"
+    ]
+    subnet_ids = {
+        instance["SubnetId"]
+        for reservation in reservations
+        for instance in reservation["Instances"]
+    }
+    assert len(subnet_ids) > 1
+
+
+def test_launch_instances_every_subnet_short(ec2_client_stub, monkeypatch):
+    """Testing that launch_instances gets the capacity left when every subnet falls short of its chunks."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    launch_template = create_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    run_instances = ec2_client_stub.run_instances
+    subnet_capacities = {}
+    capacity_lock = threading.Lock()
+
+    def limited_capacity_run_instances(**kwargs):
+        subnet_id = kwargs.get("NetworkInterfaces", [{}])[0].get(
+            "SubnetId", launch_template["subnet_id"]
+        )
+        with capacity_lock:
+            capacity = subnet_capacities.setdefault(subnet_id, 2)
+            if kwargs["MinCount"] > capacity:
+                raise ClientError(
+                    {"Error": {"Code": "InsufficientInstanceCapacity"}}, "RunInstances"
+                )
+            num_instances = min(kwargs["MaxCount"], capacity)
+            subnet_capacities[subnet_id] -= num_instances
+        return run_instances(**dict(kwargs, MinCount=num_instances))
+
+    monkeypatch.setattr(
+        ec2_client_stub, "run_instances", limited_capacity_run_instances
+    )
+    num_subnets = len(
+        get_vpc_subnets(vpc_id=launch_template["vpc_id"], ec2_client=ec2_client_stub)
+    )
+    instance_ids = launch_instances(
+        launch_template={"LaunchTemplateName": launch_template["launch_template_name"]},
+        num_instances=3 * num_subnets,
+        instance_type="t2.micro",
+        ec2_client=ec2_client_stub,
+        chunk_size=3,
+        delay=0,
+    )
+    assert len(instance_ids) == 2 * num_subnets
+    assert set(subnet_capacities.values()) == {0}
+
+    subnet_capacities.clear()
+    instance_ids = launch_instances(
+        launch_template={"LaunchTemplateName": launch_template["launch_template_name"]},
+        num_instances=3,
+        instance_type="t2.micro",
+        ec2_client=ec2_client_stub,
+        delay=0,
+    )
+    assert len(instance_ids) == 3
+
+
+def test_launch_fleet(ec2_client_stub):
+    """Testing the launch_fleet method."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    launch_template = create_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    launch_template = {"LaunchTemplateName": launch_template["launch_template_name"]}
+    fleet_request = build_fleet_request(
+        launch_template=launch_template,
+        num_instances=5,
+        instance_types=["t2.micro", "t3.micro"],
+        subnet_ids=["subnet-a", "subnet-b", "subnet-c"],
+        spot_percentage=40,
+    )
+    assert len(fleet_request["LaunchTemplateConfigs"][0]["Overrides"]) == 6
+    assert fleet_request["TargetCapacitySpecification"]["SpotTargetCapacity"] == 2
+    assert fleet_request["TargetCapacitySpecification"]["OnDemandTargetCapacity"] == 3
+
+    instance_ids = launch_fleet(
+        launch_template=launch_template,
+        num_instances=4,
+        instance_types=["t2.micro", "t3.micro"],
+        ec2_client=ec2_client_stub,
+        spot_percentage=100,
+    )
+    assert len(instance_ids) == 4
+
+
+def test_wait_for_instances(ec2_client_stub):
+    """Testing the wait_for_instances method."""
+    image_id = ec2_client_stub.describe_images(Owners=["amazon"])["Images"][0][
+        "ImageId"
+    ]
+    run_instances_response = ec2_client_stub.run_instances(
+        ImageId=image_id, MinCount=3, MaxCount=3
+    )
+    instance_ids = [
+        instance["InstanceId"] for instance in run_instances_response["Instances"]
+    ]
+    describe_calls = []
+    transitions = []
+
+    def on_before_call(**kwargs):
+        describe_calls.append(kwargs)
+
+    ec2_client_stub.meta.events.register(
+        "before-call.ec2.DescribeInstances", on_before_call
+    )
+    try:
+        instance_states = wait_for_instances(
+            instance_ids=instance_ids,
+            ec2_client=ec2_client_stub,
+            on_transition=lambda *transition: transitions.append(transition),
+            batch_size=2,
+        )
+    finally:
+        ec2_client_stub.meta.events.unregister(
+            "before-call.ec2.DescribeInstances", on_before_call
+        )
+    assert instance_states == dict.fromkeys(instance_ids, "running")
+    assert len(describe_calls) == 2
+    assert sorted(transitions) == sorted(
+        (instance_id, None, "running") for instance_id in instance_ids
+    )
 
 
 def test_create_ssm_instance_profile(iam_client_stub):
@@ -168,3 +738,155 @@ def test_create_ssm_instance_profile(iam_client_stub):
     instance_profile = create_ssm_instance_profile(iam_client=iam_client_stub)
     assert isinstance(instance_profile, str)
     assert instance_profile == SSM_ROLE_NAME
+
+
+def test_create_ssm_instance_profile_reconcile(iam_client_stub, sts_client_stub):
+    """Testing that create_ssm_instance_profile repairs a partial setup and then skips IAM."""
+    iam_client_stub.create_role(
+        RoleName=SSM_ROLE_NAME,
+        AssumeRolePolicyDocument=json.dumps(EC2_TRUST_RELATIONSHIP),
+    )
+    iam_calls = []
+
+    def on_before_call(model, **kwargs):
+        iam_calls.append(model.name)
+
+    iam_client_stub.meta.events.register("before-call.iam", on_before_call)
+    try:
+        create_ssm_instance_profile(
+            iam_client=iam_client_stub, sts_client=sts_client_stub
+        )
+        assert "CreateRole" not in iam_calls
+        assert {
+            "AttachRolePolicy",
+            "CreateInstanceProfile",
+            "AddRoleToInstanceProfile",
+        } <= set(iam_calls)
+        instance_profile = iam_client_stub.get_instance_profile(
+            InstanceProfileName=SSM_ROLE_NAME
+        )["InstanceProfile"]
+        assert [role["RoleName"] for role in instance_profile["Roles"]] == [
+            SSM_ROLE_NAME
+        ]
+
+        iam_calls.clear()
+        create_ssm_instance_profile(
+            iam_client=iam_client_stub, sts_client=sts_client_stub
+        )
+        assert iam_calls == []
+    finally:
+        iam_client_stub.meta.events.unregister("before-call.iam", on_before_call)
+
+
+def test_create_launch_template_concurrent_discovery(ec2_client_stub, monkeypatch):
+    """Testing that create_launch_template runs the independent lookups concurrently."""
+    default_vpc_id = get_default_vpc_id(ec2_client=ec2_client_stub)
+    subnet_id = get_subnet_id(vpc_id=default_vpc_id, ec2_client=ec2_client_stub)
+    security_group = create_security_group(
+        vpc_id=default_vpc_id, os_type="Linux", ec2_client=ec2_client_stub
+    )
+    calls = []
+
+    def slow_lookup(name, result, delay=0.3):
+        def lookup(**kwargs):
+            calls.append(name)
+            time.sleep(delay)
+            calls.append(f"{name} resolved")
+            return result
+
+        return lookup
+
+    monkeypatch.setattr(
+        api, "get_latest_ami_id", slow_lookup("ami", "ami-000c540e28953ace2")
+    )
+    monkeypatch.setattr(api, "get_ip_address", slow_lookup("ip", "192.168.1.1"))
+    monkeypatch.setattr(
+        api, "get_default_vpc_id", slow_lookup("vpc", default_vpc_id, delay=0.1)
+    )
+    monkeypatch.setattr(api, "get_subnet_id", slow_lookup("subnet", subnet_id))
+
+    def slow_security_group(resolve_ip_address, **kwargs):
+        calls.append("sg")
+        time.sleep(0.1)
+        calls.append(f"authorize {resolve_ip_address()}")
+        return security_group
+
+    monkeypatch.setattr(api, "create_security_group", slow_security_group)
+
+    start = time.monotonic()
+    create_launch_template(os_type="Linux", ec2_client=ec2_client_stub)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 1.0
+    assert calls.index("vpc") < calls.index("subnet")
+    assert calls.index("vpc") < calls.index("sg")
+    assert calls.index("sg") < calls.index("ip resolved")
+    assert calls.index("ip resolved") < calls.index("authorize 192.168.1.1")
+    launch_template = get_latest_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    assert launch_template["LaunchTemplateName"] == get_launch_template_name(
+        os_type="Linux"
+    )
+
+
+def test_run_in_regions():
+    """Testing that run_in_regions isolates the failure of a single region."""
+
+    def pipeline(region):
+        if region == "eu-west-1":
+            raise SecureEC2Error("Error getting AMI")
+        return region.upper()
+
+    region_results = run_in_regions(
+        regions=["us-east-1", "eu-west-1", "us-west-2"], pipeline=pipeline
+    )
+    assert list(region_results) == ["us-east-1", "eu-west-1", "us-west-2"]
+    assert region_results["us-east-1"] == {
+        "succeeded": True,
+        "result": "US-EAST-1",
+        "error": None,
+    }
+    assert region_results["eu-west-1"] == {
+        "succeeded": False,
+        "result": None,
+        "error": "Error getting AMI",
+    }
+    assert region_results["us-west-2"]["succeeded"]
+
+
+def test_run_in_regions_without_default_vpc(ec2_client_stub):
+    """Testing that run_in_regions reports a region whose default VPC was deleted."""
+    ec2_client = get_boto3_client(service="ec2", region="us-west-2")
+    default_vpc_id = get_default_vpc_id(ec2_client=ec2_client)
+    for subnet in get_vpc_subnets(vpc_id=default_vpc_id, ec2_client=ec2_client):
+        ec2_client.delete_subnet(SubnetId=subnet["SubnetId"])
+    ec2_client.delete_vpc(VpcId=default_vpc_id)
+    with pytest.raises(NetworkError):
+        get_default_vpc_id(ec2_client=ec2_client)
+
+    def pipeline(region):
+        if region == "eu-west-1":
+            raise KeyError("Vpcs")
+        return get_default_vpc_id(
+            ec2_client=get_boto3_client(service="ec2", region=region)
+        )
+
+    region_results = run_in_regions(
+        regions=["us-east-1", "us-west-2", "eu-west-1"], pipeline=pipeline
+    )
+    assert region_results["us-east-1"] == {
+        "succeeded": True,
+        "result": get_default_vpc_id(ec2_client=ec2_client_stub),
+        "error": None,
+    }
+    assert region_results["us-west-2"] == {
+        "succeeded": False,
+        "result": None,
+        "error": "No default VPC in the region, create one to launch instances",
+    }
+    assert region_results["eu-west-1"] == {
+        "succeeded": False,
+        "result": None,
+        "error": "Unexpected error: KeyError('Vpcs')",
+    }
@@ -0,0 +1,142 @@
+"""Tests definition for the asyncio API methods that secure_ec2 use."""
+
+import asyncio
+import threading
+
+from secure_ec2.src import api, cache
+from secure_ec2.src.api import get_latest_launch_template
+from secure_ec2.src.async_api import (
+    create_launch_template,
+    launch_instances,
+    provision_instances,
+    wait_for_instances,
+)
+from secure_ec2.src.helpers import get_launch_template_name
+
+
+def test_create_launch_template(ec2_client_stub, ssm_client_stub):
+    """Testing the asynchronous create_launch_template method."""
+    asyncio.run(
+        create_launch_template(
+            os_type="Linux", ec2_client=ec2_client_stub, ssm_client=ssm_client_stub
+        )
+    )
+    launch_template = get_latest_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    assert launch_template["LaunchTemplateName"] == get_launch_template_name(
+        os_type="Linux"
+    )
+
+
+def test_provision_instances(
+    ec2_client_stub, ssm_client_stub, iam_client_stub, sts_client_stub
+):
+    """Testing the asynchronous provision_instances method with Session Manager access."""
+    asyncio.run(
+        create_launch_template(
+            os_type="Linux", ec2_client=ec2_client_stub, ssm_client=ssm_client_stub
+        )
+    )
+    provisioning = asyncio.run(
+        provision_instances(
+            os_type="Linux",
+            num_instances=2,
+            keypair="None",
+            instance_type="t2.micro",
+            ec2_client=ec2_client_stub,
+            iam_client=iam_client_stub,
+            sts_client=sts_client_stub,
+        )
+    )
+    assert len(provisioning["instance_ids"]) == 2
+    assert set(provisioning["instance_states"].values()) == {"running"}
+    associations = ec2_client_stub.describe_iam_instance_profile_associations()[
+        "IamInstanceProfileAssociations"
+    ]
+    assert sorted(association["InstanceId"] for association in associations) == sorted(
+        provisioning["instance_ids"]
+    )
+
+
+def test_provision_instances_without_thread_pools(
+    ec2_client_stub, ssm_client_stub, iam_client_stub, sts_client_stub, monkeypatch
+):
+    """Testing that the asynchronous launch runs on the shared executor only, cache files included."""
+    asyncio.run(
+        create_launch_template(
+            os_type="Linux", ec2_client=ec2_client_stub, ssm_client=ssm_client_stub
+        )
+    )
+
+    def forbidden_thread_pool(*args, **kwargs):
+        raise AssertionError("The asynchronous launch created a thread pool")
+
+    load_cache = cache.load_cache
+    cache_load_threads = []
+
+    def recording_load_cache(name):
+        cache_load_threads.append(threading.current_thread())
+        return load_cache(name)
+
+    monkeypatch.setattr(api, "ThreadPoolExecutor", forbidden_thread_pool)
+    monkeypatch.setattr(cache, "load_cache", recording_load_cache)
+    provisioning = asyncio.run(
+        provision_instances(
+            os_type="Linux",
+            num_instances=2,
+            keypair="None",
+            instance_type="t2.micro",
+            ec2_client=ec2_client_stub,
+            iam_client=iam_client_stub,
+            sts_client=sts_client_stub,
+        )
+    )
+    assert set(provisioning["instance_states"].values()) == {"running"}
+    assert cache_load_threads
+    assert threading.main_thread() not in cache_load_threads
+
+    launch_template = get_latest_launch_template(
+        os_type="Linux", ec2_client=ec2_client_stub
+    )
+    instance_ids = asyncio.run(
+        launch_instances(
+            launch_template=launch_template,
+            num_instances=6,
+            instance_type="t2.micro",
+            ec2_client=ec2_client_stub,
+            chunk_size=2,
+        )
+    )
+    assert len(instance_ids) == 6
+
+
+def test_wait_for_instances_concurrently(ec2_client_stub):
+    """Testing that many asynchronous waits share one event loop."""
+    image_id = ec2_client_stub.describe_images(Owners=["amazon"])["Images"][0][
+        "ImageId"
+    ]
+    launches = [
+        [
+            instance["InstanceId"]
+            for instance in ec2_client_stub.run_instances(
+                ImageId=image_id, MinCount=2, MaxCount=2
+            )["Instances"]
+        ]
+        for _ in range(20)
+    ]
+
+    async def wait_for_all_launches() -> list:
+        return await asyncio.gather(
+            *(
+                wait_for_instances(
+                    instance_ids=instance_ids, ec2_client=ec2_client_stub
+                )
+                for instance_ids in launches
+            )
+        )
+
+    for instance_ids, instance_states in zip(
+        launches, asyncio.run(wait_for_all_launches())
+    ):
+        assert instance_states == dict.fromkeys(instance_ids, "running")
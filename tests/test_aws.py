@@ -1,12 +1,22 @@
 """Tests definition for the AWS methods that secure_ec2 use."""
 
+import botocore
+
 from secure_ec2.src.aws import (
+    clear_boto3_pool,
+    get_account_id,
     get_available_regions,
     get_boto3_client,
     get_boto3_resource,
+    get_boto3_session,
+    get_client_account_id,
     get_current_account_id,
     get_region_from_boto3_client,
+    get_service_regions,
+    resolve_regions,
 )
+from secure_ec2.src.cache import load_cache, save_cache
+from secure_ec2.src.constants import REGIONS_CACHE_NAME
 
 
 def test_get_ec2_client():
@@ -27,18 +37,112 @@ def test_get_ec2_resource():
     assert isinstance(ec2_client, object)
 
 
+def test_get_boto3_client_pooled():
+    """Testing that get_boto3_client hands out cached clients sharing one session per profile."""
+    ec2_client = get_boto3_client(service="ec2")
+    assert get_boto3_client(service="ec2") is ec2_client
+    assert get_boto3_client(service="ec2", region="eu-west-1") is not ec2_client
+    assert get_boto3_session() is get_boto3_session()
+
+
+def test_get_boto3_client_pool_size():
+    """Testing that a cached client is rebuilt when a bigger connection pool is requested."""
+    ec2_client = get_boto3_client(service="ec2")
+    bigger_client = get_boto3_client(service="ec2", max_pool_connections=50)
+    assert bigger_client is not ec2_client
+    assert bigger_client.meta.config.max_pool_connections == 50
+    assert get_boto3_client(service="ec2") is bigger_client
+
+
+def test_clear_boto3_pool():
+    """Testing the clear_boto3_pool method."""
+    session = get_boto3_session()
+    clear_boto3_pool()
+    assert get_boto3_session() is not session
+
+
 def test_get_available_regions():
     """Testing the get_available_regions method."""
     available_regions = get_available_regions(service="ec2")
     assert isinstance(available_regions, list)
 
 
+def test_get_service_regions_cached():
+    """Testing that get_service_regions persists the region metadata on disk."""
+    clear_boto3_pool()
+    service_regions = get_service_regions(service="ec2")
+    assert service_regions["regional"] is True
+    assert "us-east-1" in service_regions["regions"]
+    regions_cache = load_cache(REGIONS_CACHE_NAME)
+    assert regions_cache["botocore_version"] == botocore.__version__
+    assert regions_cache["services"]["ec2"] == service_regions
+
+
+def test_get_service_regions_invalidated():
+    """Testing that region metadata cached by another botocore version is rebuilt."""
+    clear_boto3_pool()
+    save_cache(
+        REGIONS_CACHE_NAME,
+        {
+            "botocore_version": "0.0.0",
+            "services": {"ec2": {"regions": ["stale-1"], "regional": True}},
+        },
+    )
+    assert "stale-1" not in get_service_regions(service="ec2")["regions"]
+    assert load_cache(REGIONS_CACHE_NAME)["botocore_version"] == botocore.__version__
+
+
+def test_resolve_regions(ec2_client_stub):
+    """Testing the resolve_regions method."""
+    regions = resolve_regions(
+        regions="us-east-1, eu-west-1,us-east-1", ec2_client=ec2_client_stub
+    )
+    assert regions == ["us-east-1", "eu-west-1"]
+    all_regions = resolve_regions(regions="all", ec2_client=ec2_client_stub)
+    assert "us-east-1" in all_regions
+    assert all_regions == sorted(all_regions)
+
+
 def test_get_current_account_id(sts_client_stub):
     """Testing the get_current_account_id method."""
     current_account_id = get_current_account_id(sts_client=sts_client_stub)
     assert isinstance(current_account_id, str)
 
 
+def test_get_account_id(sts_client_stub):
+    """Testing that the get_account_id method only calls STS for new credentials."""
+    sts_calls = []
+
+    def on_before_call(model, **kwargs):
+        sts_calls.append(model.name)
+
+    sts_client_stub.meta.events.register("before-call.sts", on_before_call)
+    try:
+        account_id = get_account_id()
+        assert get_account_id() == account_id
+    finally:
+        sts_client_stub.meta.events.unregister("before-call.sts", on_before_call)
+    assert account_id == get_current_account_id(sts_client=sts_client_stub)
+    assert sts_calls == ["GetCallerIdentity"]
+
+
+def test_get_client_account_id(sts_client_stub):
+    """Testing the get_client_account_id method."""
+    sts_calls = []
+
+    def on_before_call(model, **kwargs):
+        sts_calls.append(model.name)
+
+    sts_client_stub.meta.events.register("before-call.sts", on_before_call)
+    try:
+        account_id = get_client_account_id(boto3_client=sts_client_stub)
+        assert get_client_account_id(boto3_client=sts_client_stub) == account_id
+    finally:
+        sts_client_stub.meta.events.unregister("before-call.sts", on_before_call)
+    assert account_id == get_account_id()
+    assert sts_calls == ["GetCallerIdentity"]
+
+
 def test_get_region_from_boto3_client(ec2_client_stub):
     """Testing the get_region_from_boto3_client method."""
     current_region = get_region_from_boto3_client(boto3_client=ec2_client_stub)
@@ -0,0 +1,262 @@
+"""Benchmarks of the secure_ec2 API methods against large synthetic moto data sets.
+
+The pipelines are measured at several scales for wall time, AWS API calls and peak memory, and
+compared with the baselines stored in benchmark_baselines.json. The small scales always run, the
+large ones only when SECURE_EC2_BENCHMARKS is set. The wall time and peak memory depend on the
+machine that recorded the baselines, so they are only compared when SECURE_EC2_BENCHMARKS is set,
+the AWS API calls always are. Set SECURE_EC2_BENCHMARKS_UPDATE to record new baselines instead of
+comparing, and SECURE_EC2_BENCHMARKS_THRESHOLD to change the tolerated regression of wall time and
+peak memory.
+"""
+
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from moto.core import DEFAULT_ACCOUNT_ID
+from moto.ec2.models import ec2_backends
+from moto.ec2.models.amis import Ami
+from moto.ec2.utils import random_ami_id
+
+from secure_ec2.src.api import (
+    create_launch_template,
+    get_default_vpc_id,
+    get_key_pairs,
+    get_latest_ami_id,
+    get_latest_launch_template,
+    provision_ec2_instance,
+)
+from secure_ec2.src.constants import AMAZON_AMI_OWNER_ID
+from secure_ec2.src.tracing import CallTracer
+
+LATEST_AMI_BENCHMARK_IMAGES = 2000
+LATEST_AMI_BUDGET_SECONDS = 10
+BASELINES_PATH = Path(__file__).parent / "benchmark_baselines.json"
+BENCHMARKS_ENV_VAR = "SECURE_EC2_BENCHMARKS"
+BENCHMARKS_UPDATE_ENV_VAR = "SECURE_EC2_BENCHMARKS_UPDATE"
+BENCHMARKS_THRESHOLD_ENV_VAR = "SECURE_EC2_BENCHMARKS_THRESHOLD"
+DEFAULT_REGRESSION_THRESHOLD = 1.0
+WALL_TIME_SLACK_SECONDS = 1.0
+PEAK_MEMORY_SLACK_BYTES = 4 * 1024 * 1024
+
+large_scale = pytest.mark.skipif(
+    not os.environ.get(BENCHMARKS_ENV_VAR),
+    reason=f"large scale benchmarks only run when {BENCHMARKS_ENV_VAR} is set",
+)
+
+
+def create_synthetic_images(
+    num_images: int, name_prefix: str, region: str = "us-east-1"
+) -> str:
+    """Register synthetic Amazon owned images in the moto backend and return the newest image ID."""
+    ec2_backend = ec2_backends[DEFAULT_ACCOUNT_ID][region]
+    first_creation_date = datetime(2020, 1, 1)
+    latest_image_id = None
+    # Register the newest image in the middle so the scan cannot rely on the ordering
+    for index in range(num_images):
+        age = abs(num_images // 2 - index)
+        ami_id = random_ami_id()
+        ec2_backend.amis[ami_id] = Ami(
+            ec2_backend,
+            ami_id,
+            name=f"{name_prefix}{index}",
+            owner_id=AMAZON_AMI_OWNER_ID,
+            architecture="x86_64",
+            virtualization_type="hvm",
+            root_device_type="ebs",
+            creation_date=(first_creation_date - timedelta(hours=age)).strftime(
+                "%Y-%m-%dT%H:%M:%S.000Z"
+            ),
+        )
+        if age == 0:
+            latest_image_id = ami_id
+    return latest_image_id
+
+
+def test_get_latest_ami_id_benchmark(ec2_client_stub):
+    """Benchmark get_latest_ami_id over a large set of matching images."""
+    latest_image_id = create_synthetic_images(
+        num_images=LATEST_AMI_BENCHMARK_IMAGES, name_prefix="amzn2-ami-hvm-2.0."
+    )
+
+    tracemalloc.start()
+    start = time.monotonic()
+    image_id = get_latest_ami_id(os_type="Linux", ec2_client=ec2_client_stub)
+    elapsed = time.monotonic() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"get_latest_ami_id over {LATEST_AMI_BENCHMARK_IMAGES} images: "
+        f"{elapsed:.3f}s, peak memory {peak_memory / 1024 / 1024:.1f} MiB"
+    )
+    assert image_id == latest_image_id
+    assert elapsed < LATEST_AMI_BUDGET_SECONDS
+
+
+def create_synthetic_subnets(
+    num_subnets: int, ec2_client, region: str = "us-east-1"
+) -> list:
+    """Add /28 subnets to the default VPC in the moto backend, after the default /20 subnets."""
+    ec2_backend = ec2_backends[DEFAULT_ACCOUNT_ID][region]
+    vpc_id = get_default_vpc_id(ec2_client=ec2_client)
+    return [
+        ec2_backend.create_subnet(
+            vpc_id=vpc_id,
+            cidr_block=f"172.31.{96 + index // 16}.{index % 16 * 16}/28",
+        ).id
+        for index in range(num_subnets)
+    ]
+
+
+def create_synthetic_key_pairs(num_key_pairs: int, region: str = "us-east-1"):
+    """Create key pairs in the moto backend."""
+    ec2_backend = ec2_backends[DEFAULT_ACCOUNT_ID][region]
+    for index in range(num_key_pairs):
+        ec2_backend.create_key_pair(f"benchmark-kp-{index}", key_type="rsa", tags={})
+
+
+def measure(benchmark: Callable) -> dict:
+    """Run a benchmark once, measuring its wall time, AWS API calls and peak memory."""
+    tracemalloc.start()
+    start = time.monotonic()
+    with CallTracer() as tracer:
+        benchmark()
+    wall_time = time.monotonic() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_time": wall_time,
+        "peak_memory": peak_memory,
+        "calls": tracer.count_calls(),
+    }
+
+
+def check_baseline(name: str, measurement: dict):
+    """Compare a measurement with its stored baseline, or record it as the new baseline.
+
+    The AWS API calls must not exceed the baseline. When SECURE_EC2_BENCHMARKS is set, the wall time
+    and peak memory may exceed it by the regression threshold.
+    """
+    print(
+        f"{name}: {measurement['wall_time']:.3f}s, "
+        f"peak memory {measurement['peak_memory'] / 1024 / 1024:.1f} MiB, "
+        f"{sum(measurement['calls'].values())} AWS API calls"
+    )
+    baselines = (
+        json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    )
+    if os.environ.get(BENCHMARKS_UPDATE_ENV_VAR):
+        baselines[name] = measurement
+        BASELINES_PATH.write_text(
+            json.dumps(baselines, indent=2, sort_keys=True) + "\n"
+        )
+        return
+    baseline = baselines.get(name)
+    if baseline is None:
+        pytest.skip(f"no baseline recorded for {name}")
+    threshold = float(
+        os.environ.get(BENCHMARKS_THRESHOLD_ENV_VAR, DEFAULT_REGRESSION_THRESHOLD)
+    )
+    for operation, calls in measurement["calls"].items():
+        assert calls <= baseline["calls"].get(operation, 0), (
+            f"{name} made {calls} {operation} calls, "
+            f"baseline {baseline['calls'].get(operation, 0)}"
+        )
+    if not os.environ.get(BENCHMARKS_ENV_VAR):
+        return
+    assert (
+        measurement["wall_time"]
+        <= baseline["wall_time"] * (1 + threshold) + WALL_TIME_SLACK_SECONDS
+    )
+    assert (
+        measurement["peak_memory"]
+        <= baseline["peak_memory"] * (1 + threshold) + PEAK_MEMORY_SLACK_BYTES
+    )
+
+
+def benchmark_create_launch_template(num_images: int, num_subnets: int, ec2_client):
+    """Benchmark create_launch_template with the images scanned and many subnets."""
+    create_synthetic_images(num_images=num_images, name_prefix="amzn2-ami-hvm-2.0.")
+    create_synthetic_subnets(num_subnets=num_subnets, ec2_client=ec2_client)
+    check_baseline(
+        f"create_launch_template[{num_images} images, {num_subnets} subnets]",
+        measure(lambda: create_launch_template(os_type="Linux", ec2_client=ec2_client)),
+    )
+
+
+def benchmark_provision_ec2_instance(
+    num_instances: int, keypair: str, ec2_client, iam_client, sts_client
+):
+    """Benchmark get_latest_launch_template and provision_ec2_instance."""
+    create_synthetic_key_pairs(num_key_pairs=100)
+    create_launch_template(os_type="Linux", ec2_client=ec2_client)
+    check_baseline(
+        "get_key_pairs[100 key pairs]",
+        measure(lambda: get_key_pairs(ec2_client=ec2_client)),
+    )
+
+    def launch():
+        provision_ec2_instance(
+            launch_template=get_latest_launch_template(
+                os_type="Linux", ec2_client=ec2_client
+            ),
+            num_instances=num_instances,
+            keypair=keypair,
+            instance_type="t2.micro",
+            ec2_client=ec2_client,
+            iam_client=iam_client,
+            sts_client=sts_client,
+        )
+
+    access = "ssm" if keypair == "None" else "keypair"
+    check_baseline(
+        f"provision_ec2_instance[{num_instances} instances, {access}]", measure(launch)
+    )
+
+
+@pytest.mark.parametrize(
+    "num_images, num_subnets",
+    [
+        (10, 1),
+        pytest.param(1000, 100, marks=large_scale),
+        pytest.param(5000, 500, marks=large_scale),
+    ],
+)
+def test_create_launch_template_benchmark(num_images, num_subnets, ec2_client_stub):
+    """Benchmark the configuration pipeline at several scales."""
+    benchmark_create_launch_template(
+        num_images=num_images, num_subnets=num_subnets, ec2_client=ec2_client_stub
+    )
+
+
+@pytest.mark.parametrize(
+    "num_instances, keypair",
+    [
+        (1, "None"),
+        (1, "benchmark-kp-0"),
+        pytest.param(50, "None", marks=large_scale),
+        pytest.param(500, "benchmark-kp-0", marks=large_scale),
+    ],
+)
+def test_provision_ec2_instance_benchmark(
+    num_instances, keypair, ec2_client_stub, iam_client_stub, sts_client_stub
+):
+    """Benchmark the launch pipeline at several scales."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-benchmark",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    benchmark_provision_ec2_instance(
+        num_instances=num_instances,
+        keypair=keypair,
+        ec2_client=ec2_client_stub,
+        iam_client=iam_client_stub,
+        sts_client=sts_client_stub,
+    )
@@ -0,0 +1,37 @@
+"""Tests definition for the cache methods that secure_ec2 use."""
+
+from secure_ec2.src.cache import (
+    delete_cache_entry,
+    get_cache_entry,
+    get_cache_path,
+    load_cache,
+    save_cache,
+    set_cache_entry,
+)
+
+
+def test_save_and_load_cache(cache_dir):
+    """Testing the save_cache and load_cache methods."""
+    save_cache("demo", {"key": "value"})
+    assert get_cache_path("demo").parent == cache_dir
+    assert load_cache("demo") == {"key": "value"}
+
+
+def test_load_missing_cache():
+    """Testing the load_cache method when the cache file does not exist."""
+    assert load_cache("missing") == {}
+
+
+def test_load_corrupted_cache():
+    """Testing the load_cache method when the cache file is corrupted."""
+    save_cache("corrupted", {})
+    get_cache_path("corrupted").write_text("{not json")
+    assert load_cache("corrupted") == {}
+
+
+def test_delete_cache_entry():
+    """Testing the delete_cache_entry method."""
+    set_cache_entry("demo", "key", {"value": 1})
+    assert get_cache_entry("demo", "key", ttl=60)["value"] == 1
+    delete_cache_entry("demo", "key")
+    assert get_cache_entry("demo", "key", ttl=60) is None
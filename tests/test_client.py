@@ -0,0 +1,154 @@
+"""Tests definition for the SecureEC2 client that secure_ec2 expose."""
+
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from secure_ec2.src.cache import load_cache
+from secure_ec2.src.client import ConfigureResult, LaunchResult, SecureEC2
+from secure_ec2.src.constants import LAUNCH_CHUNK_SIZE, SUBNET_INDEX_CACHE_NAME
+from secure_ec2.src.exceptions import LaunchTemplateError, SecureEC2Error
+from secure_ec2.src.helpers import get_launch_template_name
+
+
+def test_configure_and_launch(ec2_client_stub, capsys):
+    """Testing the configure and launch methods of the SecureEC2 client."""
+    client = SecureEC2(region="us-east-1")
+    configure_result = client.configure(os_type="Linux")
+    assert isinstance(configure_result, ConfigureResult)
+    assert configure_result.launch_template_name == get_launch_template_name(
+        os_type="Linux"
+    )
+    assert configure_result.launch_template_version == 1
+
+    transitions = []
+    launch_result = client.launch(
+        os_type="Linux",
+        num_instances=2,
+        on_transition=lambda *transition: transitions.append(transition),
+    )
+    assert isinstance(launch_result, LaunchResult)
+    assert len(launch_result.instance_ids) == 2
+    assert sorted(launch_result.connect_urls) == sorted(launch_result.instance_ids)
+    assert len(transitions) == 2
+    assert capsys.readouterr().out == ""
+
+
+def test_configure_deleted_subnet(ec2_client_stub, monkeypatch):
+    """Testing that configure replaces a subnet deleted since the previous configuration."""
+    client = SecureEC2(region="us-east-1")
+    configure_result = client.configure(os_type="Linux")
+    ec2_client_stub.delete_subnet(SubnetId=configure_result.subnet_id)
+    # moto does not implement ModifyLaunchTemplate
+    monkeypatch.setattr(ec2_client_stub, "modify_launch_template", lambda **kwargs: {})
+
+    reconfigure_result = client.configure(os_type="Linux")
+    assert reconfigure_result.vpc_id == configure_result.vpc_id
+    assert reconfigure_result.subnet_id != configure_result.subnet_id
+    assert reconfigure_result.launch_template_version == 2
+    assert (
+        client.get_resource_state(os_type="Linux")["subnet_id"]
+        == reconfigure_result.subnet_id
+    )
+    launch_template_version = ec2_client_stub.describe_launch_template_versions(
+        LaunchTemplateId=reconfigure_result.launch_template_id, Versions=["2"]
+    )["LaunchTemplateVersions"][0]
+    assert (
+        launch_template_version["LaunchTemplateData"]["NetworkInterfaces"][0][
+            "SubnetId"
+        ]
+        == reconfigure_result.subnet_id
+    )
+
+
+def test_launch_without_launch_template():
+    """Testing that the SecureEC2 client raises typed errors instead of exiting."""
+    with pytest.raises(LaunchTemplateError) as error:
+        SecureEC2(region="us-east-1").launch(os_type="Windows")
+    assert isinstance(error.value, SecureEC2Error)
+
+
+def test_launch_warm_path(ec2_client_stub, monkeypatch):
+    """Testing that launch goes straight to RunInstances with the configured launch template."""
+    client = SecureEC2(region="us-east-1")
+    configure_result = client.configure(os_type="Linux")
+    # The first launch caches the instance types that launches are validated against
+    client.launch(os_type="Linux", keypair="demo-kp")
+    ec2_calls = []
+
+    def on_before_call(model, params, **kwargs):
+        ec2_calls.append((model.name, params))
+
+    ec2_client = client.get_client("ec2")
+    ec2_client.meta.events.register("before-call.ec2", on_before_call)
+    try:
+        client.launch(os_type="Linux", keypair="demo-kp")
+    finally:
+        ec2_client.meta.events.unregister("before-call.ec2", on_before_call)
+    run_instances_name, run_instances_params = ec2_calls[0]
+    assert run_instances_name == "RunInstances"
+    assert (
+        run_instances_params["body"]["LaunchTemplate.LaunchTemplateId"]
+        == configure_result.launch_template_id
+    )
+    assert run_instances_params["body"]["LaunchTemplate.Version"] == "1"
+    assert "DescribeLaunchTemplates" not in [name for name, _ in ec2_calls]
+
+
+def test_launch_stale_resource_state(ec2_client_stub, monkeypatch):
+    """Testing that launch refreshes a launch template that is gone from the local state."""
+    client = SecureEC2(region="us-east-1")
+    client.configure(os_type="Linux")
+    ec2_client = client.get_client("ec2")
+    run_instances = ec2_client.run_instances
+    run_instances_calls = []
+
+    def stale_run_instances(**kwargs):
+        run_instances_calls.append(kwargs)
+        if len(run_instances_calls) == 1:
+            raise ClientError(
+                {"Error": {"Code": "InvalidLaunchTemplateId.NotFound"}},
+                "RunInstances",
+            )
+        return run_instances(**kwargs)
+
+    assert load_cache(SUBNET_INDEX_CACHE_NAME)
+    monkeypatch.setattr(ec2_client, "run_instances", stale_run_instances)
+    launch_result = client.launch(os_type="Linux", keypair="demo-kp")
+    assert len(launch_result.instance_ids) == 1
+    assert len(run_instances_calls) == 2
+    assert client.get_resource_state(os_type="Linux") is None
+    assert not load_cache(SUBNET_INDEX_CACHE_NAME)
+
+
+def test_launch_stale_subnet_partial(ec2_client_stub, monkeypatch):
+    """Testing that launch keeps a partial launch instead of launching the instances again."""
+    client = SecureEC2(region="us-east-1")
+    client.configure(os_type="Linux")
+    ec2_client = client.get_client("ec2")
+    run_instances = ec2_client.run_instances
+    run_instances_calls = []
+    run_instances_lock = threading.Lock()
+
+    def stale_subnet_run_instances(**kwargs):
+        with run_instances_lock:
+            run_instances_calls.append(kwargs)
+            call_number = len(run_instances_calls)
+        if call_number == 3:
+            raise ClientError(
+                {"Error": {"Code": "InvalidSubnetID.NotFound"}}, "RunInstances"
+            )
+        return run_instances(**kwargs)
+
+    monkeypatch.setattr(ec2_client, "run_instances", stale_subnet_run_instances)
+    launch_result = client.launch(
+        os_type="Linux", num_instances=LAUNCH_CHUNK_SIZE + 50, keypair="demo-kp"
+    )
+    assert len(launch_result.instance_ids) == (
+        LAUNCH_CHUNK_SIZE + 50 - run_instances_calls[2]["MaxCount"]
+    )
+    assert sum(call["MaxCount"] for call in run_instances_calls) == (
+        LAUNCH_CHUNK_SIZE + 50
+    )
+    assert client.get_resource_state(os_type="Linux") is not None
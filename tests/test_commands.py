@@ -1,9 +1,49 @@
 """Tests definition for the command invocations that secure_ec2 use."""
 
+import json
+
+import boto3
 from click.testing import CliRunner
 
 from secure_ec2.commands.config import config
 from secure_ec2.commands.launch import launch
+from secure_ec2.src.aws import clear_boto3_pool, get_boto3_session
+from secure_ec2.src.cache import get_cache_path
+from secure_ec2.src.constants import REGIONS_CACHE_NAME
+
+CONFIG_CALL_BUDGET = 8
+CONFIG_WARM_CALL_BUDGET = 4
+LAUNCH_SSM_CALL_BUDGET = 13
+LAUNCH_WARM_CALL_BUDGET = 2
+LAUNCH_WARM_SSM_CALL_BUDGET = 2
+
+
+def count_region_lookups(monkeypatch) -> list:
+    """Record every time a boto3 session reads the region availability of a service from botocore.
+
+    Each lookup is recorded as a (session, service) pair, moto looks regions up on its own sessions.
+    """
+    region_lookups = []
+    get_available_regions = boto3.Session.get_available_regions
+
+    def counting_get_available_regions(self, service_name, *args, **kwargs):
+        region_lookups.append((self, service_name))
+        return get_available_regions(self, service_name, *args, **kwargs)
+
+    monkeypatch.setattr(
+        boto3.Session, "get_available_regions", counting_get_available_regions
+    )
+    return region_lookups
+
+
+def get_session_region_lookups(region_lookups: list) -> list:
+    """Get the services whose regions were looked up by the pooled boto3 session of secure_ec2."""
+    session = get_boto3_session()
+    return [
+        service
+        for lookup_session, service in region_lookups
+        if lookup_session is session
+    ]
 
 
 def test_config_happy_windows(ec2_client_stub):
@@ -40,6 +80,43 @@ def test_config_happy_linux(ec2_client_stub):
     assert config_result.exit_code == 0
 
 
+def test_config_refresh_ami(ec2_client_stub):
+    """Tests the Linux EC2 launch template provisioning bypassing the cached AMI."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+
+    runner = CliRunner()
+    config_result = runner.invoke(
+        config,
+        ["-t", "Linux", "--refresh_ami", "--ami_ttl", "3600"],
+    )
+
+    assert config_result.exit_code == 0
+
+
+def test_config_multi_region(ec2_client_stub):
+    """Tests the Windows EC2 launch template provisioning fanned out to several regions."""
+    ec2_client_stub.copy_image(
+        Name="Windows_Server-2019-English-Full-Base-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+
+    runner = CliRunner()
+    config_result = runner.invoke(
+        config,
+        ["-t", "Windows", "--regions", "us-east-1,eu-west-1"],
+    )
+
+    # No Windows AMI exists in eu-west-1, which must not stop us-east-1
+    assert config_result.exit_code == 1
+    assert "us-east-1: succeeded" in config_result.output
+    assert "eu-west-1: failed (Error getting AMI)" in config_result.output
+
+
 def test_launch_happy_linux(ec2_client_stub):
     """Tests the happy path of Linux EC2 instance provisioning."""
     ec2_client_stub.copy_image(
@@ -67,6 +144,39 @@ def test_launch_happy_linux(ec2_client_stub):
     assert launch_result.exit_code == 0
 
 
+def test_launch_multi_region(ec2_client_stub):
+    """Tests the Linux EC2 instance provisioning fanned out to several regions."""
+    runner = CliRunner()
+
+    # Run config test to fill a mock launch template in every region
+
+    config_result = runner.invoke(
+        config,
+        ["-t", "Linux", "--regions", "us-east-1,us-west-2"],
+    )
+    assert config_result.exit_code == 0
+
+    launch_result = runner.invoke(
+        launch,
+        [
+            "-t",
+            "Linux",
+            "-n",
+            "1",
+            "-k",
+            "None",
+            "-i",
+            "t2.micro",
+            "--regions",
+            "us-east-1,us-west-2",
+        ],
+    )
+
+    assert launch_result.exit_code == 0
+    assert "us-east-1: succeeded" in launch_result.output
+    assert "us-west-2: succeeded" in launch_result.output
+
+
 def test_launch_happy_windows(ec2_client_stub):
     """Tests the happy path of Windows EC2 instance provisioning."""
     ec2_client_stub.copy_image(
@@ -157,3 +267,191 @@ def test_launch_happy_windows_ssm(ec2_client_stub):
     )
 
     assert launch_result.exit_code == 0
+
+
+def test_region_lookups_per_command(ec2_client_stub, monkeypatch):
+    """Tests that the region availability is read from botocore only while the regions cache is cold."""
+    ec2_client_stub.copy_image(
+        Name="amzn2-ami-hvm-2.0-test",
+        SourceImageId="ami-000c540e28953ace2",
+        SourceRegion="us-east-1",
+    )
+    runner = CliRunner()
+    config_result = runner.invoke(
+        config,
+        ["-t", "Linux"],
+    )
+    assert config_result.exit_code == 0
+    region_lookups = count_region_lookups(monkeypatch)
+
+    clear_boto3_pool()
+    get_cache_path(REGIONS_CACHE_NAME).unlink(missing_ok=True)
+    launch_result = runner.invoke(
+        launch,
+        ["-t", "Linux", "-n", "1", "-k", "demo-kp", "-i", "t2.micro", "-nc"],
+    )
+    assert launch_result.exit_code == 0
+    assert get_session_region_lookups(region_lookups)
+
+    del region_lookups[:]
+    clear_boto3_pool()
+    launch_result = runner.invoke(
+        launch,
+        ["-t", "Linux", "-n", "1", "-k", "demo-kp", "-i", "t2.micro", "-nc"],
+    )
+    assert launch_result.exit_code == 0
+    assert get_session_region_lookups(region_lookups) == []
+
+
+def test_launch_json_output(ec2_client_stub):
+    """Tests the headless Linux EC2 provisioning streaming NDJSON events."""
+    runner = CliRunner()
+    config_result = runner.invoke(config, ["-t", "Linux", "--output", "json"])
+    assert config_result.exit_code == 0
+    config_events = [json.loads(line) for line in config_result.output.splitlines()]
+    assert [event["event"] for event in config_events] == [
+        "phase",
+        "launch_template",
+        "phase",
+    ]
+    assert config_events[-1]["status"] == "completed"
+
+    launch_result = runner.invoke(
+        launch,
+        ["-t", "Linux", "-n", "2", "-k", "None", "-i", "t2.micro", "-o", "json"],
+    )
+    assert launch_result.exit_code == 0
+    launch_events = [json.loads(line) for line in launch_result.output.splitlines()]
+    instance_events = [event for event in launch_events if event["event"] == "instance"]
+    assert len(instance_events) == 2
+    assert all(event["connect_url"] for event in instance_events)
+    assert launch_events[-1]["phase"] == "launch"
+    assert launch_events[-1]["status"] == "completed"
+    assert launch_events[-1]["duration"] >= 0
+
+
+def test_launch_json_output_failure(ec2_client_stub):
+    """Tests the headless EC2 provisioning reporting failures as NDJSON events."""
+    runner = CliRunner()
+    launch_result = runner.invoke(
+        launch,
+        ["-t", "Windows", "-n", "1", "-k", "None", "-i", "t2.micro", "-o", "json"],
+    )
+    assert launch_result.exit_code == 1
+    launch_events = [json.loads(line) for line in launch_result.output.splitlines()]
+    assert launch_events[-2]["event"] == "error"
+    assert launch_events[-2]["error"] == "LaunchTemplateError"
+    assert launch_events[-1]["status"] == "failed"
+
+    usage_result = runner.invoke(launch, ["-t", "Linux", "-o", "json"])
+    assert usage_result.exit_code == 2
+
+
+def test_config_call_budget(call_budget):
+    """Tests that the configuration phase stays within its AWS API call budget."""
+    runner = CliRunner()
+    with call_budget(CONFIG_CALL_BUDGET, {"ec2.DescribeImages": 1}):
+        config_result = runner.invoke(config, ["-t", "Linux"])
+    assert config_result.exit_code == 0
+
+    # Configuring again finds the launch template unchanged and writes nothing
+    with call_budget(
+        CONFIG_WARM_CALL_BUDGET,
+        {
+            "ssm.GetParameters": 0,
+            "ec2.DescribeImages": 0,
+            "ec2.CreateLaunchTemplate": 0,
+            "ec2.CreateLaunchTemplateVersion": 0,
+        },
+    ):
+        config_result = runner.invoke(config, ["-t", "Linux"])
+    assert config_result.exit_code == 0
+
+
+def test_launch_call_budget(call_budget):
+    """Tests that a warm launch stays within a fixed AWS API call budget for any number of instances."""
+    runner = CliRunner()
+    runner.invoke(config, ["-t", "Linux"])
+
+    with call_budget(LAUNCH_SSM_CALL_BUDGET):
+        launch_result = runner.invoke(
+            launch, ["-t", "Linux", "-n", "1", "-k", "None", "-i", "t2.micro", "-nc"]
+        )
+    assert launch_result.exit_code == 0
+
+    for num_instances in (1, 10):
+        with call_budget(
+            LAUNCH_WARM_CALL_BUDGET,
+            {"ec2.DescribeLaunchTemplates": 0, "ec2.DescribeInstances": 1},
+        ):
+            launch_result = runner.invoke(
+                launch,
+                [
+                    "-t",
+                    "Linux",
+                    "-n",
+                    str(num_instances),
+                    "-k",
+                    "demo-kp",
+                    "-i",
+                    "t2.micro",
+                    "-nc",
+                ],
+            )
+        assert launch_result.exit_code == 0
+
+        # Session Manager instances add one instance profile association each
+        with call_budget(
+            LAUNCH_WARM_SSM_CALL_BUDGET + num_instances,
+            {
+                "ec2.DescribeInstances": 1,
+                "ec2.AssociateIamInstanceProfile": num_instances,
+                "iam.GetRole": 0,
+                "iam.GetInstanceProfile": 0,
+                "sts.GetCallerIdentity": 0,
+            },
+        ):
+            launch_result = runner.invoke(
+                launch,
+                [
+                    "-t",
+                    "Linux",
+                    "-n",
+                    str(num_instances),
+                    "-k",
+                    "None",
+                    "-i",
+                    "t2.micro",
+                    "-nc",
+                ],
+            )
+        assert launch_result.exit_code == 0
+
+
+def test_launch_invalid_instance_type(ec2_client_stub):
+    """Tests that a misspelled instance type fails before launching, with suggestions."""
+    runner = CliRunner()
+    runner.invoke(config, ["-t", "Linux"])
+
+    launch_result = runner.invoke(
+        launch, ["-t", "Linux", "-n", "1", "-k", "None", "-i", "t2.mcro", "-nc"]
+    )
+    assert launch_result.exit_code == 1
+    assert "did you mean t2.micro" in launch_result.output
+    assert not ec2_client_stub.describe_instances()["Reservations"]
+
+
+def test_launch_fleet(ec2_client_stub):
+    """Tests the Linux EC2 instance provisioning with an instant EC2 Fleet."""
+    runner = CliRunner()
+    runner.invoke(config, ["-t", "Linux"])
+
+    launch_args = ["-t", "Linux", "-n", "4", "-i", "t2.micro,t3.micro", "--fleet"]
+    launch_result = runner.invoke(
+        launch, launch_args + ["-k", "None", "-sp", "100", "-nc"]
+    )
+    assert launch_result.exit_code == 0
+    assert launch_result.output.count("provisioned successfully") == 4
+
+    keypair_result = runner.invoke(launch, launch_args + ["-k", "demo-kp"])
+    assert keypair_result.exit_code == 2
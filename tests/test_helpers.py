@@ -1,12 +1,19 @@
 """Tests definition for the helper methods that secure_ec2 use."""
 
 import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
 
+import pytest
+
+from secure_ec2.src.exceptions import SecureEC2Error
 from secure_ec2.src.helpers import (
+    discover_ip_address,
     get_connection_port,
     get_ip_address,
     get_launch_template_name,
     get_os_regex,
+    get_os_ssm_parameter,
     get_username,
 )
 
@@ -31,6 +38,48 @@ def test_get_ip_address():
     assert re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", ip_address)
 
 
+@pytest.fixture
+def ip_address_provider():
+    """Serve a local stand-in for the public IP address providers."""
+    requests = []
+
+    class IpAddressHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            body = b"not an ip address" if self.path == "/invalid" else b"203.0.113.7\n"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), IpAddressHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_discover_ip_address(ip_address_provider):
+    """Testing that discover_ip_address takes the first valid answer and caches it."""
+    provider_url, requests = ip_address_provider
+    ip_address = discover_ip_address(
+        providers=[f"{provider_url}/invalid", "http://127.0.0.1:9", provider_url]
+    )
+    assert ip_address == "203.0.113.7"
+    assert discover_ip_address(providers=[provider_url]) == "203.0.113.7"
+    assert requests.count("/") == 1
+
+
+def test_discover_ip_address_unavailable(ip_address_provider):
+    """Testing that discover_ip_address fails when no provider gives a valid answer."""
+    provider_url, _ = ip_address_provider
+    with pytest.raises(SecureEC2Error):
+        discover_ip_address(providers=[f"{provider_url}/invalid"], timeout=0.5)
+
+
 def test_get_os_regex():
     """Testing the get_os_regex method."""
     windows_os_regex = get_os_regex(os_type="Windows")
@@ -39,6 +88,21 @@ def test_get_os_regex():
     assert linux_os_regex == "amzn2-ami-hvm-2.0*"
 
 
+def test_get_os_ssm_parameter():
+    """Testing the get_os_ssm_parameter method."""
+    windows_parameter = get_os_ssm_parameter(os_type="Windows")
+    linux_parameter = get_os_ssm_parameter(os_type="Linux", architecture="arm64")
+    assert (
+        windows_parameter
+        == "/aws/service/ami-windows-latest/Windows_Server-2019-English-Full-Base"
+    )
+    assert (
+        linux_parameter
+        == "/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-arm64-gp2"
+    )
+    assert get_os_ssm_parameter(os_type="Windows", architecture="arm64") is None
+
+
 def test_get_launch_template_name():
     """Testing the get_launch_template_name method."""
     launch_template_name = get_launch_template_name(os_type="Linux")
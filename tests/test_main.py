@@ -0,0 +1,88 @@
+"""Tests definition for the secure_ec2 CLI entry point."""
+
+import json
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from secure_ec2 import __version__
+from secure_ec2.main import cli
+
+IMPORT_TIME_BUDGET_US = 150000
+HEAVY_MODULES = {"boto3", "botocore", "PyInquirer", "halo", "pyperclip", "requests"}
+
+
+def get_import_times(code: str) -> dict:
+    """Run python code in a fresh interpreter and map each imported module to its cumulative import time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        import_times[module.strip()] = int(cumulative)
+    return import_times
+
+
+def test_cold_start_import_time():
+    """Tests that importing the CLI entry point stays under the cold start budget."""
+    import_times = get_import_times("import secure_ec2.main")
+    assert not HEAVY_MODULES & set(import_times)
+    assert import_times["secure_ec2.main"] <= IMPORT_TIME_BUDGET_US
+
+
+def test_help_does_not_import_subcommands():
+    """Tests that rendering the help page does not import the subcommand modules."""
+    import_times = get_import_times(
+        "from secure_ec2.main import cli\n"
+        "try:\n"
+        "    cli(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+    )
+    assert not HEAVY_MODULES & set(import_times)
+    assert "secure_ec2.commands.config" not in import_times
+
+
+def test_version():
+    """Tests the version option of the CLI."""
+    runner = CliRunner()
+    version_result = runner.invoke(cli, ["--version"])
+    assert version_result.exit_code == 0
+    assert __version__ in version_result.output
+
+
+def test_help_lists_subcommands():
+    """Tests that the help page lists the lazily loaded subcommands."""
+    runner = CliRunner()
+    help_result = runner.invoke(cli, ["--help"])
+    assert help_result.exit_code == 0
+    assert "config" in help_result.output
+    assert "launch" in help_result.output
+
+
+def test_lazy_subcommand_resolution():
+    """Tests that a lazy subcommand is resolved when it is invoked."""
+    runner = CliRunner()
+    config_result = runner.invoke(cli, ["config", "-t", "Demo"])
+    assert config_result.exit_code == 2
+
+
+def test_trace_calls(ec2_client_stub, tmp_path):
+    """Tests that the trace options summarize the AWS API calls of a command."""
+    trace_path = tmp_path / "trace.json"
+    runner = CliRunner()
+    config_result = runner.invoke(
+        cli, ["--trace_file", str(trace_path), "config", "-t", "Linux"]
+    )
+    assert config_result.exit_code == 0
+    assert "AWS API calls:" in config_result.output
+    assert "CreateLaunchTemplate" in config_result.output
+    assert json.loads(trace_path.read_text())["calls"]
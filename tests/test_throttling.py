@@ -0,0 +1,104 @@
+"""Tests definition for the client-side rate limiting that secure_ec2 use."""
+
+import threading
+import time
+
+from secure_ec2.src.throttling import (
+    TokenBucket,
+    get_request_token_costs,
+    get_token_bucket,
+    limit_request_rate,
+    prepaid_request_tokens,
+    reserve_request_tokens,
+)
+
+
+class FakeClock:
+    """Clock that only moves when the bucket sleeps."""
+
+    def __init__(self):
+        """Start the clock at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Get the current time."""
+        return self.now
+
+    def sleep(self, seconds: float):
+        """Move the clock forward."""
+        self.now += seconds
+
+
+def test_token_bucket():
+    """Testing that the TokenBucket class allows a burst and then the refill rate."""
+    clock = FakeClock()
+    bucket = TokenBucket(capacity=10, refill_rate=5, clock=clock, sleep=clock.sleep)
+    assert sum(bucket.acquire() for _ in range(10)) == 0
+    assert bucket.acquire() == 0.2
+    assert bucket.acquire(5) == 1
+    assert clock.now == 1.2
+
+    clock.now += 100
+    assert bucket.acquire(10) == 0
+    assert bucket.acquire(20) == 2
+
+
+def test_token_bucket_threads():
+    """Testing that concurrent threads share the rate of a TokenBucket."""
+    bucket = TokenBucket(capacity=5, refill_rate=100)
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)])
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 5 tokens come from the burst, the other 20 take at least 0.2 seconds to refill
+    assert time.monotonic() - start >= 0.19
+
+
+def test_get_request_token_costs():
+    """Testing the get_request_token_costs method."""
+    assert get_request_token_costs("DescribeVpcs", {"body": {}}) == [
+        ("unfiltered_non_mutating", 1)
+    ]
+    assert get_request_token_costs(
+        "DescribeInstances", {"body": {"InstanceId.1": "i-1"}}
+    ) == [("non_mutating", 1)]
+    assert get_request_token_costs(
+        "DescribeSubnets", {"body": {"Filter.1.Name": "vpc-id"}}
+    ) == [("non_mutating", 1)]
+    assert get_request_token_costs("RunInstances", {"body": {"MaxCount": "50"}}) == [
+        ("mutating", 1),
+        ("run_instances", 50),
+    ]
+    assert get_token_bucket(None, "us-east-1", "mutating") is get_token_bucket(
+        None, "us-east-1", "mutating"
+    )
+    assert get_token_bucket(None, "us-east-1", "mutating") is not get_token_bucket(
+        None, "eu-west-1", "mutating"
+    )
+
+
+def test_rate_limiting(ec2_client_stub):
+    """Testing that the pooled EC2 client takes request tokens for its calls."""
+    ec2_client_stub.describe_vpcs()
+    ec2_client_stub.describe_vpcs()
+    bucket = get_token_bucket(None, "us-east-1", "unfiltered_non_mutating")
+    assert bucket.tokens < bucket.capacity - 1
+
+
+def test_prepaid_request_tokens():
+    """Testing that calls with prepaid request tokens do not take them again."""
+    bucket = get_token_bucket(None, "us-east-1", "mutating")
+    assert (
+        reserve_request_tokens([("mutating", bucket.capacity)], None, "us-east-1") == 0
+    )
+    operation_model = type("OperationModel", (), {"name": "TerminateInstances"})
+    start = time.monotonic()
+    with prepaid_request_tokens([("mutating", 1)]):
+        limit_request_rate(operation_model, {"body": {}}, None, "us-east-1")
+    assert time.monotonic() - start < 0.1
+    assert reserve_request_tokens([("mutating", 1)], None, "us-east-1") > 0
@@ -0,0 +1,76 @@
+"""Tests definition for the AWS API call tracing that secure_ec2 use."""
+
+import json
+
+import pytest
+
+from secure_ec2.src.tracing import CallTracer
+
+
+class SendError(Exception):
+    """Error raised while sending a request, botocore does not retry it."""
+
+
+def test_call_tracer(ec2_client_stub, tmp_path):
+    """Testing that the CallTracer records the calls made while it is started."""
+    ec2_client_stub.describe_vpcs()
+    with CallTracer() as tracer:
+        ec2_client_stub.describe_vpcs()
+        ec2_client_stub.describe_vpcs()
+        ec2_client_stub.describe_subnets()
+    ec2_client_stub.describe_subnets()
+
+    assert tracer.count_calls() == {"ec2.DescribeVpcs": 2, "ec2.DescribeSubnets": 1}
+    call = tracer.calls[0]
+    assert call["status_code"] == 200
+    assert call["retries"] == 0
+    assert call["latency"] > 0
+    assert call["request_size"] > 0
+    assert call["response_size"] > 0
+    assert call["error"] is None
+
+    summary = tracer.summarize()
+    assert {operation["operation"] for operation in summary} == {
+        "DescribeVpcs",
+        "DescribeSubnets",
+    }
+    assert "DescribeVpcs" in tracer.format_summary()
+
+    trace_path = tmp_path / "trace.json"
+    tracer.write_trace_file(str(trace_path))
+    trace = json.loads(trace_path.read_text())
+    assert len(trace["calls"]) == 3
+    assert len(trace["summary"]) == 2
+
+
+def test_call_tracer_errors(ec2_client_stub):
+    """Testing that the CallTracer records the failed calls."""
+    with CallTracer() as tracer:
+        try:
+            ec2_client_stub.describe_launch_templates(
+                LaunchTemplateNames=["missing-template"]
+            )
+        except ec2_client_stub.exceptions.ClientError:
+            pass
+    assert tracer.calls[0]["error"]
+    assert tracer.summarize()[0]["errors"] == 1
+
+
+def test_call_tracer_send_errors(ec2_client_stub):
+    """Testing that the CallTracer records the calls that failed without a response."""
+
+    def on_before_send(**kwargs):
+        raise SendError("Connection reset")
+
+    ec2_client_stub.meta.events.register_first("before-send.ec2", on_before_send)
+    try:
+        with CallTracer() as tracer:
+            with pytest.raises(SendError):
+                ec2_client_stub.describe_vpcs()
+        with pytest.raises(SendError):
+            ec2_client_stub.describe_vpcs()
+    finally:
+        ec2_client_stub.meta.events.unregister("before-send.ec2", on_before_send)
+    assert tracer.count_calls() == {"ec2.DescribeVpcs": 1}
+    assert tracer.calls[0]["status_code"] is None
+    assert tracer.calls[0]["error"] == "SendError"